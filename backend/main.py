@@ -40,6 +40,10 @@ async def lifespan(app: FastAPI):
     if os.getenv("LEGACY_ENDPOINTS", "false").lower() == "true":
         logger.warning("legacy_endpoints.enabled — /upload and /ask are active; set LEGACY_ENDPOINTS=false to retire them")
     yield
+    from services.llm import aclose_http_clients
+    from utils.download import aclose_async_client
+    await aclose_http_clients()
+    await aclose_async_client()
 
 
 # ── App ─────────────────────────────────────────────────────────────────────────
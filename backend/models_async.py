@@ -224,7 +224,7 @@ class FlashcardProgress(Base):
 
 
 class DocumentChunk(Base):
-    """One embedding chunk from an indexed document. Stored as raw float32 bytes."""
+    """One embedding chunk from an indexed document. Stored as raw float32 (or int8, see EMBED_DTYPE) bytes."""
     __tablename__ = "document_chunks"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -236,7 +236,7 @@ class DocumentChunk(Base):
     )
     document_id: Mapped[str] = mapped_column(String(200), index=True)
     chunk_text: Mapped[str] = mapped_column(Text)
-    embedding: Mapped[bytes] = mapped_column(LargeBinary)  # numpy float32 raw bytes
+    embedding: Mapped[bytes] = mapped_column(LargeBinary)  # numpy float32 or int8 raw bytes
     pages: Mapped[Optional[str]] = mapped_column(Text, default="[]")  # JSON list of page nums
     chunk_index: Mapped[int] = mapped_column(Integer, default=0)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
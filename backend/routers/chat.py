@@ -1,16 +1,16 @@
 """
 routers/chat.py — SSE streaming chat endpoint and message feedback.
 
-The agentic pipeline now uses chat_engine.generate_response() directly (async).
+The agentic pipeline is consumed as chat_engine.stream_events(), an async
+stream of progress events ending in the final result.
 No threading.Thread, no queue.Queue — those are gone.
 
-Heartbeat strategy: asyncio.create_task() + asyncio.wait_for(shield()) so that
-SSE keep-alive pings flow every HEARTBEAT_INTERVAL seconds while the LLM thinks,
-preventing reverse-proxy idle-connection timeouts (Render, Cloudflare).
+Heartbeat strategy: stream_events(heartbeat=...) yields a heartbeat event after
+HEARTBEAT_INTERVAL idle seconds while the LLM thinks, preventing reverse-proxy
+idle-connection timeouts (Render, Cloudflare).
 """
 
 import asyncio
-import json
 import re
 from datetime import datetime
 
@@ -27,13 +27,17 @@ from models_async import ChatMessage, SessionDocument, StudySession
 from schemas import ChatMessageCreate, FeedbackCreate
 from services.ai_service import AIService
 from services.registry import chat_engine, memory_service
+from utils import fastjson
 from utils.cache import get_redis
+from utils.sse import sse_frame
+from utils.validators import InputValidator, check_prompt_injection
 
 logger = get_logger(__name__)
 router = APIRouter(tags=["chat"])
 limiter = Limiter(key_func=get_remote_address)
 
 _HEARTBEAT_INTERVAL = 10   # seconds between keep-alive pings
+_SSE_HEARTBEAT = sse_frame({"type": "heartbeat"})
 
 
 @router.post("/sessions/{session_id}/messages")
@@ -45,8 +49,6 @@ async def send_session_message(
     current_user: CurrentUser,
     db: DB,
 ):
-    from utils.validators import InputValidator, check_prompt_injection
-
     result = await db.execute(
         select(StudySession).where(
             StudySession.id == session_id, StudySession.user_id == current_user.id
@@ -117,41 +119,36 @@ async def send_session_message(
     preference_context = ""
     try:
         memories = await memory_service.retrieve_relevant_memory_async(
-            current_user.id, question, 3
+            current_user.id, question, 3, db=db
         )
         if memories:
             memory_context = " | ".join(memories[:3])
-        preference_context = await memory_service.get_user_preferences_async(current_user.id)
+        preference_context = await memory_service.get_user_preferences_async(
+            current_user.id, db=db
+        )
     except Exception as exc:
         logger.warning("memory.retrieval.failed", error=str(exc))
 
     model_override = custom_model or (AIService.RESPONSE_MODEL if deep_think else None)
 
     try:
-        docs_count_result = await db.execute(
-            select(func.count()).where(SessionDocument.session_id == session_id)
+        docs_result = await db.execute(
+            select(SessionDocument.id).where(SessionDocument.session_id == session_id)
         )
-        has_documents = (docs_count_result.scalar() or 0) > 0
+        document_ids = tuple(docs_result.scalars().all())
     except Exception:
-        has_documents = False
+        document_ids = ()
+    has_documents = bool(document_ids)
 
     # ── SSE generator ──────────────────────────────────────────────────────
 
     async def generate_response():
         # Send initial heartbeat immediately so the client knows we're alive
-        yield f"data: {json.dumps({'type': 'heartbeat'})}\n\n"
-
-        # Queue lets the on_progress callback (called from the task's thread)
-        # push status/tool events into the SSE stream without blocking.
-        progress_queue: asyncio.Queue = asyncio.Queue()
-        loop = asyncio.get_event_loop()
+        yield _SSE_HEARTBEAT
 
-        def _on_progress(evt: dict):
-            loop.call_soon_threadsafe(progress_queue.put_nowait, evt)
-
-        # Run the agentic loop as a background task
-        task = asyncio.create_task(
-            chat_engine.generate_response(
+        try:
+            async for evt in chat_engine.stream_events(
+                heartbeat=_HEARTBEAT_INTERVAL,
                 question=question,
                 session_id=session_id,
                 user_id=current_user.id,
@@ -160,50 +157,29 @@ async def send_session_message(
                 model=model_override,
                 deep_think=deep_think,
                 has_documents=has_documents,
+                document_ids=document_ids,
                 memory_context=memory_context,
                 preference_context=preference_context,
-                on_progress=_on_progress,
-            )
-        )
-
-        # Poll: drain progress events first, then wait/heartbeat
-        while not task.done():
-            # Flush any queued progress events immediately
-            while not progress_queue.empty():
-                try:
-                    evt = progress_queue.get_nowait()
-                    yield f"data: {json.dumps({'type': evt.get('type'), 'tool': evt.get('tool'), 'text': evt.get('text')})}\n\n"
-                except asyncio.QueueEmpty:
-                    break
-            try:
-                await asyncio.wait_for(asyncio.shield(task), timeout=_HEARTBEAT_INTERVAL)
-            except asyncio.TimeoutError:
-                yield f"data: {json.dumps({'type': 'heartbeat'})}\n\n"
-
-        # Flush any remaining progress events after task completes
-        while not progress_queue.empty():
-            try:
-                evt = progress_queue.get_nowait()
-                yield f"data: {json.dumps({'type': evt.get('type'), 'tool': evt.get('tool'), 'text': evt.get('text')})}\n\n"
-            except asyncio.QueueEmpty:
-                break
-
-        # Check for exception
-        if task.exception():
-            exc = task.exception()
+            ):
+                kind = evt.get("type")
+                if kind == "heartbeat":
+                    yield _SSE_HEARTBEAT
+                elif kind == "final":
+                    ai_result = evt["result"]
+                else:
+                    yield sse_frame({'type': kind, 'tool': evt.get('tool'), 'text': evt.get('text')})
+        except Exception as exc:
             err_str = str(exc)
             _vec_keywords = ("chroma", "sqlite", "disk image", "corrupt",
                              "no such table", "locked", "vector", "collection")
             if any(kw in err_str.lower() for kw in _vec_keywords):
                 logger.error("vectorstore.unreachable: %s", err_str)
-                yield f"data: {json.dumps({'error': 'Vector store unavailable. Please re-upload your document and try again.'})}\n\n"
+                yield sse_frame({'error': 'Vector store unavailable. Please re-upload your document and try again.'})
             else:
                 logger.error("ai.failed: %s", err_str)
-                yield f"data: {json.dumps({'error': 'AI response failed. Please try again.'})}\n\n"
+                yield sse_frame({'error': 'AI response failed. Please try again.'})
             return
 
-        ai_result = task.result()
-
         # ── Post-process ────────────────────────────────────────────────────
         answer = ai_result.get("answer", "")
         sources = ai_result.get("sources", [])
@@ -226,10 +202,10 @@ async def send_session_message(
                             if depth == 0:
                                 candidate = answer[start:i + 1]
                                 try:
-                                    parsed = json.loads(candidate)
+                                    parsed = fastjson.loads(candidate)
                                     if isinstance(parsed, list) and len(parsed) > 0:
                                         parsed_content = parsed
-                                except json.JSONDecodeError:
+                                except fastjson.JSONDecodeError:
                                     pass
                                 break
                         if parsed_content:
@@ -241,10 +217,10 @@ async def send_session_message(
             session_id=session_id,
             role="assistant",
             content=answer,
-            sources_json=json.dumps(sources),
-            artifacts_json=json.dumps(artifacts),
-            suggestions_json=json.dumps(suggestions),
-            tool_calls_json=json.dumps(ai_result.get("tool_calls", [])),
+            sources_json=fastjson.dumps(sources),
+            artifacts_json=fastjson.dumps(artifacts),
+            suggestions_json=fastjson.dumps(suggestions),
+            tool_calls_json=fastjson.dumps(ai_result.get("tool_calls", [])),
         )
         db.add(assistant_msg)
         session.updated_at = datetime.utcnow()
@@ -256,14 +232,14 @@ async def send_session_message(
             artifact["session_id"] = session_id
 
         if artifacts:
-            yield f"data: {json.dumps({'artifacts': artifacts, 'message_id': assistant_msg.id})}\n\n"
+            yield sse_frame({'artifacts': artifacts, 'message_id': assistant_msg.id})
             await asyncio.sleep(0)
 
         for i in range(0, len(answer), 50):
-            yield f"data: {json.dumps({'chunk': answer[i:i+50]})}\n\n"
+            yield sse_frame({'chunk': answer[i:i+50]})
             await asyncio.sleep(0)
 
-        yield f"data: {json.dumps({'done': True, 'answer': answer, 'message_id': assistant_msg.id, 'sources': sources, 'artifacts': artifacts, 'suggestions': suggestions})}\n\n"
+        yield sse_frame({'done': True, 'answer': answer, 'message_id': assistant_msg.id, 'sources': sources, 'artifacts': artifacts, 'suggestions': suggestions})
 
     return StreamingResponse(
         generate_response(),
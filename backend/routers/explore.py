@@ -2,8 +2,6 @@
 routers/explore.py — Web-grounded explore endpoint and streaming search-augmented generation.
 """
 
-import json
-
 from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import StreamingResponse
 from sqlalchemy import select
@@ -15,6 +13,7 @@ from schemas import ExploreRequest, ExploreSearchRequest
 from services.registry import ai_service
 from slowapi import Limiter
 from slowapi.util import get_remote_address
+from utils.sse import sse_frame
 
 logger = get_logger(__name__)
 router = APIRouter(tags=["explore"])
@@ -54,12 +53,13 @@ async def explore_search(
         except Exception as exc:
             logger.warning("explore_search.session_mark.failed", error=str(exc))
 
-    def _stream():
+    async def _stream():
         try:
-            yield from ai_service.explore_the_web(query=body.query)
+            async for chunk in ai_service.explore_the_web_async(query=body.query):
+                yield chunk
         except Exception as exc:
             logger.error("explore_search.failed", error=str(exc))
-            yield f"data: {json.dumps({'type': 'error', 'text': str(exc)})}\n\n"
+            yield sse_frame({"type": "error", "text": str(exc)})
 
     return StreamingResponse(
         _stream(),
@@ -5,6 +5,7 @@ These bypass session management and are DISABLED by default.
 Enable only for migration purposes via: LEGACY_ENDPOINTS=true
 """
 
+import asyncio
 import json
 import os
 import uuid
@@ -174,7 +175,9 @@ async def upload_file(request: Request, current_user: CurrentUser, db: DB):
         except Exception:
             pass
 
-    ai_response = ai_service.answer_from_context(
+    # Sync LLM call — run it on a worker thread, not the event loop
+    ai_response = await asyncio.to_thread(
+        ai_service.answer_from_context,
         relevant_chunks, question, chat_history,
         model_override=model_override,
         file_type=primary_file_type, image_paths=image_filepaths or None,
@@ -306,7 +309,9 @@ async def ask(request: Request, current_user: CurrentUser, db: DB):
         except Exception:
             pass
 
-    ai_response = ai_service.answer_from_context(
+    # Sync LLM call — run it on a worker thread, not the event loop
+    ai_response = await asyncio.to_thread(
+        ai_service.answer_from_context,
         relevant_chunks, question, chat_history,
         model_override=model_override,
         file_type=primary_file_type, image_paths=image_filepaths or None,
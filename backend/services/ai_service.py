@@ -13,24 +13,33 @@ needed by legacy.py, explore.py, and document_tasks.py.
 """
 
 import asyncio
+import concurrent.futures
+import hashlib
 import logging
 import os
-from typing import Dict, List, Optional
+import re
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from services import llm as _llm_mod
+from services import search_service
+from services.llm import Provider, _detect_provider
+from utils import fastjson
+from utils.sse import SSE_DONE, sse_frame
 
 logger = logging.getLogger(__name__)
 
 # ── Provider detection (kept for RESPONSE_MODEL class attribute) ─────────────
-_provider_env = os.getenv("AI_PROVIDER", "").lower()
-if _provider_env in ("openrouter", "gemini", "openai"):
-    AI_PROVIDER = _provider_env
-elif os.getenv("OPENROUTER_API_KEY"):
-    AI_PROVIDER = "openrouter"
-elif os.getenv("OPENAI_API_KEY"):
-    AI_PROVIDER = "openai"
-elif os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY"):
-    AI_PROVIDER = "gemini"
-else:
-    AI_PROVIDER = "openai"
+# provider → (env var, default) for the deep-think response model
+PROVIDER_MODELS: Dict[Provider, Tuple[str, str]] = {
+    Provider.GEMINI:     ("GEMINI_RESPONSE_MODEL", "gemini-2.0-flash"),
+    Provider.OPENROUTER: ("OPENROUTER_RESPONSE_MODEL", "openai/gpt-4o"),
+    Provider.OPENAI:     ("OPENAI_RESPONSE_MODEL", "gpt-4o"),
+}
+
+AI_PROVIDER = _detect_provider()
+RESPONSE_MODEL = os.getenv(*PROVIDER_MODELS[AI_PROVIDER])
 
 # ── System prompt (kept for explore.py) ─────────────────────────────────────
 DEFAULT_SYSTEM_PROMPT = (
@@ -53,24 +62,157 @@ FILE_TYPE_MODIFIERS = {
     ),
 }
 
+# Combined prompts per file_type, built once at import.
+_SYSTEM_PROMPTS = {k: DEFAULT_SYSTEM_PROMPT + v for k, v in FILE_TYPE_MODIFIERS.items()}
+
+
+DEEP_THINK_SUFFIX = "\n\nThink step by step. Be thorough, exhaustive, and analytical."
+
+
+@lru_cache(maxsize=16)
+def get_system_prompt(file_type: str = "pdf", deep_think: bool = False) -> str:
+    base = _SYSTEM_PROMPTS.get(file_type, DEFAULT_SYSTEM_PROMPT)
+    return base + DEEP_THINK_SUFFIX if deep_think else base
+
+
+_CTX_HEAD = "Context from the document:\n\n"
+_CTX_SEP = "\n\n---\n\n"
+
+
+def build_context_prompt(context_chunks: Optional[List[str]], question: str) -> str:
+    """
+    User turn for a context answer, joined in one pass — no intermediate
+    joined-context string that an f-string would then copy again.
+    """
+    if not context_chunks or not any(context_chunks):
+        return question
+    parts = [_CTX_HEAD + context_chunks[0], *context_chunks[1:], "Question: " + question]
+    return _CTX_SEP.join(parts)
+
+
+def context_fingerprint(context_chunks: Optional[List[str]]) -> str:
+    """sha256 over the chunks, for cache keys that must not re-encode the whole context."""
+    h = hashlib.sha256()
+    for chunk in context_chunks or ():
+        h.update(chunk.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+_FAVICON_TMPL = "https://www.google.com/s2/favicons?domain=%s&sz=32"
+# Host of an http(s) URL minus a leading "www." — one match, no full URL parse
+_DOMAIN_RE = re.compile(r"^https?://(?:[^/?#@]*@)?(?:www\.)?([^/:?#]+)", re.IGNORECASE)
+
+
+def _favicon_for(url: str) -> str:
+    """Google favicon URL for *url*'s domain ("" if it isn't an http(s) URL)."""
+    m = _DOMAIN_RE.match(url)
+    return _favicon_for_domain(m.group(1)) if m else ""
+
+
+@lru_cache(maxsize=1024)
+def _favicon_for_domain(domain: str) -> str:
+    return _FAVICON_TMPL % domain
+
+
+def _in_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
 
-def get_system_prompt(file_type: str = "pdf") -> str:
-    return DEFAULT_SYSTEM_PROMPT + FILE_TYPE_MODIFIERS.get(file_type, "")
+
+# ── validate_file limits ────────────────────────────────────────────────────
+_MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+_ALLOWED_EXTS = frozenset({".pdf", ".docx", ".txt", ".png", ".jpg", ".jpeg"})
+
+
+# ── SSE framing (explore_the_web yields pre-encoded bytes) ──────────────────
+# Per-token frames share everything but the text, so only the text is
+# serialised: data: {"type":"chunk","text":<json string>}\n\n
+_SSE_CHUNK_HEAD = b'data: {"type":"chunk","text":'
+_SSE_CHUNK_TAIL = b"}\n\n"
+
+
+def _sse_chunk(text: str) -> bytes:
+    return b"".join((_SSE_CHUNK_HEAD, fastjson.dumpb(text), _SSE_CHUNK_TAIL))
+
+
+# Token batching: one chunk frame per few deltas instead of per 1-3 char
+# delta.  The batch size grows 1 → 3 → 9 → 27 → 32 so the first token is
+# still flushed on arrival (same TTFT); a batch is also flushed after 40 ms
+# or at a sentence/line end so text never visibly stalls.
+_SSE_BATCH_GROWTH = 3
+_SSE_BATCH_MAX = 32
+_SSE_FLUSH_S = 0.040
+_SSE_FLUSH_CHARS = frozenset(".!?\n")
+
+
+class _ChunkBatcher:
+    """Coalesce streamed text deltas into fewer SSE chunk frames."""
+
+    __slots__ = ("_buf", "_target", "_last")
+
+    def __init__(self):
+        self._buf: List[str] = []
+        self._target = 1
+        self._last = time.monotonic()
+
+    def push(self, text: str) -> Optional[bytes]:
+        """Add a delta; returns a frame when the batch is due, else None."""
+        self._buf.append(text)
+        now = time.monotonic()
+        if (
+            len(self._buf) >= self._target
+            or now - self._last >= _SSE_FLUSH_S
+            or text[-1] in _SSE_FLUSH_CHARS
+        ):
+            self._target = min(self._target * _SSE_BATCH_GROWTH, _SSE_BATCH_MAX)
+            self._last = now
+            return self.flush()
+        return None
+
+    def flush(self) -> Optional[bytes]:
+        """Frame for whatever is buffered (None if empty)."""
+        if not self._buf:
+            return None
+        text = "".join(self._buf)
+        self._buf.clear()
+        return _sse_chunk(text)
+
+
+# ── Explore Hub helpers ─────────────────────────────────────────────────────
+
+def _explore_sources(results: List[Dict]) -> List[Dict]:
+    """Numbered sources for the search hits, each with its favicon URL."""
+    _, sources = search_service.build_context(results, [])
+    for src in sources:
+        src["favicon"] = _favicon_for(src.get("url", ""))
+    return sources
+
+
+def _explore_messages(query: str, context_block: str) -> List[Dict]:
+    system_prompt = (
+        "You are FileGeek Explore — an AI research assistant. "
+        "You have been given web search results below. Use them to answer the user's question. "
+        "You MUST cite sources using inline notation like [1], [2], [3] that correspond exactly "
+        "to the numbered sources in the context. Be thorough and well-structured using Markdown.\n\n"
+        "--- WEB CONTEXT ---\n"
+        f"{context_block}\n"
+        "--- END CONTEXT ---"
+    )
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": query},
+    ]
 
 
 class AIService:
     """Backward-compat shim wrapping new async services."""
 
-    # Class-level attributes referenced by chat.py
-    if AI_PROVIDER == "gemini":
-        GEMINI_RESPONSE_MODEL = os.getenv("GEMINI_RESPONSE_MODEL", "gemini-2.0-flash")
-        RESPONSE_MODEL = GEMINI_RESPONSE_MODEL
-    elif AI_PROVIDER == "openrouter":
-        OPENROUTER_RESPONSE_MODEL = os.getenv("OPENROUTER_RESPONSE_MODEL", "openai/gpt-4o")
-        RESPONSE_MODEL = OPENROUTER_RESPONSE_MODEL
-    else:
-        OPENAI_RESPONSE_MODEL = os.getenv("OPENAI_RESPONSE_MODEL", "gpt-4o")
-        RESPONSE_MODEL = OPENAI_RESPONSE_MODEL
+    # Class-level attribute referenced by chat.py
+    RESPONSE_MODEL = RESPONSE_MODEL
 
     # Shorthand OR aliases (used by chat.py for model_override resolution)
     _OR_ALIASES: dict = {
@@ -90,6 +232,11 @@ class AIService:
         self._llm = None
         self._chat_engine = None
         self._embedding_service = None
+        self._semantic_cache = None
+        self._embedding_batcher = None
+        self._embedding_cache = None
+        self._fallback_clients = None   # [(openai.OpenAI, default_model)] — built once per pool
+        self._fallback_gen = None       # llm._pool_generation they were built on
 
     def _get_llm(self):
         if self._llm is None:
@@ -109,6 +256,24 @@ class AIService:
             self._embedding_service = embedding_service
         return self._embedding_service
 
+    def _get_batcher(self):
+        if self._embedding_batcher is None:
+            from services.registry import embedding_batcher
+            self._embedding_batcher = embedding_batcher
+        return self._embedding_batcher
+
+    def _get_emb_cache(self):
+        if self._embedding_cache is None:
+            from services.registry import embedding_cache
+            self._embedding_cache = embedding_cache
+        return self._embedding_cache
+
+    def _get_cache(self):
+        if self._semantic_cache is None:
+            from services.registry import semantic_cache
+            self._semantic_cache = semantic_cache
+        return self._semantic_cache
+
     # ── answer_from_context ─────────────────────────────────────────────────
 
     def answer_from_context(
@@ -120,46 +285,102 @@ class AIService:
         persona: str = "academic",
         file_type: str = "pdf",
         image_paths: Optional[List[str]] = None,
+        use_cache: bool = True,
     ) -> Optional[str]:
-        """Sync — safe to call from Celery workers and run_in_executor threads."""
-        context = "\n\n---\n\n".join(context_chunks) if context_chunks else ""
+        """
+        Sync — safe to call from Celery workers and run_in_executor threads.
+
+        Pass use_cache=False for generated artifacts (quizzes, flashcards, ...):
+        their long templated instructions embed near-identically whatever the
+        topic or count, so the semantic cache would hand back the wrong one.
+        """
+        if not context_chunks and not (question or "").strip():
+            return None
         system = get_system_prompt(file_type)
-        text_part = (
-            f"Context from the document:\n\n{context}\n\n---\n\nQuestion: {question}"
-            if context else question
-        )
+        text_part = build_context_prompt(context_chunks, question)
 
         messages = [
             {"role": "system", "content": system},
             {"role": "user", "content": text_part},
         ]
 
+        # Semantic cache — images aren't part of the key, so never cache those
+        cache = self._get_cache()
+        use_cache = use_cache and not image_paths
+        scope = cache_vec = None
+        if use_cache:
+            scope = cache.scope_key(
+                "answer_from_context", context_fingerprint(context_chunks),
+                model_override, persona, file_type,
+            )
+            cached, cache_vec = cache.lookup(question, scope)
+            if cached is not None:
+                return cached
+
+        answer = self._answer_uncached(text_part, messages, model_override)
+        if answer and use_cache:
+            cache.store(question, cache_vec, scope, answer)
+        return answer
+
+    def _answer_uncached(self, text_part, messages, model_override=None):
+        if _in_event_loop():
+            # Called straight from a coroutine: asyncio.run() would raise, so
+            # use the pooled sync client.  Async callers should wrap this
+            # method in asyncio.to_thread rather than block the loop.
+            logger.warning("answer_from_context: called on the event loop, using sync client")
+            return self._sync_fallback(messages, model_override)
         try:
             llm = self._get_llm()
             return asyncio.run(llm.simple_response(text_part, model=model_override))
-        except RuntimeError as exc:
-            if "This event loop is already running" in str(exc):
-                # Fallback for edge cases — use sync OpenAI client directly
-                logger.warning("answer_from_context: event loop conflict, using sync client")
-                return self._sync_fallback(messages, model_override)
-            raise
         except Exception as exc:
             logger.error("answer_from_context failed: %s", exc)
             return None
 
+    def _get_fallback_clients(self):
+        """
+        OpenAI-compatible (client, default_model) pairs, tried in order by the
+        providers/openai_provider helpers: OpenRouter first, then OpenAI.
+        Callers apply their own model override on top of default_model.
+        Built once per AIService on LLMService's pooled httpx client, so
+        answers reuse keep-alive TLS connections instead of a fresh client
+        (and pool) per call.  Rebuilt after aclose_http_clients() has closed
+        that pool.
+        """
+        generation = _llm_mod._get_pool_generation()
+        if self._fallback_clients is None or self._fallback_gen != generation:
+            import openai
+
+            cfg = _llm_mod.CFG
+            http_client = _llm_mod._get_http_client()
+            clients = []
+            if cfg.openrouter_key:
+                clients.append((
+                    openai.OpenAI(
+                        base_url="https://openrouter.ai/api/v1",
+                        api_key=cfg.openrouter_key,
+                        http_client=http_client,
+                    ),
+                    cfg.openrouter_chat_model,
+                ))
+            if cfg.openai_key:
+                clients.append((
+                    openai.OpenAI(api_key=cfg.openai_key, http_client=http_client),
+                    cfg.openai_chat_model,
+                ))
+            self._fallback_clients = clients
+            self._fallback_gen = generation
+        return self._fallback_clients
+
     def _sync_fallback(self, messages, model_override=None):
         """Direct sync OpenAI call when asyncio.run() can't be used."""
         try:
-            import openai
-            if AI_PROVIDER == "openrouter":
-                client = openai.OpenAI(
-                    base_url="https://openrouter.ai/api/v1",
-                    api_key=os.getenv("OPENROUTER_API_KEY"),
-                )
-                model = model_override or os.getenv("OPENROUTER_CHAT_MODEL", "openai/gpt-4o")
+            # Reuse LLMService's pooled sync client instead of building one per call
+            client = self._get_llm()._get_sync_client()
+            cfg = _llm_mod.CFG
+            if AI_PROVIDER is Provider.OPENROUTER:
+                model = model_override or cfg.openrouter_chat_model
             else:
-                client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-                model = model_override or os.getenv("OPENAI_CHAT_MODEL", "gpt-4o")
+                model = model_override or cfg.openai_chat_model
             resp = client.chat.completions.create(model=model, messages=messages)
             return resp.choices[0].message.content
         except Exception as exc:
@@ -185,10 +406,13 @@ class AIService:
         """
         Sync entry point kept for any legacy callers.
         chat.py now calls chat_engine.generate_response() directly.
+
+        Semantic caching happens inside ChatEngine.generate_response, so a
+        hit there skips the agentic loop for both entry points.
         """
         engine = self._get_chat_engine()
         try:
-            return asyncio.run(
+            result = asyncio.run(
                 engine.generate_response(
                     question=question,
                     session_id=session_id,
@@ -209,10 +433,13 @@ class AIService:
                 "answer": "I encountered an error processing your request.",
                 "sources": [], "artifacts": [], "suggestions": [],
             }
+        return result
 
     # ── generate_chat_title ─────────────────────────────────────────────────
 
     def generate_chat_title(self, first_message: str) -> str:
+        if not first_message or not first_message.strip():
+            return "New Chat"
         try:
             engine = self._get_chat_engine()
             return asyncio.run(engine.generate_chat_title(first_message))
@@ -225,74 +452,111 @@ class AIService:
     def get_embeddings(self, text_list: List[str]) -> List[List[float]]:
         if not text_list:
             return []
-        emb_svc = self._get_emb()
-        vecs = emb_svc.embed_batch(text_list)
+        # Exact repeats come from the on-disk cache; only misses are embedded
+        vecs = self._get_emb_cache().embed_through(
+            self._get_emb().model_id, text_list, self._embed_uncached
+        )
         return [v.tolist() for v in vecs]
 
-    # ── explore_the_web (sync streaming generator — unchanged) ──────────────
+    def _embed_uncached(self, texts: List[str]) -> list:
+        # Coalesced with concurrent callers; EmbeddingService splits large
+        # lists into provider batches, fans them out and owns retry/backoff.
+        return self._get_batcher().embed_batch(texts)
 
-    def explore_the_web(self, query: str):
+    # ── explore_the_web (Search-Augmented Generation for the Explore Hub) ──
+
+    async def explore_the_web_async(self, query: str):
         """
-        Search-Augmented Generation streaming generator for the Explore Hub.
-        Yields SSE-formatted strings.
+        Async twin of explore_the_web, used by the explore router.  Search,
+        scrape and token streaming all run on the event loop (the blocking
+        DuckDuckGo search goes to a worker thread), so an open stream holds
+        no threadpool worker.  Yields the same SSE-encoded bytes.
         """
-        import json as _json
-        from services import search_service
-
-        sources: list[dict] = []
-
         try:
-            results = search_service.web_search(query, max_results=8)
-            urls = [r["url"] for r in results if r.get("url")]
-            scraped = search_service.scrape_urls(urls, max_pages=5)
-            context_block, sources = search_service.build_context(results, scraped)
+            results = await asyncio.to_thread(search_service.web_search, query, 8)
         except Exception as exc:
             logger.error("explore_the_web.search_failed: %s", exc)
-            context_block = ""
-            sources = []
-
-        system_prompt = (
-            "You are FileGeek Explore — an AI research assistant. "
-            "You have been given web search results below. Use them to answer the user's question. "
-            "You MUST cite sources using inline notation like [1], [2], [3] that correspond exactly "
-            "to the numbered sources in the context. Be thorough and well-structured using Markdown.\n\n"
-            "--- WEB CONTEXT ---\n"
-            f"{context_block}\n"
-            "--- END CONTEXT ---"
-        )
+            results = []
+        urls = [r["url"] for r in results if r.get("url")]
 
+        # Sources only depend on the search hits, so emit them while the
+        # scrape is still in flight.
+        scrape_task = asyncio.create_task(search_service.scrape_urls_async(urls, 5))
+        sources = _explore_sources(results)
         if sources:
-            for src in sources:
-                try:
-                    from urllib.parse import urlparse
-                    domain = urlparse(src["url"]).netloc.replace("www.", "")
-                    src["favicon"] = f"https://www.google.com/s2/favicons?domain={domain}&sz=32"
-                except Exception:
-                    src["favicon"] = ""
-            yield f"data: {_json.dumps({'type': 'sources', 'sources': sources})}\n\n"
+            yield sse_frame({"type": "sources", "sources": sources})
 
         try:
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": query},
-            ]
-            llm = self._get_llm()
-            for text in llm.stream_sync(messages):
-                yield f"data: {_json.dumps({'type': 'chunk', 'text': text})}\n\n"
-            yield "data: [DONE]\n\n"
+            scraped = await scrape_task
+        except Exception as exc:
+            logger.error("explore_the_web.scrape_failed: %s", exc)
+            scraped = []
+
+        context_block, _ = search_service.build_context(results, scraped)
+        batcher = _ChunkBatcher()
+        try:
+            async for text in self._get_llm().stream(_explore_messages(query, context_block)):
+                frame = batcher.push(text)
+                if frame:
+                    yield frame
+            frame = batcher.flush()
+            if frame:
+                yield frame
+            yield SSE_DONE
+        except Exception as exc:
+            logger.error("explore_the_web.stream_failed: %s", exc)
+            yield sse_frame({"type": "error", "text": str(exc)})
+
+    def explore_the_web(self, query: str):
+        """
+        Search-Augmented Generation streaming generator for the Explore Hub.
+        Yields SSE-formatted, UTF-8 encoded bytes.  Sync, for callers without
+        an event loop; the router uses explore_the_web_async.
+        """
+        try:
+            results = search_service.web_search(query, max_results=8)
+        except Exception as exc:
+            logger.error("explore_the_web.search_failed: %s", exc)
+            results = []
+        urls = [r["url"] for r in results if r.get("url")]
+
+        # Sources only depend on the search hits, so emit them before the
+        # scrape finishes; the scrape runs on a worker thread meanwhile.
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
+            scrape_future = pool.submit(search_service.scrape_urls, urls, 5)
+
+            sources = _explore_sources(results)
+            if sources:
+                yield sse_frame({"type": "sources", "sources": sources})
+
+            try:
+                scraped = scrape_future.result()
+            except Exception as exc:
+                logger.error("explore_the_web.scrape_failed: %s", exc)
+                scraped = []
+
+        context_block, _ = search_service.build_context(results, scraped)
+        batcher = _ChunkBatcher()
+        try:
+            for text in self._get_llm().stream_sync(_explore_messages(query, context_block)):
+                frame = batcher.push(text)
+                if frame:
+                    yield frame
+            frame = batcher.flush()
+            if frame:
+                yield frame
+            yield SSE_DONE
         except Exception as exc:
             logger.error("explore_the_web.stream_failed: %s", exc)
-            yield f"data: {_json.dumps({'type': 'error', 'text': str(exc)})}\n\n"
+            yield sse_frame({"type": "error", "text": str(exc)})
 
     # ── Compat properties ────────────────────────────────────────────────────
 
     def validate_file(self, filepath: str) -> bool:
         try:
-            if not os.path.exists(filepath):
-                return False
-            if os.path.getsize(filepath) > 10 * 1024 * 1024:
-                return False
-            allowed = (".pdf", ".docx", ".txt", ".png", ".jpg", ".jpeg")
-            return filepath.lower().endswith(allowed)
-        except Exception:
+            st = os.stat(filepath)
+        except (OSError, TypeError, ValueError):
+            return False
+        if st.st_size > _MAX_UPLOAD_BYTES:
             return False
+        return os.path.splitext(filepath)[1].lower() in _ALLOWED_EXTS
@@ -6,13 +6,75 @@ All LLM calls are async (AsyncOpenAI); tool executor runs in a thread pool.
 """
 
 import asyncio
-import json
+import hashlib
 import logging
 import re
-from typing import Callable, Dict, List, Optional
+import sys
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import AsyncIterator, Callable, Dict, List, Optional, Sequence
+
+from services.llm import Provider
+from services.tools import TOOL_DEFINITIONS, artifact_answer, project_for_model, route_forced_tool
+from utils import fastjson
 
 logger = logging.getLogger(__name__)
 
+_DOCS_RULES = (
+    "\n\nDOCUMENTS ARE UPLOADED in this session. Rules:\n"
+    "- ALWAYS call search_documents first before answering any question.\n"
+    "- Base your answer STRICTLY on the retrieved document content.\n"
+    "- If information is not found in the documents, say exactly: "
+    "'I cannot find that information in your document.' Do NOT guess.\n"
+    "- ALWAYS call generate_flashcards when asked for flashcards.\n"
+    "- ALWAYS call generate_quiz when asked for a quiz.\n"
+    "- ALWAYS call create_study_guide when asked for a study guide.\n"
+    "- ALWAYS call generate_visualization when asked for a diagram or chart."
+)
+
+_NO_DOCS_RULES = (
+    "\n\nNo documents in this session. Rules:\n"
+    "- Answer general questions directly from your own knowledge.\n"
+    "- ALWAYS call generate_flashcards when asked for flashcards.\n"
+    "- ALWAYS call generate_quiz when asked for a quiz.\n"
+    "- ALWAYS call create_study_guide when asked for a study guide.\n"
+    "- ALWAYS call generate_visualization when asked for a diagram or chart.\n"
+    "- DO NOT produce flashcards or quiz questions as plain text."
+)
+
+# Questions that lean on the conversation so far ("explain that more",
+# "why?") bypass the semantic cache: the cache scope deliberately leaves the
+# history out, so only self-contained questions may be served from it.
+_FOLLOW_UP_MAX_WORDS = 2
+_ANAPHORA_RE = re.compile(
+    r"\b(it|its|that|this|these|those|them|they|he|she|him|her|above|previous|"
+    r"earlier|again|more|else|same)\b",
+    re.IGNORECASE,
+)
+
+
+def _is_follow_up(question: str) -> bool:
+    return len(question.split()) <= _FOLLOW_UP_MAX_WORDS or bool(_ANAPHORA_RE.search(question))
+
+
+# Cheap model for chat titles; providers not listed use their default model
+_TITLE_MODELS = {
+    Provider.OPENROUTER: "openai/gpt-4o-mini",
+    Provider.OPENAI:     "gpt-4o-mini",
+}
+
+# LRU for chat titles, keyed on a hash of the case/whitespace-folded first
+# message: common openers ("summarize this", "explain chapter 1") repeat
+# across sessions.  A dict rather than lru_cache because generate_chat_title
+# is a coroutine; failures are never cached.
+_TITLE_CACHE_MAX = 2048
+_title_cache: "OrderedDict[tuple, str]" = OrderedDict()
+_title_cache_lock = threading.Lock()
+
+_SUGGESTIONS_FENCE = "```suggestions"
+_SUGGESTIONS_RE = re.compile(r'```suggestions\s*\n(.*?)\n```', re.DOTALL)
+
 DEFAULT_SYSTEM_PROMPT = (
     "You are FileGeek — a brilliant analytical AI assistant who helps users deeply "
     "understand their documents.\n"
@@ -33,17 +95,33 @@ FILE_TYPE_MODIFIERS = {
     ),
 }
 
+# Combined prompts per file_type, built once at import.
+_SYSTEM_PROMPTS = {k: DEFAULT_SYSTEM_PROMPT + v for k, v in FILE_TYPE_MODIFIERS.items()}
+
+
+@lru_cache(maxsize=32)
+def _base_system_prompt(file_type: str, has_documents: bool) -> str:
+    """
+    Static system prompt for a (file_type, has_documents) pair — the same
+    string object every turn, and the same leading bytes for every user, so
+    providers can reuse it as a cached prompt prefix.
+    """
+    base = _SYSTEM_PROMPTS.get(file_type, DEFAULT_SYSTEM_PROMPT)
+    return sys.intern(base + (_DOCS_RULES if has_documents else _NO_DOCS_RULES))
+
 
 class ChatEngine:
     """Stateless agentic loop.  Instantiate once as a module-level singleton."""
 
     MAX_ROUNDS = 3
 
-    def __init__(self, llm_service, vector_store, embedding_service, tool_executor):
+    def __init__(self, llm_service, vector_store, embedding_service, tool_executor,
+                 semantic_cache=None):
         self._llm = llm_service
         self._vs = vector_store
         self._emb = embedding_service
         self._tools = tool_executor
+        self._cache = semantic_cache
 
     # ── Main entry point ─────────────────────────────────────────────────────
 
@@ -61,63 +139,38 @@ class ChatEngine:
         preference_context: str = "",
         file_type: str = "pdf",
         on_progress: Optional[Callable] = None,
+        document_ids: Sequence = (),
     ) -> Dict:
         """
         Run the agentic loop and return a result dict:
         {answer, sources, artifacts, suggestions, tool_calls}
+        *document_ids* identifies the session's documents for the cache scope.
         """
-        from services.tools import TOOL_DEFINITIONS
-
-        # Build system prompt
-        system = DEFAULT_SYSTEM_PROMPT + FILE_TYPE_MODIFIERS.get(file_type, "")
-        if memory_context:
-            system += f"\n\nBased on past sessions: {memory_context}"
+        # Stable prefix first (system prompt + history), identical byte-for-byte
+        # across turns of a session so provider prompt caching can reuse it.
+        # Per-question data (retrieved memories, deep-think toggle) goes in a
+        # trailing system message just before the question.
+        system = _base_system_prompt(file_type, has_documents)
         if preference_context:
-            system += f"\n\nUser preferences: {preference_context}"
-        if has_documents:
-            system += (
-                "\n\nDOCUMENTS ARE UPLOADED in this session. Rules:\n"
-                "- ALWAYS call search_documents first before answering any question.\n"
-                "- Base your answer STRICTLY on the retrieved document content.\n"
-                "- If information is not found in the documents, say exactly: "
-                "'I cannot find that information in your document.' Do NOT guess.\n"
-                "- ALWAYS call generate_flashcards when asked for flashcards.\n"
-                "- ALWAYS call generate_quiz when asked for a quiz.\n"
-                "- ALWAYS call create_study_guide when asked for a study guide.\n"
-                "- ALWAYS call generate_visualization when asked for a diagram or chart."
-            )
-        else:
-            system += (
-                "\n\nNo documents in this session. Rules:\n"
-                "- Answer general questions directly from your own knowledge.\n"
-                "- ALWAYS call generate_flashcards when asked for flashcards.\n"
-                "- ALWAYS call generate_quiz when asked for a quiz.\n"
-                "- ALWAYS call create_study_guide when asked for a study guide.\n"
-                "- ALWAYS call generate_visualization when asked for a diagram or chart.\n"
-                "- DO NOT produce flashcards or quiz questions as plain text."
-            )
-        if deep_think:
-            system += "\n\nThink step by step. Be thorough, exhaustive, and analytical."
+            system = f"{system}\n\nUser preferences: {preference_context}"
 
-        # Build message history
         messages = [{"role": "system", "content": system}]
         for entry in (chat_history or []):
             if entry.get("role") in ("user", "assistant") and entry.get("content"):
                 messages.append({"role": entry["role"], "content": entry["content"]})
+
+        volatile = []
+        if memory_context:
+            volatile.append(f"Based on past sessions: {memory_context}")
+        if deep_think:
+            volatile.append("Think step by step. Be thorough, exhaustive, and analytical.")
+        if volatile:
+            messages.append({"role": "system", "content": "\n\n".join(volatile)})
         messages.append({"role": "user", "content": question})
 
         # Determine forced first tool
-        q_lower = question.lower()
-        forced_tool: Optional[str] = None
-        if any(kw in q_lower for kw in ("flashcard", "flash card", "study card")):
-            forced_tool = "generate_flashcards"
-        elif any(kw in q_lower for kw in ("quiz", "test me", "multiple choice")):
-            forced_tool = "generate_quiz"
-        elif any(kw in q_lower for kw in ("study guide", "outline")):
-            forced_tool = "create_study_guide"
-        elif any(kw in q_lower for kw in ("diagram", "mind map", "visualization", "chart")):
-            forced_tool = "generate_visualization"
-        elif has_documents:
+        forced_tool: Optional[str] = route_forced_tool(question)
+        if forced_tool is None and has_documents:
             forced_tool = "search_documents"
 
         def emit(event: dict):
@@ -127,12 +180,36 @@ class ChatEngine:
                 except Exception:
                     pass
 
+        # Semantic cache — scoped on the user, their preferences (part of the
+        # system prompt), model settings and the documents answers are drawn
+        # from, not on the ever-growing history, so a repeated self-contained
+        # question can hit on a later turn.  Follow-ups are history-dependent
+        # and skip the cache altogether.
+        scope = cache_vec = None
+        if self._cache is not None and not _is_follow_up(question):
+            if document_ids:
+                documents = sorted(map(str, document_ids))
+            else:
+                documents = session_id if has_documents else None
+            preferences = (
+                hashlib.sha256(preference_context.encode("utf-8")).hexdigest()
+                if preference_context else None
+            )
+            scope = self._cache.scope_key(
+                "generate_response", user_id, preferences, file_type, model, deep_think,
+                documents, forced_tool,
+            )
+            cached, cache_vec = await asyncio.to_thread(self._cache.lookup, question, scope)
+            if cached is not None:
+                emit({"type": "status", "text": "Generating response…"})
+                return cached
+
         # Resolve model
         resolved_model = self._llm.resolve_model(model)
 
         artifacts = []
         tool_calls_log = []
-        loop = asyncio.get_running_loop()
+        results: List[Dict] = []
 
         for round_num in range(self.MAX_ROUNDS):
             # Determine tool_choice
@@ -160,6 +237,13 @@ class ChatEngine:
                     "sources": [], "artifacts": [], "suggestions": [],
                 }
 
+            details = getattr(getattr(response, "usage", None), "prompt_tokens_details", None)
+            if details is not None:
+                logger.debug(
+                    "ChatEngine round=%d prompt cache hit: %s tokens",
+                    round_num, getattr(details, "cached_tokens", None),
+                )
+
             choice = response.choices[0]
             tool_calls = getattr(choice.message, "tool_calls", None)
 
@@ -187,23 +271,26 @@ class ChatEngine:
                     ]
                 messages.append(assistant_dict)
 
+                calls = []
                 for tc in tool_calls:
-                    fn_name = tc.function.name
                     try:
-                        fn_args = json.loads(tc.function.arguments)
-                    except json.JSONDecodeError:
+                        fn_args = fastjson.loads(tc.function.arguments)
+                    except fastjson.JSONDecodeError:
                         fn_args = {}
 
                     if model:
                         fn_args["model"] = model
 
-                    emit({"type": "tool_start", "tool": fn_name})
+                    calls.append((tc.function.name, fn_args))
+                    emit({"type": "tool_start", "tool": tc.function.name})
 
-                    # Run sync tool executor in thread pool
-                    result = await loop.run_in_executor(
-                        None, self._tools.execute, fn_name, fn_args, session_id, user_id
-                    )
-                    emit({"type": "tool_done", "tool": fn_name})
+                # Independent calls from one turn run concurrently; results
+                # are appended in tool_call order so ids line up.
+                results = await self._tools.execute_many(
+                    calls, session_id, user_id,
+                    on_done=lambda name: emit({"type": "tool_done", "tool": name}),
+                )
+                for tc, (fn_name, fn_args), result in zip(tool_calls, calls, results):
                     tool_calls_log.append({
                         "tool": fn_name,
                         "args": fn_args,
@@ -216,28 +303,33 @@ class ChatEngine:
                     messages.append({
                         "role": "tool",
                         "tool_call_id": tc.id,
-                        "content": json.dumps(result),
+                        "content": fastjson.dumps(project_for_model(result)),
                     })
             else:
                 # Final answer
                 emit({"type": "status", "text": "Generating response…"})
                 answer = (choice.message.content or "")
                 sources, suggestions = _parse_extras(answer, tool_calls_log)
-                return {
+                result = {
                     "answer": answer,
                     "sources": sources,
                     "artifacts": artifacts,
                     "suggestions": suggestions,
                     "tool_calls": tool_calls_log,
                 }
+                await self._remember(question, cache_vec, scope, result)
+                return result
 
-        # Max rounds reached — force a final answer
+        # Max rounds reached — force a final answer, unless the last round
+        # produced only finished artifacts that can be presented directly.
         emit({"type": "status", "text": "Finalising…"})
-        try:
-            response = await self._llm.chat(messages=messages, model=resolved_model)
-            answer = response.choices[0].message.content or ""
-        except Exception:
-            answer = "I reached the maximum processing steps."
+        answer = artifact_answer(results)
+        if answer is None:
+            try:
+                response = await self._llm.chat(messages=messages, model=resolved_model)
+                answer = response.choices[0].message.content or ""
+            except Exception:
+                answer = "I reached the maximum processing steps."
 
         sources, suggestions = _parse_extras(answer, tool_calls_log)
         return {
@@ -248,26 +340,70 @@ class ChatEngine:
             "tool_calls": tool_calls_log,
         }
 
+    async def stream_events(
+        self, heartbeat: Optional[float] = None, **kwargs
+    ) -> AsyncIterator[Dict]:
+        """
+        generate_response as an async event stream.  Progress events arrive
+        as they are emitted, {"type": "heartbeat"} after *heartbeat* idle
+        seconds (None disables), and last {"type": "final", "result": ...}.
+        Errors from the loop propagate to the consumer.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+        task = asyncio.create_task(self.generate_response(**kwargs, on_progress=queue.put_nowait))
+        task.add_done_callback(lambda _t: queue.put_nowait(done))
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield {"type": "heartbeat"}
+                    continue
+                if event is done:
+                    break
+                yield event
+            yield {"type": "final", "result": task.result()}
+        finally:
+            if not task.done():
+                task.cancel()
+
+    async def _remember(self, question: str, cache_vec, scope: Optional[str], result: Dict) -> None:
+        """
+        Cache a completed text answer.  Artifacts (quizzes, flashcards, ...)
+        should be freshly generated each time, so those results are skipped,
+        as are follow-ups (no *scope*).
+        """
+        if self._cache is None or scope is None or result.get("artifacts"):
+            return
+        await asyncio.to_thread(self._cache.store, question, cache_vec, scope, result)
+
     # ── Title generation ─────────────────────────────────────────────────────
 
     async def generate_chat_title(self, first_message: str) -> str:
+        if not first_message or not first_message.strip():
+            return "New Chat"
         prompt = (
             "Summarize the user's intent in exactly 2 to 3 words. "
             f"No quotes. Nothing else.\n\nUser: {first_message}"
         )
         try:
-            title_model = None
-            if self._llm._provider == "openrouter":
-                title_model = "openai/gpt-4o-mini"
-            elif self._llm._provider == "openai":
-                title_model = "gpt-4o-mini"
-            # else: default model
+            title_model = _TITLE_MODELS.get(self._llm._provider)  # None → default model
+
+            key = (_title_key(first_message), self._llm._provider, title_model)
+            cached = _title_cache_get(key)
+            if cached is not None:
+                return cached
 
             text = await self._llm.simple_response(prompt, model=title_model)
             words = text.replace('"', '').strip().split()
             if len(words) > 4:
                 words = words[:3]
-            return " ".join(words) if words else "New Chat"
+            if not words:
+                return "New Chat"
+            title = " ".join(words)
+            _title_cache_put(key, title)
+            return title
         except Exception as e:
             logger.warning("ChatEngine.generate_chat_title failed: %s", e)
             return "New Chat"
@@ -275,21 +411,40 @@ class ChatEngine:
 
 # ── Helpers ──────────────────────────────────────────────────────────────────
 
-def _parse_extras(answer: str, tool_calls_log: list):
-    """Extract sources from tool log and parse suggestion blocks."""
-    sources = []
+def _title_key(first_message: str) -> bytes:
+    """sha256 of the case- and whitespace-folded message, so long first messages stay cheap to hold."""
+    folded = " ".join(first_message.split()).lower()
+    return hashlib.sha256(folded.encode("utf-8")).digest()
 
-    # Build sources list from search_documents tool results
-    for tc in tool_calls_log:
-        if tc["tool"] == "search_documents" and "results" in tc.get("result_keys", []):
-            pass  # Sources are built by rag_service and embedded in the answer
 
-    suggestions = []
-    m = re.search(r'```suggestions\s*\n(.*?)\n```', answer, re.DOTALL)
+def _title_cache_get(key: tuple) -> Optional[str]:
+    with _title_cache_lock:
+        title = _title_cache.get(key)
+        if title is not None:
+            _title_cache.move_to_end(key)
+        return title
+
+
+def _title_cache_put(key: tuple, title: str) -> None:
+    with _title_cache_lock:
+        _title_cache[key] = title
+        _title_cache.move_to_end(key)
+        while len(_title_cache) > _TITLE_CACHE_MAX:
+            _title_cache.popitem(last=False)
+
+
+def _parse_extras(answer: str, tool_calls_log: list):
+    """
+    (sources, suggestions) for a final answer.  Sources are built by
+    rag_service and embedded in the answer, so the list is always empty;
+    the regex only runs when the suggestions fence is actually present.
+    """
+    if _SUGGESTIONS_FENCE not in answer:
+        return [], []
+    m = _SUGGESTIONS_RE.search(answer)
     if m:
         try:
-            suggestions = json.loads(m.group(1))
-        except json.JSONDecodeError:
+            return [], fastjson.loads(m.group(1))
+        except fastjson.JSONDecodeError:
             pass
-
-    return sources, suggestions
+    return [], []
@@ -7,13 +7,28 @@ For Celery workers, the equivalent sync pipeline lives in document_tasks.py.
 import asyncio
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from typing import Optional
 
 from config import Config
+from utils.download import download_to_async
 
 logger = logging.getLogger(__name__)
 
+# ── Executors ────────────────────────────────────────────────────────────────
+# Extraction and chunking are CPU-bound, so they get a pool about as wide as
+# the machine rather than the loop's default min(32, cpu + 4) executor, which
+# every other run_in_executor(None, ...) caller in the process also shares.
+# Indexing mostly waits on the embedding provider and gets a separate, wider
+# pool so it never queues behind extraction.  Threads start on first submit.
+
+DOCPROC_CPU_WORKERS = int(os.getenv("DOCPROC_CPU_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+DOCPROC_IO_WORKERS = int(os.getenv("DOCPROC_IO_WORKERS", "32"))
+
+CPU_EXECUTOR = ThreadPoolExecutor(max_workers=DOCPROC_CPU_WORKERS, thread_name_prefix="docproc-cpu")
+IO_EXECUTOR = ThreadPoolExecutor(max_workers=DOCPROC_IO_WORKERS, thread_name_prefix="docproc-io")
+
 
 @dataclass
 class ProcessResult:
@@ -44,15 +59,18 @@ class DocumentProcessor:
     ) -> ProcessResult:
         """
         Extract text from *filepath*, chunk it, embed, and store in SQLite.
-        Runs CPU-bound extraction in a thread pool executor so the event loop is
-        not blocked.
+        Runs CPU-bound extraction on CPU_EXECUTOR and indexing on IO_EXECUTOR
+        so the event loop is not blocked.
         """
         loop = asyncio.get_event_loop()
 
         try:
+            # One stat for type detection, validation and file_info
+            stat_cache = self._fs._inspect(filepath)
+
             # CPU-bound: extract text
             page_texts = await loop.run_in_executor(
-                None, self._fs.extract_text_universal, filepath
+                CPU_EXECUTOR, self._fs.extract_text_universal, filepath, stat_cache
             )
             if not page_texts:
                 return ProcessResult(error="Could not extract text from file")
@@ -61,7 +79,7 @@ class DocumentProcessor:
 
             # CPU-bound: chunk text with page provenance
             chunks_with_pages = await loop.run_in_executor(
-                None, self._fs.chunking_function_with_pages, page_texts
+                CPU_EXECUTOR, self._fs.chunking_function_with_pages, page_texts
             )
 
             if not chunks_with_pages:
@@ -71,16 +89,16 @@ class DocumentProcessor:
                     error="No chunks produced",
                 )
 
-            # Embed + store (embedding is I/O-bound; run in executor)
+            # Embed + store (embedding is I/O-bound)
             chunk_count = await loop.run_in_executor(
-                None,
+                IO_EXECUTOR,
                 lambda: self._index_sync(
                     session_id, user_id, document_id, chunks_with_pages
                 ),
             )
 
-            file_type = self._fs.detect_file_type(filepath)
-            file_info = self._fs.get_file_info(filepath)
+            file_type = self._fs.detect_file_type(filepath, stat_cache)
+            file_info = self._fs.get_file_info(filepath, stat_cache)
 
             logger.info(
                 "DocumentProcessor.process_file: doc=%s session=%s chunks=%d pages=%d",
@@ -125,7 +143,6 @@ class DocumentProcessor:
         db,  # AsyncSession
     ) -> ProcessResult:
         """Download from CDN then process."""
-        import requests as http_requests
         from werkzeug.utils import secure_filename
 
         filename = secure_filename(name) or "file"
@@ -134,17 +151,8 @@ class DocumentProcessor:
         safe_filename = f"{timestamp}_{filename}"
         filepath = os.path.join(Config.UPLOAD_FOLDER, safe_filename)
 
-        loop = asyncio.get_event_loop()
-
-        def _download():
-            dl_resp = http_requests.get(url, timeout=30, stream=True)
-            dl_resp.raise_for_status()
-            with open(filepath, "wb") as fout:
-                for chunk in dl_resp.iter_content(chunk_size=8192):
-                    fout.write(chunk)
-
         try:
-            await loop.run_in_executor(None, _download)
+            await download_to_async(url, filepath)
         except Exception as e:
             logger.error("DocumentProcessor.download failed url=%s: %s", url, e)
             return ProcessResult(error=f"Download failed: {e}")
@@ -0,0 +1,165 @@
+"""
+services/embedding_batcher.py — Cross-request micro-batching for embeddings.
+
+Concurrent indexing callers (Celery threads, run_in_executor workers) each
+submit a text list; one background thread drains the queue for up to
+``window_ms`` or ``max_batch`` texts, makes a single
+EmbeddingService.embed_batch() call, and scatters the vectors back to each
+caller's Future in input order, as row slices of the merged (n, dim) array.
+EmbeddingService still splits the merged list into provider-sized requests
+(item count + token budget).
+
+Drop-in for EmbeddingService where VectorStore / RAGService / MemoryService
+expect one: embed_batch() is coalesced, while embed() (single queries on the
+request path) goes straight through so it never waits out the window.
+
+The worker thread starts on first submit, never at import time, so forked
+gunicorn / Celery workers each get their own.
+"""
+
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """Coalesces embed_batch() calls.  Instantiate once as a module-level singleton."""
+
+    def __init__(
+        self,
+        embedding_service,
+        max_batch: Optional[int] = None,
+        window_ms: Optional[float] = None,
+    ):
+        self._emb = embedding_service
+        self._max_batch = max_batch or int(os.getenv("EMBED_BATCH_MAX", "256"))
+        self._window = (
+            window_ms if window_ms is not None
+            else float(os.getenv("EMBED_BATCH_WINDOW_MS", "20"))
+        ) / 1000.0
+        self._queue: "queue.Queue[Tuple[List[str], Future]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._retry_pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    # ── public API ──────────────────────────────────────────────────────────
+
+    def submit(self, texts: List[str]) -> Future:
+        """Queue *texts*; the Future resolves to their (n, dim) vector rows."""
+        fut: Future = Future()
+        if not texts:
+            fut.set_result(np.empty((0, self._emb.dimensions), dtype=np.float32))
+            return fut
+        self._ensure_worker()
+        self._queue.put((list(texts), fut))
+        return fut
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        """Sync wrapper — blocks the calling thread until the batch is flushed."""
+        return self.submit(texts).result()
+
+    async def embed_batch_async(self, texts: List[str]) -> np.ndarray:
+        return await asyncio.wrap_future(self.submit(texts))
+
+    def embed(self, text: str) -> np.ndarray:
+        """Single query — bypasses the batching window."""
+        return self._emb.embed(text)
+
+    @property
+    def dimensions(self) -> int:
+        return self._emb.dimensions
+
+    @property
+    def model_id(self) -> str:
+        return self._emb.model_id
+
+    # ── worker ──────────────────────────────────────────────────────────────
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run, name="embedding-batcher", daemon=True
+                )
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            try:
+                self._flush(self._collect())
+            except Exception as exc:   # never let the worker die
+                logger.error("EmbeddingBatcher worker error: %s", exc, exc_info=True)
+
+    def _collect(self) -> List[Tuple[List[str], Future]]:
+        pending = [self._queue.get()]
+        count = len(pending[0][0])
+        deadline = time.monotonic() + self._window
+        while count < self._max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            pending.append(item)
+            count += len(item[0])
+        return pending
+
+    def _flush(self, pending: List[Tuple[List[str], Future]]):
+        # Drop callers that cancelled while queued (e.g. asyncio.wrap_future)
+        pending = [(b, f) for b, f in pending if f.set_running_or_notify_cancel()]
+        if not pending:
+            return
+
+        texts = [t for batch, _ in pending for t in batch]
+        try:
+            vecs = self._emb.embed_batch(texts)
+        except Exception as exc:
+            if len(pending) == 1:
+                pending[0][1].set_exception(exc)
+                return
+            # Don't let one caller's bad input fail everyone else's request.
+            # Retry off the worker thread so later callers aren't blocked.
+            logger.warning(
+                "EmbeddingBatcher: merged batch of %d callers failed (%s) — retrying individually",
+                len(pending), exc,
+            )
+            pool = self._get_retry_pool()
+            for batch, fut in pending:
+                pool.submit(self._retry_one, batch, fut)
+            return
+
+        offset = 0
+        for batch, fut in pending:
+            fut.set_result(vecs[offset : offset + len(batch)])
+            offset += len(batch)
+        logger.debug(
+            "EmbeddingBatcher: flushed %d texts from %d callers", len(texts), len(pending)
+        )
+
+    def _retry_one(self, batch: List[str], fut: Future):
+        try:
+            fut.set_result(self._emb.embed_batch(batch))
+        except Exception as exc:
+            fut.set_exception(exc)
+
+    def _get_retry_pool(self) -> ThreadPoolExecutor:
+        if self._retry_pool is None:
+            with self._lock:
+                if self._retry_pool is None:
+                    self._retry_pool = ThreadPoolExecutor(
+                        max_workers=4, thread_name_prefix="embedding-retry"
+                    )
+        return self._retry_pool
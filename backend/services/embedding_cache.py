@@ -0,0 +1,222 @@
+"""
+services/embedding_cache.py — Persistent exact-match embedding cache.
+
+Vectors are stored in a small SQLite file keyed on sha256(model \\0 text), so
+re-indexing an unchanged document never goes back to the provider.  The
+model id is part of the key: switching providers (or local models) can't
+return vectors of the wrong dimension.
+
+Values are float32 bytes, zstd-compressed (level 1) when the optional
+zstandard package is installed and compression actually saves space; raw
+rows are still read, so existing cache files stay valid.  Vectors come back
+already L2-normalised, as EmbeddingService stored them.  The connection is
+opened on first use, never at import time, and the file runs in WAL mode so
+gunicorn / Celery workers can share it.
+
+The file is capped at EMBEDDING_CACHE_MAX_ROWS entries (0 = unbounded): once
+a put goes over, the oldest-inserted rows are deleted down to 90% of the cap,
+so pruning runs once per ~10% of growth rather than on every insert.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, List, Optional
+
+import numpy as np
+
+try:
+    import zstandard as _zstd
+except ImportError:  # optional — vectors are stored uncompressed
+    _zstd = None
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "embedding_cache.db"
+)
+# Stay well under SQLITE_MAX_VARIABLE_NUMBER on older builds (999).
+_SELECT_CHUNK = 500
+# Frame magic for zstd blobs.  As the first float32 of a stored vector it
+# would be about -1.5e37, which a normalised embedding can't contain.
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+# Prune down to this fraction of max_rows once the cap is exceeded
+_PRUNE_TO = 0.9
+
+
+class EmbeddingCache:
+    """Thread-safe sha256 → vector cache.  Instantiate once as a module-level singleton."""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        enabled: Optional[bool] = None,
+        max_rows: Optional[int] = None,
+    ):
+        self.path = path or os.getenv("EMBEDDING_CACHE_PATH", _DEFAULT_PATH)
+        self.enabled = (
+            enabled if enabled is not None
+            else os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+        )
+        self.max_rows = max(
+            0,
+            max_rows if max_rows is not None
+            else int(os.getenv("EMBEDDING_CACHE_MAX_ROWS", "200000")),
+        )
+        self._conn: Optional[sqlite3.Connection] = None
+        self._rows = 0   # approximate row count; re-read from the file before pruning
+        self._lock = threading.Lock()
+        # zstd contexts aren't safe for concurrent use; only touched under _lock
+        self._cctx = _zstd.ZstdCompressor(level=1) if _zstd else None
+        self._dctx = _zstd.ZstdDecompressor() if _zstd else None
+        self.hits = 0
+        self.misses = 0
+
+    # ── public API ──────────────────────────────────────────────────────────
+
+    @staticmethod
+    def key(model: str, text: str) -> bytes:
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).digest()
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Return one vector per text, in input order; None marks a miss."""
+        if not self.enabled or not model or not texts:
+            return [None] * len(texts)
+        keys = [self.key(model, t) for t in texts]
+        found: dict = {}
+        try:
+            with self._lock:
+                conn = self._connect()
+                unique = list(dict.fromkeys(keys))
+                for i in range(0, len(unique), _SELECT_CHUNK):
+                    chunk = unique[i : i + _SELECT_CHUNK]
+                    marks = ",".join("?" * len(chunk))
+                    rows = conn.execute(
+                        f"SELECT hash, vec FROM embeddings WHERE hash IN ({marks})",
+                        chunk,
+                    ).fetchall()
+                    found.update(rows)
+                vecs = {k: self._decode(blob) for k, blob in found.items()}
+        except (sqlite3.Error, ValueError) as exc:
+            logger.warning("EmbeddingCache.get_many failed: %s", exc)
+            return [None] * len(texts)
+
+        out = [vecs.get(k) for k in keys]
+        # Not out.count(None): list.count compares with ==, elementwise on arrays
+        hits = sum(v is not None for v in out)
+        self.hits += hits
+        self.misses += len(texts) - hits
+        return out
+
+    def put_many(self, model: str, texts: List[str], vecs: List[np.ndarray]) -> None:
+        """Store *vecs* for *texts*; existing entries are left untouched."""
+        if not self.enabled or not model or not texts:
+            return
+        try:
+            with self._lock:
+                now = int(time.time())
+                rows = [
+                    (self.key(model, t), self._encode(np.asarray(v, dtype=np.float32).tobytes()), now)
+                    for t, v in zip(texts, vecs)
+                ]
+                conn = self._connect()
+                cur = conn.executemany(
+                    "INSERT OR IGNORE INTO embeddings (hash, vec, ts) VALUES (?, ?, ?)", rows
+                )
+                self._rows += max(cur.rowcount, 0)
+                if self.max_rows and self._rows > self.max_rows:
+                    self._prune(conn)
+                conn.commit()
+        except sqlite3.Error as exc:
+            logger.warning("EmbeddingCache.put_many failed: %s", exc)
+
+    def embed_through(
+        self, model: str, texts: List[str], embed: Callable[[List[str]], np.ndarray]
+    ) -> np.ndarray:
+        """
+        (len(texts), dim) vectors for *texts*: hits come from the cache, and
+        only the misses go to *embed* (then get stored), in one bulk lookup.
+        """
+        vecs = self.get_many(model, texts)
+        miss_idx = [i for i, v in enumerate(vecs) if v is None]
+        if not miss_idx:
+            return np.vstack(vecs) if vecs else np.empty((0, 0), dtype=np.float32)
+        misses = [texts[i] for i in miss_idx]
+        fresh = embed(misses)
+        self.put_many(model, misses, fresh)
+        if len(miss_idx) == len(texts):
+            return np.asarray(fresh, dtype=np.float32)
+        for i, v in zip(miss_idx, fresh):
+            vecs[i] = v
+        return np.vstack(vecs)
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of looked-up texts served from the cache so far."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # ── internals ───────────────────────────────────────────────────────────
+
+    def _encode(self, raw: bytes) -> bytes:
+        """zstd-compress *raw* when available and smaller.  Caller holds self._lock."""
+        if self._cctx is None:
+            return raw
+        blob = self._cctx.compress(raw)
+        return blob if len(blob) < len(raw) else raw
+
+    def _decode(self, blob: bytes) -> np.ndarray:
+        """Inverse of _encode.  Caller holds self._lock."""
+        if blob[:4] == _ZSTD_MAGIC:
+            if self._dctx is None:
+                raise ValueError("zstd-compressed cache entry but zstandard is not installed")
+            try:
+                blob = self._dctx.decompress(blob)
+            except _zstd.ZstdError as exc:
+                raise ValueError(f"corrupt zstd cache entry: {exc}") from exc
+        return np.frombuffer(blob, dtype=np.float32)
+
+    def _prune(self, conn: sqlite3.Connection) -> None:
+        """Delete the oldest-inserted rows down to _PRUNE_TO of max_rows.  Caller holds self._lock."""
+        total = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = total - int(self.max_rows * _PRUNE_TO)
+        if excess > 0 and total > self.max_rows:
+            conn.execute(
+                "DELETE FROM embeddings WHERE hash IN "
+                "(SELECT hash FROM embeddings ORDER BY ts LIMIT ?)",
+                (excess,),
+            )
+            total -= excess
+            logger.info("EmbeddingCache pruned %d rows (%d left)", excess, total)
+        self._rows = total
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open (and create) the cache file.  Caller holds self._lock."""
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(hash BLOB PRIMARY KEY, vec BLOB NOT NULL, ts INTEGER NOT NULL DEFAULT 0) "
+                "WITHOUT ROWID"
+            )
+            # Files created before the size cap have no insertion time; their
+            # rows count as oldest and go first.
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(embeddings)")}
+            if "ts" not in columns:
+                conn.execute("ALTER TABLE embeddings ADD COLUMN ts INTEGER NOT NULL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS embeddings_ts ON embeddings (ts)")
+            conn.commit()
+            self._rows = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            self._conn = conn
+        return self._conn
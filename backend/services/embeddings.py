@@ -2,28 +2,108 @@
 services/embeddings.py — Embedding service without LangChain.
 
 Auto-detects provider:
-  OPENAI_API_KEY  → text-embedding-3-small (1536 dims)
-  GOOGLE_API_KEY  → gemini-embedding-001   (768 dims)
+  EMBEDDING_BACKEND=local → sentence-transformers on CPU (all-MiniLM-L6-v2, 384 dims)
+  OPENAI_API_KEY          → text-embedding-3-small (1536 dims)
+  GOOGLE_API_KEY          → gemini-embedding-001   (768 dims)
 
 Vectors are L2-normalised at return time, so cosine-similarity == dot-product.
 """
 
 import logging
 import os
+import threading
 import time
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List
 
 import numpy as np
 
+from utils import fastjson
+
 logger = logging.getLogger(__name__)
 
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+def _normalize_rows(mat: np.ndarray) -> None:
+    """
+    L2-normalise each row of an (n, dim) float32 matrix in place.  One
+    vectorised pass per batch; all-zero rows are left as they are.
+    """
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    mat /= norms
+
+
+# ── OpenAI request budgeting ─────────────────────────────────────────────────
+# text-embedding-3-small rejects inputs over 8191 tokens and requests over
+# 300k tokens total.  tiktoken is optional: without it, len/3 over-estimates
+# English token counts so batches stay under budget.
+
+_OPENAI_MAX_ITEMS = 200
+_OPENAI_MAX_INPUT_TOKENS = 8191
+_OPENAI_MAX_REQUEST_TOKENS = 300_000
+
+_encoder = None
+_encoder_loaded = False
+
+
+def _get_encoder():
+    global _encoder, _encoder_loaded
+    if not _encoder_loaded:
+        _encoder_loaded = True
+        try:
+            import tiktoken
+            _encoder = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoder = None
+    return _encoder
 
-def _normalize(vec: np.ndarray) -> np.ndarray:
-    """L2-normalise a 1-D float32 array in-place and return it."""
-    norm = np.linalg.norm(vec)
-    if norm > 0:
-        vec = vec / norm
-    return vec.astype(np.float32)
+
+def _fit_tokens(text: str, limit: int = _OPENAI_MAX_INPUT_TOKENS) -> tuple:
+    """Return (text truncated to *limit* tokens, its token count)."""
+    enc = _get_encoder()
+    if enc is not None:
+        tokens = enc.encode(text)
+        if len(tokens) > limit:
+            return enc.decode(tokens[:limit]), limit
+        return text, len(tokens)
+    if len(text) > limit * 3:
+        text = text[: limit * 3]
+    return text, len(text) // 3 + 1
+
+
+def _token_batches(
+    texts: List[str],
+    max_items: int = _OPENAI_MAX_ITEMS,
+    max_tokens: int = _OPENAI_MAX_REQUEST_TOKENS,
+) -> Iterator[List[str]]:
+    """Split *texts* (in order) into batches under both the item and token caps."""
+    batch: List[str] = []
+    used = 0
+    for text in texts:
+        text, n = _fit_tokens(text)
+        if batch and (len(batch) >= max_items or used + n > max_tokens):
+            yield batch
+            batch, used = [], 0
+        batch.append(text)
+        used += n
+    if batch:
+        yield batch
+
+
+# ── Local (sentence-transformers) ────────────────────────────────────────────
+# Opt-in with EMBEDDING_BACKEND=local; sentence-transformers is an optional
+# dependency and only imported when the local backend is selected.  If it is
+# missing, the service logs an error and falls back to the remote provider.
+
+LOCAL_EMBEDDING_MODEL = os.getenv(
+    "LOCAL_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"
+)
+_LOCAL_BATCH_SIZE = 64
+
+# Provider requests in flight at once when a call spans several batches
+EMBED_REQUEST_WORKERS = int(os.getenv("EMBED_REQUEST_WORKERS", "8"))
 
 
 class EmbeddingService:
@@ -32,7 +112,13 @@ class EmbeddingService:
     def __init__(self):
         self._provider = None   # lazily resolved on first call
         self._dim = None
-        self._client = None     # openai.OpenAI or None
+        self._client = None     # openai.OpenAI or None — see _get_openai_client()
+        self._openai_key = None
+        self._pool_gen = 0      # llm._pool_generation the client was built on
+        self._local_model = None  # SentenceTransformer when provider == "local"
+        self._gemini_url = None   # batchEmbedContents URL, key baked in at resolve time
+        self._pool = None            # ThreadPoolExecutor for multi-batch calls — lazy
+        self._pool_lock = threading.Lock()
 
     # ── public API ──────────────────────────────────────────────────────────
 
@@ -41,12 +127,27 @@ class EmbeddingService:
         results = self.embed_batch([text])
         return results[0]
 
-    def embed_batch(self, texts: List[str]) -> List[np.ndarray]:
-        """Return a list of normalised float32 vectors for *texts*."""
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        """
+        Return normalised float32 vectors for *texts* as one contiguous
+        (len(texts), dim) array; iterating it yields the per-text rows.
+        Identical texts (repeated headers, footers, boilerplate) are sent
+        to the provider once and their row is fanned back out by index.
+        """
         if not texts:
-            return []
+            self._get_provider()
+            return np.empty((0, self._dim), dtype=np.float32)
+        unique = list(dict.fromkeys(texts))
+        if len(unique) == len(texts):
+            return self._embed_unique(texts)
+        row = {text: i for i, text in enumerate(unique)}
+        return self._embed_unique(unique)[[row[text] for text in texts]]
+
+    def _embed_unique(self, texts: List[str]) -> np.ndarray:
         provider = self._get_provider()
-        if provider == "openai":
+        if provider == "local":
+            return self._embed_local(texts)
+        elif provider == "openai":
             return self._embed_openai(texts)
         elif provider == "gemini":
             return self._embed_gemini(texts)
@@ -62,21 +163,54 @@ class EmbeddingService:
         self._get_provider()  # ensure resolved
         return self._dim or 1536
 
+    @property
+    def model_id(self) -> str:
+        """Stable id of the active embedding model ("" when none is configured)."""
+        provider = self._get_provider()
+        if provider == "local":
+            return f"local:{LOCAL_EMBEDDING_MODEL}"
+        if provider == "openai":
+            return "openai:text-embedding-3-small"
+        if provider == "gemini":
+            return "gemini:gemini-embedding-001"
+        return ""
+
     # ── provider resolution ─────────────────────────────────────────────────
 
     def _get_provider(self) -> str:
         if self._provider:
             return self._provider
 
-        if os.getenv("OPENAI_API_KEY"):
+        SentenceTransformer = None
+        if os.getenv("EMBEDDING_BACKEND", "").lower() == "local":
+            try:
+                from sentence_transformers import SentenceTransformer
+            except ImportError:
+                logger.error(
+                    "EmbeddingService: EMBEDDING_BACKEND=local but sentence-transformers "
+                    "is not installed (pip install sentence-transformers) — falling back "
+                    "to the remote embedding provider"
+                )
+
+        if SentenceTransformer is not None:
+            self._local_model = SentenceTransformer(LOCAL_EMBEDDING_MODEL, device="cpu")
+            self._provider = "local"
+            self._dim = self._local_model.get_sentence_embedding_dimension()
+            logger.info(
+                f"EmbeddingService: using local {LOCAL_EMBEDDING_MODEL} ({self._dim}d)"
+            )
+        elif openai_key := os.getenv("OPENAI_API_KEY"):
             self._provider = "openai"
             self._dim = 1536
-            import openai
-            self._client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+            self._openai_key = openai_key
             logger.info("EmbeddingService: using OpenAI text-embedding-3-small (1536d)")
-        elif os.getenv("GOOGLE_API_KEY"):
+        elif google_key := os.getenv("GOOGLE_API_KEY"):
             self._provider = "gemini"
             self._dim = 768
+            self._gemini_url = (
+                f"https://generativelanguage.googleapis.com/v1beta/models/"
+                f"gemini-embedding-001:batchEmbedContents?key={google_key}"
+            )
             logger.info("EmbeddingService: using Gemini embedding-001 (768d)")
         else:
             # Fall back to a zero-vector stub so the app doesn't crash completely
@@ -89,53 +223,116 @@ class EmbeddingService:
 
         return self._provider
 
-    # ── OpenAI ──────────────────────────────────────────────────────────────
+    # ── Local ───────────────────────────────────────────────────────────────
+
+    def _embed_local(self, texts: List[str]) -> np.ndarray:
+        """Encode on CPU; the model already L2-normalises its output."""
+        mat = self._local_model.encode(
+            texts,
+            batch_size=_LOCAL_BATCH_SIZE,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+        )
+        return np.ascontiguousarray(mat, dtype=np.float32)
+
+    # ── Request fan-out ─────────────────────────────────────────────────────
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        """Dedicated pool for provider requests, created on first multi-batch call."""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=EMBED_REQUEST_WORKERS, thread_name_prefix="embed"
+                    )
+        return self._pool
 
-    def _embed_openai(self, texts: List[str]) -> List[np.ndarray]:
-        BATCH = 200
-        results: List[np.ndarray] = []
-        for i in range(0, len(texts), BATCH):
-            batch = texts[i : i + BATCH]
+    def _run_batches(self, label: str, post, batches: List[List[str]], out: np.ndarray) -> np.ndarray:
+        """
+        Fill *out* with one *post*(batch) result per batch, in order.  Batches
+        are independent requests, so several are in flight at once; each row
+        slice is fixed up front, so completion order doesn't matter.
+        """
+        slices = []
+        start = 0
+        for batch in batches:
+            slices.append((batch, out[start : start + len(batch)]))
+            start += len(batch)
+
+        def _one(batch: List[str], rows: np.ndarray) -> None:
             for attempt in range(4):
                 try:
-                    resp = self._client.embeddings.create(
-                        model="text-embedding-3-small",
-                        input=batch,
-                    )
-                    for item in resp.data:
-                        vec = np.array(item.embedding, dtype=np.float32)
-                        results.append(_normalize(vec))
+                    # A short or misshapen response raises here and is retried;
+                    # a bare assignment would broadcast one row into all of them.
+                    arr = np.asarray(post(batch), dtype=np.float32)
+                    if arr.shape != rows.shape:
+                        raise ValueError(
+                            f"expected {rows.shape} embeddings, got {arr.shape}"
+                        )
+                    rows[...] = arr
                     break
                 except Exception as exc:
                     wait = 2 ** attempt
                     logger.warning(
-                        f"OpenAI embed attempt {attempt + 1} failed: {exc}. "
+                        f"{label} embed attempt {attempt + 1} failed: {exc}. "
                         f"Retrying in {wait}s."
                     )
                     time.sleep(wait)
                     if attempt == 3:
                         raise
-        return results
+            _normalize_rows(rows)
+
+        if len(slices) == 1:
+            _one(*slices[0])
+        else:
+            for fut in [self._get_pool().submit(_one, b, r) for b, r in slices]:
+                fut.result()
+        return out
+
+    # ── OpenAI ──────────────────────────────────────────────────────────────
+
+    def _get_openai_client(self):
+        """
+        OpenAI client on LLMService's shared sync pool, rebuilt after
+        aclose_http_clients() has closed the pool it was built on.
+        """
+        from services.llm import _get_http_client, _get_pool_generation
+
+        generation = _get_pool_generation()
+        if self._client is None or self._pool_gen != generation:
+            import openai
+            self._client = openai.OpenAI(api_key=self._openai_key, http_client=_get_http_client())
+            self._pool_gen = generation
+        return self._client
+
+    def _embed_openai(self, texts: List[str]) -> np.ndarray:
+        client = self._get_openai_client()
+
+        def _post(batch: List[str]) -> list:
+            resp = client.embeddings.create(
+                model="text-embedding-3-small",
+                input=batch,
+            )
+            return [item.embedding for item in resp.data]
+
+        out = np.empty((len(texts), self._dim), dtype=np.float32)
+        return self._run_batches("OpenAI", _post, list(_token_batches(texts)), out)
 
     # ── Gemini ──────────────────────────────────────────────────────────────
 
-    def _embed_gemini(self, texts: List[str]) -> List[np.ndarray]:
+    def _embed_gemini(self, texts: List[str]) -> np.ndarray:
         """
         Uses the Gemini REST batchEmbedContents endpoint directly —
-        no LangChain, no google-generativeai SDK required beyond `requests`.
+        no LangChain, no google-generativeai SDK.  Batches go through the
+        process-wide httpx pool (HTTP/2 when h2 is installed), so concurrent
+        batches share keep-alive connections instead of each paying for TLS.
         """
-        import requests
-
-        api_key = os.getenv("GOOGLE_API_KEY")
-        url = (
-            f"https://generativelanguage.googleapis.com/v1beta/models/"
-            f"gemini-embedding-001:batchEmbedContents?key={api_key}"
-        )
-        BATCH = 100
-        results: List[np.ndarray] = []
+        from services.llm import _get_http_client
+        http = _get_http_client()
+        url = self._gemini_url
 
-        for i in range(0, len(texts), BATCH):
-            batch = texts[i : i + BATCH]
+        def _post(batch: List[str]) -> list:
             payload = {
                 "requests": [
                     {
@@ -145,23 +342,11 @@ class EmbeddingService:
                     for t in batch
                 ]
             }
-            for attempt in range(4):
-                try:
-                    resp = requests.post(url, json=payload, timeout=60)
-                    resp.raise_for_status()
-                    data = resp.json()
-                    for emb in data.get("embeddings", []):
-                        vec = np.array(emb["values"], dtype=np.float32)
-                        results.append(_normalize(vec))
-                    break
-                except Exception as exc:
-                    wait = 2 ** attempt
-                    logger.warning(
-                        f"Gemini embed attempt {attempt + 1} failed: {exc}. "
-                        f"Retrying in {wait}s."
-                    )
-                    time.sleep(wait)
-                    if attempt == 3:
-                        raise
+            resp = http.post(url, content=fastjson.dumpb(payload), headers=_JSON_HEADERS, timeout=60)
+            resp.raise_for_status()
+            return [e["values"] for e in fastjson.loads(resp.content).get("embeddings", [])]
 
-        return results
+        BATCH = 100
+        batches = [texts[i : i + BATCH] for i in range(0, len(texts), BATCH)]
+        out = np.empty((len(texts), self._dim), dtype=np.float32)
+        return self._run_batches("Gemini", _post, batches, out)
@@ -1,6 +1,8 @@
 import os
 import logging
-from typing import Optional, List
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Optional, List, Tuple
 from pathlib import Path
 
 import pdfplumber
@@ -19,6 +21,33 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# Below this much text PyMuPDF's result is treated as a miss (scanned PDF)
+# and pdfplumber gets a try.
+_MIN_PDF_TEXT_CHARS = 50
+
+# PyMuPDF documents can't be shared across threads, so page-parallel
+# extraction uses processes, each opening the file for its own page range.
+# Off by default (0/1 = serial): process start-up only pays off on long PDFs,
+# and daemonic workers (Celery prefork) can't fork children.
+PDF_EXTRACT_PROCESSES = int(os.getenv("PDF_EXTRACT_PROCESSES", "0"))
+_PARALLEL_MIN_PAGES = 64
+
+
+def _page_texts(doc, indices: Iterable[int]) -> List[dict]:
+    """[{page, text}] for the non-empty pages at *indices* (0-based), plain-text mode."""
+    pages = []
+    for i in indices:
+        text = doc[i].get_text("text").strip()
+        if text:
+            pages.append({"page": i + 1, "text": text})
+    return pages
+
+
+def _pymupdf_page_range(filepath: str, start: int, stop: int) -> List[dict]:
+    """Process-pool task: open *filepath* and extract pages [start, stop)."""
+    with fitz.open(filepath) as doc:
+        return _page_texts(doc, range(start, stop))
+
 
 # ── Pure-Python recursive text splitter (replaces LangChain RecursiveCharacterTextSplitter) ──
 
@@ -35,58 +64,73 @@ def _recursive_split(
     Split text recursively using a list of separators, matching LangChain's
     RecursiveCharacterTextSplitter behaviour with the same defaults.
     """
-    if separators is None:
-        separators = _SEPARATORS
-
     if len(text) <= chunk_size:
         return [text] if text.strip() else []
 
+    if separators is None:
+        # A separator missing from the whole document is missing from every
+        # part, so it is checked once here rather than per oversized part at
+        # every recursion level.  `in` stops at the first hit, so present
+        # separators cost almost nothing.
+        separators = [sep for sep in _SEPARATORS if sep == "" or sep in text]
+
     # Try each separator until we find one that actually splits the text
-    for sep in separators:
+    for i, sep in enumerate(separators):
         if sep == "":
-            # Last resort: split by character count
-            chunks = []
-            start = 0
-            while start < len(text):
-                end = start + chunk_size
-                chunks.append(text[start:end])
-                start = end - chunk_overlap
-            return [c for c in chunks if c.strip()]
+            # Last resort: fixed-size windows every chunk_size - chunk_overlap
+            # characters (at least 1, so an overlap >= chunk_size can't stall)
+            step = max(chunk_size - chunk_overlap, 1)
+            windows = (text[start:start + chunk_size] for start in range(0, len(text), step))
+            return [c for c in windows if c.strip()]
 
         if sep not in text:
             continue
 
-        parts = text.split(sep)
+        # Chunks are built as part lists plus a running length and joined
+        # once when emitted, instead of re-concatenating the growing string
+        # for every part.
+        sep_len = len(sep)
+        finer = separators[i + 1:] or [""]
         chunks: List[str] = []
-        current = ""
-
-        for part in parts:
-            candidate = (current + sep + part) if current else part
-            if len(candidate) <= chunk_size:
-                current = candidate
+        current: List[str] = []
+        current_len = 0
+
+        for part in text.split(sep):
+            if current_len:
+                if current_len + sep_len + len(part) <= chunk_size:
+                    current.append(part)
+                    current_len += sep_len + len(part)
+                    continue
+                chunks.append(sep.join(current))
+            elif len(part) <= chunk_size:
+                current, current_len = [part], len(part)
+                continue
+            # If a single part is larger than chunk_size, recurse
+            if len(part) > chunk_size:
+                sub = _recursive_split(part, chunk_size, chunk_overlap, finer)
+                chunks.extend(sub)
+                tail = sub[-1][-chunk_overlap:] if sub else ""
+                current, current_len = [tail], len(tail)
             else:
-                if current:
-                    chunks.append(current)
-                # If a single part is larger than chunk_size, recurse
-                if len(part) > chunk_size:
-                    sub = _recursive_split(part, chunk_size, chunk_overlap, separators[separators.index(sep)+1:] or [""])
-                    chunks.extend(sub)
-                    current = sub[-1][-chunk_overlap:] if sub else ""
-                else:
-                    current = part
-
-        if current.strip():
-            chunks.append(current)
+                current, current_len = [part], len(part)
+
+        if current_len:
+            last = sep.join(current)
+            if last.strip():
+                chunks.append(last)
 
         # Apply overlap by merging adjacent chunks when possible
-        merged: List[str] = []
+        merged: List[List[str]] = []
+        merged_len = 0
         for chunk in chunks:
-            if merged and len(merged[-1]) + len(chunk) + len(sep) <= chunk_size:
-                merged[-1] = merged[-1] + sep + chunk
+            if merged and merged_len + len(chunk) + sep_len <= chunk_size:
+                merged[-1].append(chunk)
+                merged_len += sep_len + len(chunk)
             else:
-                merged.append(chunk)
+                merged.append([chunk])
+                merged_len = len(chunk)
 
-        return [c for c in merged if c.strip()]
+        return [c for c in map(sep.join, merged) if c.strip()]
 
     return [text]
 
@@ -95,10 +139,21 @@ class FileService:
     def __init__(self):
         self.supported_extensions = ['.pdf', '.docx', '.txt', '.png', '.jpg', '.jpeg', '.mp3', '.wav', '.m4a', '.webm', '.ogg']
         self.max_file_size = 10 * 1024 * 1024  # 10MB
-
-    def detect_file_type(self, filepath: str) -> str:
+        self._tess_api = None   # tesserocr.PyTessBaseAPI — lazy, model loaded once
+        self._tess_lock = threading.Lock()   # the Tesseract API isn't thread-safe
+
+    @staticmethod
+    def _inspect(filepath: str) -> Tuple[os.stat_result, str]:
+        """
+        One os.stat plus the lower-cased extension.  Callers that check type,
+        size and info for the same file pass this along as *stat_cache*
+        instead of paying a syscall per check.  Raises OSError if missing.
+        """
+        return os.stat(filepath), Path(filepath).suffix.lower()
+
+    def detect_file_type(self, filepath: str, stat_cache: Optional[Tuple[os.stat_result, str]] = None) -> str:
         """Detect file type from extension. Returns 'pdf', 'docx', 'txt', 'image', or 'audio'."""
-        ext = Path(filepath).suffix.lower()
+        ext = stat_cache[1] if stat_cache else Path(filepath).suffix.lower()
         if ext == '.pdf':
             return 'pdf'
         elif ext == '.docx':
@@ -111,11 +166,11 @@ class FileService:
             return 'audio'
         return 'unknown'
 
-    def extract_text_universal(self, filepath: str) -> Optional[List[dict]]:
+    def extract_text_universal(self, filepath: str, stat_cache: Optional[Tuple[os.stat_result, str]] = None) -> Optional[List[dict]]:
         """Route to the correct extractor based on file type. Returns [{page, text}]."""
-        file_type = self.detect_file_type(filepath)
+        file_type = self.detect_file_type(filepath, stat_cache)
         if file_type == 'pdf':
-            return self.extract_text_with_pages(filepath)
+            return self.extract_text_with_pages(filepath, stat_cache)
         elif file_type == 'docx':
             return self._extract_docx(filepath)
         elif file_type == 'txt':
@@ -131,15 +186,21 @@ class FileService:
         try:
             from docx import Document
             doc = Document(filepath)
-            paragraphs = [p.text for p in doc.paragraphs if p.text.strip()]
-            if not paragraphs:
-                return None
-            # Treat each ~20 paragraphs as a "page"
+            # Treat each ~20 paragraphs as a "page".  One pass; Paragraph.text
+            # re-joins the runs on every access, so it is read once.
             pages = []
+            buf = []
             chunk_size = 20
-            for i in range(0, len(paragraphs), chunk_size):
-                text = "\n".join(paragraphs[i:i + chunk_size])
-                pages.append({"page": (i // chunk_size) + 1, "text": text})
+            for p in doc.paragraphs:
+                text = p.text
+                if not text.strip():
+                    continue
+                buf.append(text)
+                if len(buf) == chunk_size:
+                    pages.append({"page": len(pages) + 1, "text": "\n".join(buf)})
+                    buf.clear()
+            if buf:
+                pages.append({"page": len(pages) + 1, "text": "\n".join(buf)})
             return pages if pages else None
         except Exception as e:
             logger.error(f"DOCX extraction failed: {e}")
@@ -148,35 +209,34 @@ class FileService:
     def _extract_txt(self, filepath: str) -> Optional[List[dict]]:
         """Extract text from plain text file."""
         try:
-            with open(filepath, "r", encoding="utf-8", errors="replace") as f:
-                content = f.read()
-            if not content.strip():
-                return None
-            # Split into ~2000-char "pages"
+            # Split into ~2000-char "pages", streaming lines off a 1 MB buffer;
+            # each page is joined once instead of growing a str per line.
             pages = []
-            lines = content.split("\n")
-            current_text = ""
-            page_num = 1
-            for line in lines:
-                if len(current_text) + len(line) > 2000 and current_text:
-                    pages.append({"page": page_num, "text": current_text.strip()})
-                    page_num += 1
-                    current_text = ""
-                current_text += line + "\n"
-            if current_text.strip():
-                pages.append({"page": page_num, "text": current_text.strip()})
-            return pages if pages else None
+            cur_lines = []
+            cur_len = 0
+            with open(filepath, "r", encoding="utf-8", errors="replace", buffering=1 << 20) as f:
+                for line in f:
+                    line_len = len(line) - line.endswith("\n")
+                    if cur_len + line_len > 2000 and cur_lines:
+                        pages.append({"page": len(pages) + 1, "text": "".join(cur_lines).strip()})
+                        cur_lines.clear()
+                        cur_len = 0
+                    cur_lines.append(line)
+                    cur_len += line_len + 1
+            text = "".join(cur_lines).strip()
+            if text:
+                pages.append({"page": len(pages) + 1, "text": text})
+            return pages if any(p["text"] for p in pages) else None
         except Exception as e:
             logger.error(f"TXT extraction failed: {e}")
             return None
 
     def _extract_image_ocr(self, filepath: str) -> Optional[List[dict]]:
-        """Extract text from image using pytesseract OCR."""
+        """Extract text from image using tesserocr, or pytesseract without it."""
         try:
-            import pytesseract
             from PIL import Image
             img = Image.open(filepath)
-            text = pytesseract.image_to_string(img)
+            text = self._ocr(img)
             if not text.strip():
                 return [{"page": 1, "text": "[Image uploaded — no text detected by OCR]"}]
             return [{"page": 1, "text": text.strip()}]
@@ -184,6 +244,23 @@ class FileService:
             logger.error(f"OCR extraction failed: {e}")
             return [{"page": 1, "text": "[Image uploaded — OCR unavailable]"}]
 
+    def _ocr(self, img) -> str:
+        """
+        OCR one PIL image.  tesserocr (optional) keeps a single in-process
+        Tesseract instance, so the LSTM model loads once; pytesseract starts
+        a tesseract subprocess, model load included, for every image.
+        """
+        try:
+            from tesserocr import PyTessBaseAPI
+        except ImportError:
+            import pytesseract
+            return pytesseract.image_to_string(img)
+        with self._tess_lock:
+            if self._tess_api is None:
+                self._tess_api = PyTessBaseAPI(lang="eng")
+            self._tess_api.SetImage(img)
+            return self._tess_api.GetUTF8Text()
+
     # ---- Existing PDF methods (kept intact) ----
 
     def chunking_function(self, text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[str]:
@@ -203,10 +280,11 @@ class FileService:
             if not self._validate_file(filepath):
                 return None
 
-            text = self._extract_with_pdfplumber(filepath)
-            if not text or len(text.strip()) < 50:
-                if PYMUPDF_AVAILABLE:
-                    text = self._extract_with_pymupdf(filepath)
+            # PyMuPDF reads content streams in C; pdfplumber builds a full
+            # layout tree, so it only runs when PyMuPDF finds (almost) nothing.
+            text = self._extract_with_pymupdf(filepath)
+            if not text or len(text.strip()) < _MIN_PDF_TEXT_CHARS:
+                text = self._extract_with_pdfplumber(filepath) or text
 
             if text:
                 logger.info(f"Successfully extracted text from {filepath}")
@@ -236,45 +314,61 @@ class FileService:
         if not PYMUPDF_AVAILABLE:
             return None
         try:
-            full_text = []
-            doc = fitz.open(filepath)
-            for page in doc:
-                text = page.get_text()
-                if text.strip():
-                    full_text.append(text.strip())
-            doc.close()
-            return "\n\n".join(full_text)
+            return "\n\n".join(p["text"] for p in self._pages_with_pymupdf(filepath))
         except Exception as e:
             logger.warning(f"PyMuPDF extraction failed: {str(e)}")
             return None
 
-    def extract_text_with_pages(self, filepath: str) -> Optional[list]:
+    @staticmethod
+    def _pages_with_pymupdf(filepath: str) -> List[dict]:
+        """[{page, text}] for non-empty pages, in plain-text mode."""
+        workers = min(PDF_EXTRACT_PROCESSES, os.cpu_count() or 1)
+        with fitz.open(filepath) as doc:
+            n = doc.page_count
+            if workers < 2 or n < _PARALLEL_MIN_PAGES:
+                return _page_texts(doc, range(n))
+
+        step = -(-n // workers)
+        starts = range(0, n, step)
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                parts = pool.map(
+                    _pymupdf_page_range,
+                    [filepath] * len(starts),
+                    starts,
+                    [min(start + step, n) for start in starts],
+                )
+                return [page for part in parts for page in part]
+        except Exception as e:
+            logger.warning(f"Parallel PyMuPDF extraction failed, running serially: {e}")
+            return _pymupdf_page_range(filepath, 0, n)
+
+    def extract_text_with_pages(self, filepath: str, stat_cache: Optional[Tuple[os.stat_result, str]] = None) -> Optional[list]:
         """Extract text from PDF with page numbers."""
         try:
-            if not self._validate_file(filepath):
+            if not self._validate_file(filepath, stat_cache):
                 return None
 
             pages = []
-            try:
-                with pdfplumber.open(filepath) as pdf:
-                    for i, page in enumerate(pdf.pages, start=1):
-                        text = page.extract_text() or ""
-                        if text.strip():
-                            pages.append({"page": i, "text": text.strip()})
-            except Exception as e:
-                logger.warning(f"pdfplumber page extraction failed: {e}")
-
-            if not pages and PYMUPDF_AVAILABLE:
+            if PYMUPDF_AVAILABLE:
                 try:
-                    doc = fitz.open(filepath)
-                    for i, page in enumerate(doc, start=1):
-                        text = page.get_text()
-                        if text.strip():
-                            pages.append({"page": i, "text": text.strip()})
-                    doc.close()
+                    pages = self._pages_with_pymupdf(filepath)
                 except Exception as e:
                     logger.warning(f"PyMuPDF page extraction failed: {e}")
 
+            # Scanned / image-only PDFs: retry with pdfplumber
+            if sum(len(p["text"]) for p in pages) < _MIN_PDF_TEXT_CHARS:
+                try:
+                    plumbed = []
+                    with pdfplumber.open(filepath) as pdf:
+                        for i, page in enumerate(pdf.pages, start=1):
+                            text = (page.extract_text() or "").strip()
+                            if text:
+                                plumbed.append({"page": i, "text": text})
+                    pages = plumbed or pages
+                except Exception as e:
+                    logger.warning(f"pdfplumber page extraction failed: {e}")
+
             return pages if pages else None
 
         except Exception as e:
@@ -286,29 +380,31 @@ class FileService:
         if not page_texts:
             return []
 
+        # Sequential on purpose: _recursive_split is pure Python and holds the
+        # GIL, so a thread pool over pages only adds scheduling overhead.
         try:
-            result = []
-            for pt in page_texts:
-                sub_chunks = _recursive_split(pt["text"], chunk_size, chunk_overlap)
-                for chunk in sub_chunks:
-                    result.append({"text": chunk, "pages": [pt["page"]]})
-            return result
+            return [
+                {"text": chunk, "pages": [pt["page"]]}
+                for pt in page_texts
+                for chunk in _recursive_split(pt["text"], chunk_size, chunk_overlap)
+            ]
         except Exception as e:
             logger.error(f"Error in chunking_function_with_pages: {e}")
             return [{"text": pt["text"], "pages": [pt["page"]]} for pt in page_texts]
 
-    def _validate_file(self, filepath: str) -> bool:
+    def _validate_file(self, filepath: str, stat_cache: Optional[Tuple[os.stat_result, str]] = None) -> bool:
         try:
-            if not os.path.exists(filepath):
+            try:
+                st, file_ext = stat_cache or self._inspect(filepath)
+            except FileNotFoundError:
                 logger.error(f"File not found: {filepath}")
                 return False
 
-            file_size = os.path.getsize(filepath)
+            file_size = st.st_size
             if file_size > self.max_file_size:
                 logger.error(f"File too large: {file_size} bytes")
                 return False
 
-            file_ext = Path(filepath).suffix.lower()
             if file_ext not in self.supported_extensions:
                 logger.error(f"Unsupported file type: {file_ext}")
                 return False
@@ -319,12 +415,13 @@ class FileService:
             logger.error(f"File validation error: {str(e)}")
             return False
 
-    def get_file_info(self, filepath: str) -> Optional[dict]:
+    def get_file_info(self, filepath: str, stat_cache: Optional[Tuple[os.stat_result, str]] = None) -> Optional[dict]:
         """Get basic information about a file."""
         try:
-            file_size = os.path.getsize(filepath)
+            st, _ = stat_cache or self._inspect(filepath)
+            file_size = st.st_size
             file_name = os.path.basename(filepath)
-            file_type = self.detect_file_type(filepath)
+            file_type = self.detect_file_type(filepath, stat_cache)
 
             page_count = 0
             if file_type == 'pdf' and PYMUPDF_AVAILABLE:
@@ -1,17 +1,33 @@
 """
-services/llm.py — Async LLM service.  No LangChain, no threading.
+services/llm.py — Async LLM service.  No LangChain.
 
 Provider chain: OpenRouter → OpenAI → Gemini (auto-detected from env vars).
 All async methods use openai.AsyncOpenAI.
-stream_sync() is a sync generator kept for the Explore Hub (explore.py router).
+stream() is the async token stream behind the Explore Hub (explore.py router);
+stream_sync() is its sync twin for callers without an event loop, bridged
+onto a background event loop for OpenAI-compatible models.
 """
 
+import asyncio
 import logging
 import os
-from typing import Iterator, List, Optional
+import queue
+import threading
+from dataclasses import dataclass
+from enum import IntEnum
+from functools import lru_cache
+from types import SimpleNamespace
+from typing import AsyncIterator, Iterator, List, Optional
 
 logger = logging.getLogger(__name__)
 
+
+class Provider(IntEnum):
+    OPENROUTER = 1
+    GEMINI = 2
+    OPENAI = 3
+
+
 # ── OR aliases (shorthand model IDs → OpenRouter paths) ─────────────────────
 _OR_ALIASES: dict = {
     "gpt-4o":            "openai/gpt-4o",
@@ -26,28 +42,258 @@ _OR_ALIASES: dict = {
     "claude-3-haiku":    "anthropic/claude-3-haiku",
 }
 
-_NO_TOOLS_MODELS = frozenset({
-    "DeepSeek-R1", "DeepSeek-V3", "o1", "o1-mini",
-    "deepseek-r1", "deepseek-v3",
-    "deepseek/deepseek-r1",
-})
+# Lower-cased once here; compare against model_id.lower()
+_NO_TOOLS_MODELS = frozenset(m.lower() for m in (
+    "DeepSeek-R1", "DeepSeek-V3", "o1", "o1-mini", "deepseek/deepseek-r1",
+))
+
+# Model IDs clients send to mean "use the default"
+_MISSING_SENTINELS = frozenset({"", "null", "none"})
+
+
+@lru_cache(maxsize=512)
+def _resolve_alias(model_id: str, provider: Provider) -> Optional[str]:
+    """
+    Map an explicit model ID to the provider's path, or None for a "use the
+    default" sentinel.  Pure, so memoised: repeat IDs skip the normalising.
+    """
+    if model_id.strip().lower() in _MISSING_SENTINELS:
+        return None
+    if provider is Provider.OPENROUTER and "/" not in model_id:
+        return _OR_ALIASES.get(model_id, model_id)
+    return model_id
+
+
+def _split_system(messages: List[dict]):
+    """
+    (leading system prompt or None, joined later system text).  Only the
+    leading prompt is stable across turns, so only it becomes the cached
+    model's system_instruction; per-question system text (memories,
+    deep-think) travels with the query instead.
+    """
+    base = None
+    if messages and messages[0]["role"] == "system":
+        base = messages[0]["content"] or None
+    volatile = "\n\n".join(
+        m["content"] for m in messages[1:] if m["role"] == "system" and m["content"]
+    )
+    return base, volatile
+
+
+@lru_cache(maxsize=32)
+def _gemini_model(genai, model: str, system_instruction: Optional[str]):
+    """
+    GenerativeModel per (model, system_instruction).  Chat system prompts
+    come from a handful of file_type/deep_think variants, so the SDK object
+    (and its client/config state) is built once and reused.
+    """
+    return genai.GenerativeModel(model_name=model, system_instruction=system_instruction)
+
+
+def _env(var: str, fallback: Optional[str] = None) -> Optional[str]:
+    v = os.environ.get(var, "").strip()
+    # Treat empty string and literal "null"/"none" (common .env mistake) as unset
+    return fallback if not v or v.lower() in ("null", "none") else v
+
+
+@dataclass(frozen=True)
+class LLMConfig:
+    """
+    Provider keys and model names, read from os.environ once at import.
+    Unset values are stored as None so misses don't re-probe the environment.
+    """
+
+    ai_provider: Optional[str]
+    openrouter_key: Optional[str]
+    openai_key: Optional[str]
+    google_key: Optional[str]
+    openrouter_chat_model: str
+    openai_chat_model: str
+    gemini_chat_model: str
+
+    @classmethod
+    def load(cls) -> "LLMConfig":
+        return cls(
+            ai_provider=(_env("AI_PROVIDER") or "").lower() or None,
+            openrouter_key=_env("OPENROUTER_API_KEY"),
+            openai_key=_env("OPENAI_API_KEY"),
+            google_key=_env("GOOGLE_API_KEY") or _env("GEMINI_API_KEY"),
+            openrouter_chat_model=_env("OPENROUTER_CHAT_MODEL", "openai/gpt-4o"),
+            openai_chat_model=_env("OPENAI_CHAT_MODEL", "gpt-4o"),
+            gemini_chat_model=_env("GEMINI_CHAT_MODEL", "gemini-2.0-flash"),
+        )
+
+
+CFG = LLMConfig.load()
+
+
+def reload_config() -> LLMConfig:
+    """Re-read the environment (tests / after load_dotenv)."""
+    global CFG
+    CFG = LLMConfig.load()
+    return CFG
+
+
+# ── Shared HTTP connection pools ─────────────────────────────────────────────
+# One pool per process for each of sync/async, so keep-alive TLS connections
+# are reused across requests and clients.  Built lazily (after any fork),
+# under a lock so concurrent first requests can't each build (and leak) one.
+# Closed by aclose_http_clients() from the app lifespan, which bumps
+# _pool_generation: clients built on a pool (LLMService, EmbeddingService,
+# AIService fallbacks) record the generation and rebuild once it moves on.
 
+_HTTP_LIMITS = dict(max_connections=100, max_keepalive_connections=50, keepalive_expiry=30.0)
+_HTTP_TIMEOUT = dict(timeout=120.0, connect=10.0)
+_http_client = None
+_async_http_client = None
+_http_lock = threading.Lock()
+_pool_generation = 0
 
-def _detect_provider() -> str:
-    p = os.getenv("AI_PROVIDER", "").lower()
-    if p in ("openrouter", "gemini", "openai"):
-        return p
-    if os.getenv("OPENROUTER_API_KEY"):
-        return "openrouter"
-    if os.getenv("OPENAI_API_KEY"):
-        return "openai"
-    if os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY"):
-        return "gemini"
-    return "openai"
+
+def _http2_available() -> bool:
+    """HTTP/2 lets concurrent streams share one connection; needs the h2 extra."""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _get_http_client():
+    global _http_client
+    if _http_client is None:
+        with _http_lock:
+            if _http_client is None:
+                import httpx
+                _http_client = httpx.Client(
+                    http2=_http2_available(),
+                    limits=httpx.Limits(**_HTTP_LIMITS),
+                    timeout=httpx.Timeout(**_HTTP_TIMEOUT),
+                )
+    return _http_client
+
+
+def _get_pool_generation() -> int:
+    """Bumped each time aclose_http_clients() closes the shared pools."""
+    return _pool_generation
+
+
+def _get_async_http_client():
+    global _async_http_client
+    if _async_http_client is None:
+        with _http_lock:
+            if _async_http_client is None:
+                import httpx
+                _async_http_client = httpx.AsyncClient(
+                    http2=_http2_available(),
+                    limits=httpx.Limits(**_HTTP_LIMITS),
+                    timeout=httpx.Timeout(**_HTTP_TIMEOUT),
+                )
+    return _async_http_client
+
+
+# ── Sync → async stream bridge ───────────────────────────────────────────────
+# stream_sync runs OpenAI-compatible streams as coroutines on one daemon
+# event loop, so every sync consumer shares that loop's async pool instead of
+# holding a blocking HTTP read per stream.  httpx connections belong to the
+# loop that opened them, so the bridge has its own pool
+# (_get_bridge_http_client), never the app loop's.  aclose_http_clients()
+# closes that pool and stops the loop; both are rebuilt if used again.
+
+_bridge_loop = None
+_bridge_http_client = None   # httpx.AsyncClient, only touched on the bridge loop
+_bridge_lock = threading.Lock()
+_STREAM_END = object()
+
+
+def _run_bridge_loop(loop: asyncio.AbstractEventLoop) -> None:
+    try:
+        loop.run_forever()
+    finally:
+        loop.close()
+
+
+def _get_bridge_loop() -> asyncio.AbstractEventLoop:
+    global _bridge_loop
+    if _bridge_loop is None:
+        with _bridge_lock:
+            if _bridge_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=_run_bridge_loop, args=(loop,), name="llm-stream-bridge", daemon=True
+                ).start()
+                _bridge_loop = loop
+    return _bridge_loop
+
+
+def _get_bridge_http_client():
+    """The bridge loop's pool.  Only called on that loop's thread, so no lock."""
+    global _bridge_http_client
+    if _bridge_http_client is None:
+        import httpx
+        _bridge_http_client = httpx.AsyncClient(
+            http2=_http2_available(),
+            limits=httpx.Limits(**_HTTP_LIMITS),
+            timeout=httpx.Timeout(**_HTTP_TIMEOUT),
+        )
+    return _bridge_http_client
+
+
+async def _shutdown_bridge() -> None:
+    """Runs on the bridge loop: cancel open streams, then close its pool."""
+    global _bridge_http_client
+    tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    client, _bridge_http_client = _bridge_http_client, None
+    if client is not None:
+        await client.aclose()
+
+
+async def aclose_http_clients() -> None:
+    """Close the shared pools and the bridge (app shutdown); they are rebuilt if used again."""
+    global _http_client, _async_http_client, _pool_generation, _bridge_loop
+    with _http_lock:
+        sync_client, _http_client = _http_client, None
+        async_client, _async_http_client = _async_http_client, None
+        _pool_generation += 1
+    with _bridge_lock:
+        bridge_loop, _bridge_loop = _bridge_loop, None
+    if sync_client is not None:
+        sync_client.close()
+    if async_client is not None:
+        await async_client.aclose()
+    if bridge_loop is not None:
+        try:
+            await asyncio.wrap_future(
+                asyncio.run_coroutine_threadsafe(_shutdown_bridge(), bridge_loop)
+            )
+        finally:
+            bridge_loop.call_soon_threadsafe(bridge_loop.stop)
+
+
+def _detect_provider() -> Provider:
+    if CFG.ai_provider and CFG.ai_provider.upper() in Provider.__members__:
+        return Provider[CFG.ai_provider.upper()]
+    if CFG.openrouter_key:
+        return Provider.OPENROUTER
+    if CFG.openai_key:
+        return Provider.OPENAI
+    if CFG.google_key:
+        return Provider.GEMINI
+    return Provider.OPENAI
 
 
 AI_PROVIDER = _detect_provider()
-logger.info("LLMService: provider=%s", AI_PROVIDER)
+logger.info("LLMService: provider=%s", AI_PROVIDER.name.lower())
+
+# provider → LLMConfig field holding its default chat model
+_DEFAULT_MODEL_FIELD = {
+    Provider.OPENROUTER: "openrouter_chat_model",
+    Provider.GEMINI:     "gemini_chat_model",
+    Provider.OPENAI:     "openai_chat_model",
+}
 
 
 class LLMService:
@@ -56,33 +302,23 @@ class LLMService:
     def __init__(self):
         self._provider = AI_PROVIDER
         self._async_client = None   # openai.AsyncOpenAI — lazy init
-        self._sync_client = None    # openai.OpenAI — lazy init (for stream_sync)
+        self._sync_client = None    # openai.OpenAI — lazy init
+        self._bridge_client = None  # openai.AsyncOpenAI on the bridge loop (stream_sync)
+        self._pool_gen = _pool_generation   # pools the clients above were built on
         self._gemini_configured = False
         self._genai = None
+        self._client_lock = threading.Lock()
 
     # ── Resolve model ID ─────────────────────────────────────────────────────
 
     def resolve_model(self, model_id: Optional[str]) -> str:
-        # Treat None, empty string, and the literal strings "null"/"none" as missing
-        if not model_id or (isinstance(model_id, str) and model_id.strip().lower() in ("null", "none")):
-            return self._default_model()
-        if self._provider == "openrouter":
-            if "/" in model_id:
-                return model_id  # already a full path
-            return _OR_ALIASES.get(model_id, model_id)
-        return model_id
+        # None, "", and the literal strings "null"/"none" all mean the default
+        resolved = _resolve_alias(model_id, self._provider) if model_id else None
+        return resolved or self._default_model()
 
     def _default_model(self) -> str:
-        def _env(var: str, fallback: str) -> str:
-            v = os.getenv(var, "").strip()
-            # Treat empty string and literal "null"/"none" (common .env mistake) as unset
-            return fallback if not v or v.lower() in ("null", "none") else v
-
-        if self._provider == "openrouter":
-            return _env("OPENROUTER_CHAT_MODEL", "openai/gpt-4o")
-        if self._provider == "gemini":
-            return _env("GEMINI_CHAT_MODEL", "gemini-2.0-flash")
-        return _env("OPENAI_CHAT_MODEL", "gpt-4o")
+        # Read per call (an attribute lookup) so reload_config() takes effect
+        return getattr(CFG, _DEFAULT_MODEL_FIELD[self._provider])
 
     # ── Async chat ───────────────────────────────────────────────────────────
 
@@ -101,10 +337,10 @@ class LLMService:
         if not resolved:
             raise ValueError(
                 f"LLMService.chat: could not resolve a valid model ID "
-                f"(provider={self._provider})"
+                f"(provider={self._provider.name.lower()})"
             )
 
-        if self._provider == "gemini" and not self._is_openrouter_model(resolved):
+        if self._uses_gemini_sdk(resolved):
             return await self._chat_gemini(messages, resolved, tools, tool_choice)
 
         client = self._get_async_client()
@@ -140,79 +376,181 @@ class LLMService:
         resp = await self.chat(messages, model=model)
         return self._extract_content(resp)
 
-    # ── Sync streaming (explore router only) ────────────────────────────────
+    # ── Streaming ───────────────────────────────────────────────────────────
 
-    def stream_sync(
+    async def stream(
         self, messages: List[dict], model: Optional[str] = None
-    ) -> Iterator[str]:
+    ) -> AsyncIterator[str]:
         """
-        Sync streaming generator that yields text chunks.
-        Kept sync because explore.py uses it in a sync FastAPI route.
+        Async generator that yields text chunks.  Runs on the event loop, so
+        a long answer doesn't pin a threadpool worker for its whole duration.
         """
         resolved = self.resolve_model(model)
 
-        if self._provider == "gemini" and not self._is_openrouter_model(resolved):
-            yield from self._stream_gemini(messages, resolved)
+        if self._uses_gemini_sdk(resolved):
+            gmodel, query = self._gemini_stream_request(messages, resolved)
+            response = await gmodel.generate_content_async(
+                query, stream=True, generation_config={"max_output_tokens": 2048}
+            )
+            async for chunk in response:
+                text = getattr(chunk, "text", "") or ""
+                if text:
+                    yield text
             return
 
-        client = self._get_sync_client()
-        stream = client.chat.completions.create(
-            model=resolved, messages=messages, stream=True, max_tokens=2048
+        async for text in self._stream_openai(self._get_async_client(), messages, resolved):
+            yield text
+
+    async def _stream_openai(self, client, messages, model) -> AsyncIterator[str]:
+        stream = await client.chat.completions.create(
+            model=model, messages=messages, stream=True, max_tokens=2048
         )
-        for chunk in stream:
-            text = getattr(chunk.choices[0].delta, "content", None) or ""
+        async for chunk in stream:
+            choices = chunk.choices
+            if not choices:  # OpenRouter keep-alive / usage chunks
+                continue
+            delta = choices[0].delta
+            text = delta.content if delta is not None else None
             if text:
                 yield text
 
+    def stream_sync(
+        self, messages: List[dict], model: Optional[str] = None
+    ) -> Iterator[str]:
+        """
+        Sync streaming generator that yields text chunks, for callers
+        without an event loop (AIService.explore_the_web).  OpenAI-compatible
+        streams run on the bridge loop and are handed over through a queue
+        (unbounded, so a slow reader never stalls the shared loop; answers
+        are capped at 2048 tokens).  Closing the generator cancels the stream.
+        """
+        resolved = self.resolve_model(model)
+
+        if self._uses_gemini_sdk(resolved):
+            # The SDK's async transport is tied to the app loop; stay sync.
+            yield from self._stream_gemini(messages, resolved)
+            return
+
+        chunks: queue.SimpleQueue = queue.SimpleQueue()
+
+        async def _drain():
+            try:
+                async for text in self._stream_openai(self._get_bridge_client(), messages, resolved):
+                    chunks.put(text)
+            except BaseException as exc:
+                chunks.put(exc)
+                raise
+            finally:
+                chunks.put(_STREAM_END)
+
+        future = asyncio.run_coroutine_threadsafe(_drain(), _get_bridge_loop())
+        try:
+            for item in iter(chunks.get, _STREAM_END):
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            future.cancel()
+
     # ── OpenAI/OpenRouter client helpers ─────────────────────────────────────
 
+    def _drop_stale_clients(self) -> None:
+        """Forget clients whose pools aclose_http_clients() has since closed."""
+        if self._pool_gen != _pool_generation:
+            with self._client_lock:
+                if self._pool_gen != _pool_generation:
+                    self._async_client = self._sync_client = self._bridge_client = None
+                    self._pool_gen = _pool_generation
+
     def _get_async_client(self):
+        self._drop_stale_clients()
         if self._async_client is None:
+            with self._client_lock:
+                if self._async_client is None:
+                    import openai
+
+                    if self._provider is Provider.OPENROUTER:
+                        api_key = CFG.openrouter_key
+                        if not api_key:
+                            raise ValueError("OPENROUTER_API_KEY is required")
+                        self._async_client = openai.AsyncOpenAI(
+                            base_url="https://openrouter.ai/api/v1",
+                            api_key=api_key,
+                            http_client=_get_async_http_client(),
+                        )
+                    else:
+                        api_key = CFG.openai_key
+                        if not api_key:
+                            raise ValueError("OPENAI_API_KEY is required")
+                        self._async_client = openai.AsyncOpenAI(
+                            api_key=api_key, http_client=_get_async_http_client()
+                        )
+        return self._async_client
+
+    def _get_bridge_client(self):
+        """
+        AsyncOpenAI on the bridge loop's pool.  Only built and used on the
+        bridge loop thread, so the lazy init needs no lock.
+        """
+        self._drop_stale_clients()
+        if self._bridge_client is None:
             import openai
 
-            if self._provider == "openrouter":
-                api_key = os.getenv("OPENROUTER_API_KEY")
-                if not api_key:
+            http_client = _get_bridge_http_client()
+            if self._provider is Provider.OPENROUTER:
+                if not CFG.openrouter_key:
                     raise ValueError("OPENROUTER_API_KEY is required")
-                self._async_client = openai.AsyncOpenAI(
+                self._bridge_client = openai.AsyncOpenAI(
                     base_url="https://openrouter.ai/api/v1",
-                    api_key=api_key,
+                    api_key=CFG.openrouter_key,
+                    http_client=http_client,
                 )
             else:
-                api_key = os.getenv("OPENAI_API_KEY")
-                if not api_key:
+                if not CFG.openai_key:
                     raise ValueError("OPENAI_API_KEY is required")
-                self._async_client = openai.AsyncOpenAI(api_key=api_key)
-        return self._async_client
+                self._bridge_client = openai.AsyncOpenAI(
+                    api_key=CFG.openai_key, http_client=http_client
+                )
+        return self._bridge_client
 
     def _get_sync_client(self):
+        self._drop_stale_clients()
         if self._sync_client is None:
-            import openai
-
-            if self._provider == "openrouter":
-                api_key = os.getenv("OPENROUTER_API_KEY")
-                if not api_key:
-                    raise ValueError("OPENROUTER_API_KEY is required")
-                self._sync_client = openai.OpenAI(
-                    base_url="https://openrouter.ai/api/v1",
-                    api_key=api_key,
-                )
-            else:
-                api_key = os.getenv("OPENAI_API_KEY")
-                if not api_key:
-                    raise ValueError("OPENAI_API_KEY is required")
-                self._sync_client = openai.OpenAI(api_key=api_key)
+            with self._client_lock:
+                if self._sync_client is None:
+                    import openai
+
+                    if self._provider is Provider.OPENROUTER:
+                        api_key = CFG.openrouter_key
+                        if not api_key:
+                            raise ValueError("OPENROUTER_API_KEY is required")
+                        self._sync_client = openai.OpenAI(
+                            base_url="https://openrouter.ai/api/v1",
+                            api_key=api_key,
+                            http_client=_get_http_client(),
+                        )
+                    else:
+                        api_key = CFG.openai_key
+                        if not api_key:
+                            raise ValueError("OPENAI_API_KEY is required")
+                        self._sync_client = openai.OpenAI(
+                            api_key=api_key, http_client=_get_http_client()
+                        )
         return self._sync_client
 
     def _is_openrouter_model(self, model_id: str) -> bool:
-        return self._provider == "openrouter" or "/" in model_id
+        return self._provider is Provider.OPENROUTER or "/" in model_id
+
+    def _uses_gemini_sdk(self, model_id: str) -> bool:
+        """Native Gemini only for bare model IDs; "vendor/model" goes via OpenAI-compatible."""
+        return self._provider is Provider.GEMINI and "/" not in model_id
 
     # ── Gemini helpers ────────────────────────────────────────────────────────
 
     def _get_genai(self):
         if not self._gemini_configured:
             import google.generativeai as genai
-            api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
+            api_key = CFG.google_key
             if not api_key:
                 raise ValueError("GOOGLE_API_KEY is required for Gemini")
             genai.configure(api_key=api_key)
@@ -221,48 +559,37 @@ class LLMService:
         return self._genai
 
     async def _chat_gemini(self, messages, model, tools, tool_choice):
-        import asyncio
-
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            None, self._chat_gemini_sync, messages, model, tools, tool_choice
-        )
-
-    def _chat_gemini_sync(self, messages, model, tools, tool_choice):
-        """Minimal Gemini sync chat that returns an OpenAI-compatible response-like object."""
+        """
+        Minimal Gemini chat that returns an OpenAI-compatible response-like
+        object.  Uses the SDK's async call, so a tool round doesn't hold a
+        default-executor thread for the whole model latency.
+        """
         genai = self._get_genai()
-        sys_msg = next((m["content"] for m in messages if m["role"] == "system"), "")
+        base, volatile = _split_system(messages)
         user_msgs = [m for m in messages if m["role"] in ("user", "assistant")]
-        gmodel = genai.GenerativeModel(
-            model_name=model,
-            system_instruction=sys_msg if sys_msg else None,
-        )
+        gmodel = _gemini_model(genai, model, base)
         query = user_msgs[-1]["content"] if user_msgs else ""
-        response = gmodel.generate_content(query)
-        text = response.text or ""
-
-        class _FakeMessage:
-            content = text
-            tool_calls = None
-
-        class _FakeChoice:
-            message = _FakeMessage()
-            finish_reason = "stop"
-
-        class _FakeResp:
-            choices = [_FakeChoice()]
-
-        return _FakeResp()
-
-    def _stream_gemini(self, messages, model) -> Iterator[str]:
+        if volatile:
+            query = f"{volatile}\n\n{query}"
+        response = await gmodel.generate_content_async(query)
+        message = SimpleNamespace(content=response.text or "", tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason="stop")])
+
+    def _gemini_stream_request(self, messages, model):
+        """(GenerativeModel, query) for a streamed single-turn Gemini answer."""
         genai = self._get_genai()
-        sys_msg = next((m["content"] for m in messages if m["role"] == "system"), "")
+        sys_msg = "\n\n".join(m["content"] for m in messages if m["role"] == "system")
         user_msgs = [m["content"] for m in messages if m["role"] in ("user", "assistant")]
+        # Not _gemini_model: Explore's system prompt embeds per-query web
+        # context, so every call would be a miss that evicts a chat model.
         gmodel = genai.GenerativeModel(
             model_name=model,
             system_instruction=sys_msg if sys_msg else None,
         )
-        query = user_msgs[-1] if user_msgs else ""
+        return gmodel, (user_msgs[-1] if user_msgs else "")
+
+    def _stream_gemini(self, messages, model) -> Iterator[str]:
+        gmodel, query = self._gemini_stream_request(messages, model)
         response = gmodel.generate_content(
             query, stream=True, generation_config={"max_output_tokens": 2048}
         )
@@ -1,28 +1,58 @@
 """
 services/memory_service.py — SQLite-backed user memory (replaces ChromaDB user_memory).
 
-Async methods (suffix _async) for FastAPI routes.
-Sync methods (no suffix) for backward compat — used by chat.py via run_in_executor.
+Async methods (suffix _async) for FastAPI routes.  Given the route's
+AsyncSession they query it natively on the event loop; only the blocking
+embedding call goes to a thread.  Without one they run the sync method in a
+thread.
+Sync methods (no suffix) for backward compat and Celery.
 """
 
+import asyncio
 import json
 import logging
+import os
+import threading
+from collections import OrderedDict
 from datetime import datetime
-from typing import List, Optional
+from itertools import chain
+from typing import List, Optional, Tuple
 
 import numpy as np
-from sqlalchemy import select, delete
+from sqlalchemy import select, delete, func
 
 from models_async import UserMemoryEntry
 
 logger = logging.getLogger(__name__)
 
+# Users whose memory matrix is kept between queries (LRU)
+MEMORY_MATRIX_CACHE_USERS = int(os.getenv("MEMORY_MATRIX_CACHE_USERS", "256"))
+
+# New memory vectors are stored L2-normalised as float16 behind this tag
+# (half the bytes of float32; ample precision for ranking unit vectors).
+# Untagged blobs are legacy raw float32 and are still read as such.
+_FP16_MAGIC = b"\x00f16"
+
+
+def _encode_memory_vec(vec: np.ndarray) -> bytes:
+    vec = np.asarray(vec, dtype=np.float32)
+    norm = float(np.linalg.norm(vec))
+    if norm > 0:
+        vec = vec / norm
+    return _FP16_MAGIC + vec.astype(np.float16).tobytes()
+
 
 class MemoryService:
     """Long-term per-user memory stored in SQLite.  No ChromaDB."""
 
     def __init__(self, embedding_service):
         self._emb = embedding_service
+        # user_id → (version, dim, (K, dim) float32 matrix, its summaries, all
+        # summaries).  version is the user's (row count, max id), re-read with
+        # one cheap aggregate per query, so inserts or deletes from any worker
+        # process invalidate the entry; blobs are only re-fetched then.
+        self._matrices: "OrderedDict[int, tuple]" = OrderedDict()
+        self._matrices_lock = threading.Lock()
 
     # ── Store interaction ────────────────────────────────────────────────────
 
@@ -48,7 +78,7 @@ class MemoryService:
                     user_id=user_id,
                     session_id=session_id,
                     summary=summary,
-                    embedding=vec.tobytes(),
+                    embedding=_encode_memory_vec(vec),
                     feedback=feedback,
                 )
                 db.add(entry)
@@ -65,13 +95,13 @@ class MemoryService:
         session_id: Optional[str] = None,
         db=None,  # AsyncSession
     ):
-        """Async version for FastAPI routes."""
-        import asyncio
-
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(
-            None,
-            lambda: self.store_interaction(user_id, question, answer, feedback, session_id),
+        """
+        Async version for FastAPI routes.  Always writes through its own
+        SyncSession in a thread: committing the caller's *db* here would
+        also commit whatever the route has pending.
+        """
+        await asyncio.to_thread(
+            self.store_interaction, user_id, question, answer, feedback, session_id
         )
 
     # ── Retrieve memory ──────────────────────────────────────────────────────
@@ -86,15 +116,15 @@ class MemoryService:
             q_vec = self._emb.embed(question)
 
             with SyncSession() as db:
-                result = db.execute(
-                    select(UserMemoryEntry).where(UserMemoryEntry.user_id == user_id)
-                )
-                rows = result.scalars().all()
-
-            if not rows:
-                return []
-
-            return self._rank_memories(rows, q_vec, n)
+                version = tuple(db.execute(self._version_stmt(user_id)).one())
+                if not version[0]:
+                    return []
+                entry = self._cached_matrix(user_id, version, len(q_vec))
+                if entry is None:
+                    rows = db.execute(self._rows_stmt(user_id)).all()
+                    entry = self._store_matrix(user_id, version, rows, len(q_vec))
+
+            return self._rank_memories(entry, q_vec, n)
         except Exception as e:
             logger.warning(
                 "MemoryService.retrieve_relevant_memory failed user=%s: %s", user_id, e
@@ -104,12 +134,29 @@ class MemoryService:
     async def retrieve_relevant_memory_async(
         self, user_id: int, question: str, n: int = 3, db=None
     ) -> List[str]:
-        import asyncio
-
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            None, self.retrieve_relevant_memory, user_id, question, n
-        )
+        """Embeds *question* in a thread while the rows load on *db*."""
+        if db is None:
+            return await asyncio.to_thread(
+                self.retrieve_relevant_memory, user_id, question, n
+            )
+        try:
+            q_vec, result = await asyncio.gather(
+                asyncio.to_thread(self._emb.embed, question),
+                db.execute(self._version_stmt(user_id)),
+            )
+            version = tuple(result.one())
+            if not version[0]:
+                return []
+            entry = self._cached_matrix(user_id, version, len(q_vec))
+            if entry is None:
+                rows = (await db.execute(self._rows_stmt(user_id))).all()
+                entry = self._store_matrix(user_id, version, rows, len(q_vec))
+            return self._rank_memories(entry, q_vec, n)
+        except Exception as e:
+            logger.warning(
+                "MemoryService.retrieve_relevant_memory_async failed user=%s: %s", user_id, e
+            )
+            return []
 
     # ── User preferences ─────────────────────────────────────────────────────
 
@@ -135,49 +182,113 @@ class MemoryService:
                 )
                 neg_rows = neg_result.scalars().all()
 
-            if not pos_rows and not neg_rows:
-                return ""
-
-            prefs = []
-            if pos_rows:
-                snippets = [r.summary[:80] for r in pos_rows[:5]]
-                prefs.append(f"User liked responses like: {'; '.join(snippets)}")
-            if neg_rows:
-                snippets = [r.summary[:80] for r in neg_rows[:5]]
-                prefs.append(f"User disliked responses like: {'; '.join(snippets)}")
-
-            return " | ".join(prefs)
+            return self._format_preferences(pos_rows, neg_rows)
         except Exception as e:
             logger.warning(
                 "MemoryService.get_user_preferences failed user=%s: %s", user_id, e
             )
             return ""
 
-    async def get_user_preferences_async(self, user_id: int) -> str:
-        import asyncio
-
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self.get_user_preferences, user_id)
+    async def get_user_preferences_async(self, user_id: int, db=None) -> str:
+        if db is None:
+            return await asyncio.to_thread(self.get_user_preferences, user_id)
+        try:
+            rows = {}
+            for feedback in ("up", "down"):
+                result = await db.execute(
+                    select(UserMemoryEntry).where(
+                        UserMemoryEntry.user_id == user_id,
+                        UserMemoryEntry.feedback == feedback,
+                    ).limit(20)
+                )
+                rows[feedback] = result.scalars().all()
+            return self._format_preferences(rows["up"], rows["down"])
+        except Exception as e:
+            logger.warning(
+                "MemoryService.get_user_preferences_async failed user=%s: %s", user_id, e
+            )
+            return ""
 
     # ── Internal ─────────────────────────────────────────────────────────────
 
-    def _rank_memories(self, rows, query_vec: np.ndarray, n: int) -> List[str]:
-        dim = len(query_vec)
-        embeddings = []
-        valid_rows = []
-        for row in rows:
-            try:
-                vec = np.frombuffer(row.embedding, dtype=np.float32)
-                if len(vec) == dim:
-                    embeddings.append(vec)
-                    valid_rows.append(row)
-            except Exception:
-                pass
-
-        if not embeddings:
-            return [r.summary for r in rows[:n]]
-
-        mat = np.stack(embeddings)
-        scores = mat @ query_vec
-        top_idx = np.argsort(scores)[::-1][:n]
-        return [valid_rows[i].summary for i in top_idx]
+    @staticmethod
+    def _format_preferences(pos_rows, neg_rows) -> str:
+        prefs = []
+        if pos_rows:
+            snippets = [r.summary[:80] for r in pos_rows[:5]]
+            prefs.append(f"User liked responses like: {'; '.join(snippets)}")
+        if neg_rows:
+            snippets = [r.summary[:80] for r in neg_rows[:5]]
+            prefs.append(f"User disliked responses like: {'; '.join(snippets)}")
+        return " | ".join(prefs)
+
+    @staticmethod
+    def _version_stmt(user_id: int):
+        return select(func.count(UserMemoryEntry.id), func.max(UserMemoryEntry.id)).where(
+            UserMemoryEntry.user_id == user_id
+        )
+
+    @staticmethod
+    def _rows_stmt(user_id: int):
+        return select(UserMemoryEntry.embedding, UserMemoryEntry.summary).where(
+            UserMemoryEntry.user_id == user_id
+        )
+
+    def _cached_matrix(self, user_id: int, version: Tuple, dim: int) -> Optional[tuple]:
+        with self._matrices_lock:
+            entry = self._matrices.get(user_id)
+            if entry is None or entry[0] != version or entry[1] != dim:
+                return None
+            self._matrices.move_to_end(user_id)
+            return entry
+
+    def _store_matrix(self, user_id: int, version: Tuple, rows, dim: int) -> tuple:
+        """
+        Decode the rows into one contiguous (K, dim) float32 matrix: a single
+        join + frombuffer per storage dtype (tagged float16, legacy float32).
+        Rows of any other width are left out.
+        """
+        fp16_width = len(_FP16_MAGIC) + 2 * dim
+        fp16 = [r for r in rows if len(r.embedding) == fp16_width
+                and r.embedding.startswith(_FP16_MAGIC)]
+        fp32 = [r for r in rows if len(r.embedding) == 4 * dim]
+        skip = len(_FP16_MAGIC)
+        mat = np.empty((len(fp16) + len(fp32), dim), dtype=np.float32)
+        if fp16:
+            raw = b"".join(memoryview(r.embedding)[skip:] for r in fp16)
+            mat[:len(fp16)] = np.frombuffer(raw, dtype=np.float16).reshape(len(fp16), dim)
+        if fp32:
+            raw = b"".join(r.embedding for r in fp32)
+            mat[len(fp16):] = np.frombuffer(raw, dtype=np.float32).reshape(len(fp32), dim)
+        entry = (
+            version,
+            dim,
+            mat,
+            [r.summary for r in chain(fp16, fp32)],
+            [r.summary for r in rows],
+        )
+        with self._matrices_lock:
+            self._matrices[user_id] = entry
+            self._matrices.move_to_end(user_id)
+            while len(self._matrices) > MEMORY_MATRIX_CACHE_USERS:
+                self._matrices.popitem(last=False)
+        return entry
+
+    @staticmethod
+    def _rank_memories(entry: tuple, query_vec: np.ndarray, n: int) -> List[str]:
+        _, _, mat, summaries, all_summaries = entry
+        if not summaries:
+            return all_summaries[:n]
+
+        # Normalised once, so mat @ q (one BLAS sgemv) is cosine similarity
+        q = np.asarray(query_vec, dtype=np.float32)
+        norm = float(np.linalg.norm(q))
+        if norm > 0:
+            q = q / norm
+        scores = mat @ q
+        if n < len(scores):
+            top_idx = np.argpartition(-scores, n)[:n]
+            top_idx = top_idx[np.argsort(-scores[top_idx])]
+        else:
+            top_idx = np.argsort(-scores)
+        return [summaries[i] for i in top_idx]
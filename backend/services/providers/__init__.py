@@ -0,0 +1,31 @@
+"""
+services/providers — legacy per-provider answer/agentic helpers.
+
+Names are resolved lazily (PEP 562) so `import services.providers` doesn't
+pull in google-generativeai / LangChain until a helper is first used.
+"""
+
+import importlib
+
+_LAZY = {
+    "GeminiV1Embeddings":   "services.providers.gemini_provider",
+    "answer_gemini":        "services.providers.gemini_provider",
+    "agentic_gemini":       "services.providers.gemini_provider",
+    "answer_openai":        "services.providers.openai_provider",
+    "agentic_openai":       "services.providers.openai_provider",
+}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value   # cache — later lookups skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
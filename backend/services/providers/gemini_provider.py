@@ -3,32 +3,125 @@ services/providers/gemini_provider.py — Gemini-specific embeddings, answer, an
 Receives the AIService instance as `svc` so no circular import is needed.
 """
 
-import base64
+import asyncio
 import logging
-from pathlib import Path
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import chain
 from typing import Dict, List, Optional
 
-from langchain_core.embeddings import Embeddings as LCEmbeddings
+import numpy as np
+
+from services.providers.history import recent_history
+from services.providers.images import encode_image
+from services.tools import GEMINI_TOOL_DEFINITIONS, artifact_answer, project_for_model
+from utils import fastjson
+
+try:
+    from langchain_core.embeddings import Embeddings as LCEmbeddings
+except ImportError:  # LangChain is optional — the class only needs the duck-typed API
+    LCEmbeddings = object
 
 logger = logging.getLogger(__name__)
 
+_EMBED_BATCH = 100   # batchEmbedContents request cap
+_EMBED_CONCURRENCY = int(os.getenv("GEMINI_EMBED_CONCURRENCY", "8"))
+
+
+class _QueryVectorCache:
+    """
+    In-memory exact-match LRU for embed_query, keyed on the query text as
+    given — not a semantic cache, so any change in wording, case or
+    punctuation is a miss.  Bounded, TTL-expired and thread-safe; it only
+    saves the SQLite round trip of EmbeddingCache.  Enable with
+    GEMINI_QUERY_CACHE=1.
+    """
+
+    def __init__(self, max_entries: int = 10_000, ttl_s: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()   # key → (expires, vec)
+        self._lock = threading.Lock()
+
+    def get(self, text: str) -> Optional[List[float]]:
+        with self._lock:
+            entry = self._data.get(text)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._data[text]
+                return None
+            self._data.move_to_end(text)
+            return entry[1]
+
+    def put(self, text: str, vec: List[float]) -> None:
+        with self._lock:
+            self._data[text] = (time.monotonic() + self.ttl_s, vec)
+            self._data.move_to_end(text)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
 
 class GeminiV1Embeddings(LCEmbeddings):
     """Langchain-compatible embeddings via the Gemini REST API (stable v1 endpoint).
 
     Bypasses langchain_google_genai's hardcoded v1beta configuration.
-    Set ``api_version`` to ``'v1beta'`` (default) or ``'v1'``.
+    Set ``api_version`` to ``'v1beta'`` (default) or ``'v1'``.  Vectors are
+    cached on disk per (model, task type, text) via EmbeddingCache.
+
+    This is the adapter for LangChain callers (vector stores, retrievers)
+    that need an ``Embeddings`` object and the RETRIEVAL_DOCUMENT /
+    RETRIEVAL_QUERY task split; FileGeek's own RAG path embeds through
+    EmbeddingService instead.
     """
 
+    # Batch fan-out pool shared by all instances; threads are reused
+    # across calls instead of being spawned per embed_documents.
+    _pool: Optional[ThreadPoolExecutor] = None
+    _pool_lock = threading.Lock()
+
     def __init__(
         self,
         api_key: str,
         model: str = "models/gemini-embedding-001",
         api_version: str = "v1beta",
+        embed_cache=None,
     ):
         import requests as _requests
-        self._requests = _requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
         self.api_key = api_key
+        self._embed_cache = embed_cache   # EmbeddingCache; registry singleton if None
+        self._aclient = None              # httpx.AsyncClient — lazy, see _get_aclient()
+        self._query_cache = (
+            _QueryVectorCache(
+                max_entries=int(os.getenv("GEMINI_QUERY_CACHE_MAX", "10000")),
+                ttl_s=float(os.getenv("GEMINI_QUERY_CACHE_TTL", "3600")),
+            )
+            if os.getenv("GEMINI_QUERY_CACHE", "0") == "1" else None
+        )
+        # One pooled keep-alive session per instance: no TCP/TLS handshake per batch.
+        # POST is retried explicitly — embedding calls are idempotent.
+        self._session = _requests.Session()
+        self._session.headers.update({"Content-Type": "application/json"})
+        self._session.params = {"key": api_key}
+        self._session.mount("https://", HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=16,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.3,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset({"POST"}),
+                raise_on_status=False,
+            ),
+        ))
         self.api_version = api_version
         bare = model.replace("models/", "", 1)
         self.model = bare
@@ -39,8 +132,10 @@ class GeminiV1Embeddings(LCEmbeddings):
             f"https://generativelanguage.googleapis.com/{api_version}/models/{bare}:embedContent"
         )
 
-    def _batch_embed(self, texts: List[str]) -> List[List[float]]:
-        payload = {
+    # ── request payloads (shared by the sync and async paths) ───────────────
+
+    def _batch_payload(self, texts: List[str]) -> dict:
+        return {
             "requests": [
                 {
                     "model": f"models/{self.model}",
@@ -50,149 +145,299 @@ class GeminiV1Embeddings(LCEmbeddings):
                 for t in texts
             ]
         }
-        resp = self._requests.post(
-            self._batch_url,
-            params={"key": self.api_key},
-            json=payload,
-            timeout=60,
+
+    def _query_payload(self, text: str) -> dict:
+        return {
+            "model": f"models/{self.model}",
+            "content": {"parts": [{"text": text}]},
+            "task_type": "RETRIEVAL_QUERY",
+        }
+
+    # ── caches ───────────────────────────────────────────────────────────────
+
+    def _cache(self):
+        if self._embed_cache is None:
+            from services.registry import embedding_cache
+            self._embed_cache = embedding_cache
+        return self._embed_cache
+
+    def _doc_lookup(self, texts: List[str]):
+        """Return (model_key, per-text vectors with None for misses, miss indices)."""
+        model_key = f"gemini:{self.model}:RETRIEVAL_DOCUMENT"
+        cached = self._cache().get_many(model_key, texts)
+        return model_key, cached, [i for i, v in enumerate(cached) if v is None]
+
+    def _doc_merge(self, model_key, texts, cached, miss_idx, fresh) -> np.ndarray:
+        """Cache *fresh* rows and assemble one (len(texts), dim) float32 matrix."""
+        if miss_idx:
+            self._cache().put_many(model_key, [texts[i] for i in miss_idx], fresh)
+            dim = fresh.shape[1]
+        else:
+            dim = cached[0].shape[0]
+        out = np.empty((len(texts), dim), dtype=np.float32)
+        for i, vec in enumerate(cached):
+            if vec is not None:
+                out[i] = vec
+        if miss_idx:
+            out[miss_idx] = fresh
+        return out
+
+    @staticmethod
+    def _parse_batch(data: dict) -> np.ndarray:
+        """batchEmbedContents JSON → contiguous (n, dim) float32 matrix."""
+        embs = data["embeddings"]
+        n = len(embs)
+        dim = len(embs[0]["values"]) if n else 0
+        flat = chain.from_iterable(e["values"] for e in embs)
+        return np.fromiter(flat, dtype=np.float32, count=n * dim).reshape(n, dim)
+
+    def _query_lookup(self, text: str) -> Optional[List[float]]:
+        if self._query_cache is not None:
+            vec = self._query_cache.get(text)
+            if vec is not None:
+                return list(vec)
+        hit = self._cache().get_many(f"gemini:{self.model}:RETRIEVAL_QUERY", [text])[0]
+        if hit is not None:
+            vec = hit.tolist()
+            if self._query_cache is not None:
+                self._query_cache.put(text, vec)
+            return vec
+        return None
+
+    def _query_store(self, text: str, vec: List[float]) -> None:
+        self._cache().put_many(f"gemini:{self.model}:RETRIEVAL_QUERY", [text], [vec])
+        if self._query_cache is not None:
+            self._query_cache.put(text, vec)
+
+    # ── sync (requests.Session) ──────────────────────────────────────────────
+
+    def _batch_embed(self, texts: List[str]) -> np.ndarray:
+        resp = self._session.post(
+            self._batch_url, data=fastjson.dumpb(self._batch_payload(texts)), timeout=60
         )
         if not resp.ok:
             raise RuntimeError(f"Error embedding content: {resp.status_code} {resp.text}")
-        data = resp.json()
-        return [item["values"] for item in data["embeddings"]]
+        return self._parse_batch(fastjson.loads(resp.content))
 
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        results = []
-        for i in range(0, len(texts), 100):
-            results.extend(self._batch_embed(texts[i: i + 100]))
-        return results
+        """LangChain API; lists are built only here, at the boundary."""
+        return self.embed_documents_np(texts).tolist()
+
+    def embed_documents_np(self, texts: List[str]) -> np.ndarray:
+        """Embed *texts* as one float32 matrix, serving exact repeats from the on-disk cache."""
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        model_key, cached, miss_idx = self._doc_lookup(texts)
+        fresh = self._embed_uncached([texts[i] for i in miss_idx]) if miss_idx else None
+        return self._doc_merge(model_key, texts, cached, miss_idx, fresh)
+
+    @classmethod
+    def _get_pool(cls) -> ThreadPoolExecutor:
+        if cls._pool is None:
+            with cls._pool_lock:
+                if cls._pool is None:
+                    cls._pool = ThreadPoolExecutor(
+                        max_workers=_EMBED_CONCURRENCY, thread_name_prefix="gemini-embed"
+                    )
+        return cls._pool
+
+    def _embed_uncached(self, texts: List[str]) -> np.ndarray:
+        starts = range(0, len(texts), _EMBED_BATCH)
+        if len(starts) <= 1:
+            return self._batch_embed(texts)
+        # Batches are independent HTTPS calls; run them concurrently on the
+        # shared session's pool and stitch the results back in input order.
+        pool = self._get_pool()
+        futures = [pool.submit(self._batch_embed, texts[i: i + _EMBED_BATCH]) for i in starts]
+        return np.vstack([fut.result() for fut in futures])
 
     def embed_query(self, text: str) -> List[float]:
-        payload = {
-            "model": f"models/{self.model}",
-            "content": {"parts": [{"text": text}]},
-            "task_type": "RETRIEVAL_QUERY",
-        }
-        resp = self._requests.post(
-            self._embed_url,
-            params={"key": self.api_key},
-            json=payload,
-            timeout=60,
+        vec = self._query_lookup(text)
+        if vec is None:
+            resp = self._session.post(
+                self._embed_url, data=fastjson.dumpb(self._query_payload(text)), timeout=60
+            )
+            if not resp.ok:
+                raise RuntimeError(f"Error embedding query: {resp.status_code} {resp.text}")
+            vec = fastjson.loads(resp.content)["embedding"]["values"]
+            self._query_store(text, vec)
+        return vec
+
+    # ── async (httpx.AsyncClient, HTTP/2 when h2 is installed) ───────────────
+    # LangChain's async path (aadd_documents, asimilarity_search) calls these.
+    # The client is bound to the loop that first uses it; call aclose() on
+    # shutdown.
+
+    def _get_aclient(self):
+        if self._aclient is None:
+            import httpx
+            from services.llm import _http2_available
+            self._aclient = httpx.AsyncClient(
+                http2=_http2_available(),
+                timeout=60.0,
+                headers={"Content-Type": "application/json"},
+                params={"key": self.api_key},
+                limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+            )
+        return self._aclient
+
+    async def _abatch_embed(self, texts: List[str]) -> np.ndarray:
+        resp = await self._get_aclient().post(
+            self._batch_url, content=fastjson.dumpb(self._batch_payload(texts))
         )
-        if not resp.ok:
-            raise RuntimeError(f"Error embedding query: {resp.status_code} {resp.text}")
-        return resp.json()["embedding"]["values"]
+        if resp.is_error:
+            raise RuntimeError(f"Error embedding content: {resp.status_code} {resp.text}")
+        return self._parse_batch(fastjson.loads(resp.content))
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return (await self.aembed_documents_np(texts)).tolist()
+
+    async def aembed_documents_np(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        model_key, cached, miss_idx = self._doc_lookup(texts)
+        fresh = None
+        if miss_idx:
+            misses = [texts[i] for i in miss_idx]
+            sem = asyncio.Semaphore(_EMBED_CONCURRENCY)
+
+            async def _one(start: int):
+                async with sem:
+                    return await self._abatch_embed(misses[start: start + _EMBED_BATCH])
+
+            batches = await asyncio.gather(
+                *(_one(i) for i in range(0, len(misses), _EMBED_BATCH))
+            )
+            fresh = np.vstack(batches)
+        return self._doc_merge(model_key, texts, cached, miss_idx, fresh)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        vec = self._query_lookup(text)
+        if vec is None:
+            resp = await self._get_aclient().post(
+                self._embed_url, content=fastjson.dumpb(self._query_payload(text))
+            )
+            if resp.is_error:
+                raise RuntimeError(f"Error embedding query: {resp.status_code} {resp.text}")
+            vec = fastjson.loads(resp.content)["embedding"]["values"]
+            self._query_store(text, vec)
+        return vec
+
+    async def aclose(self) -> None:
+        if self._aclient is not None:
+            await self._aclient.aclose()
+            self._aclient = None
+        self._session.close()
+
+
+@lru_cache(maxsize=32)
+def _generative_model(client, model_name: str, system_instruction: str, with_tools: bool = False):
+    """
+    GenerativeModel per (model, system_instruction, tools), reused across
+    requests.  Pass only static prompts: per-user text belongs in contents.
+    """
+    kwargs = {}
+    if with_tools:
+        kwargs["tools"] = [{"function_declarations": GEMINI_TOOL_DEFINITIONS}]
+    return client.GenerativeModel(
+        model_name=model_name, system_instruction=system_instruction, **kwargs
+    )
 
 
 def answer_gemini(svc, context_chunks, question, chat_history, model_override, file_type, image_paths):
     """Generate a non-streaming answer via Gemini."""
-    from services.ai_service import get_system_prompt
+    from services.ai_service import build_context_prompt, get_system_prompt
     try:
         if not question.strip():
             return None
 
-        context = "\n\n---\n\n".join(context_chunks) if context_chunks else ""
-        system_instruction = get_system_prompt(file_type)
-        if model_override:
-            system_instruction += "\n\nThink step by step. Be thorough, exhaustive, and analytical."
+        system_instruction = get_system_prompt(file_type, deep_think=bool(model_override))
 
         model_name = model_override or svc.GEMINI_CHAT_MODEL
-        model = svc.gemini_client.GenerativeModel(
-            model_name=model_name, system_instruction=system_instruction
-        )
+        model = _generative_model(svc.gemini_client, model_name, system_instruction)
 
         contents = []
-        if chat_history:
-            for entry in chat_history:
-                role = entry.get("role")
-                content = entry.get("content", "")
-                if role == "user":
-                    contents.append({"role": "user", "parts": [content]})
-                elif role == "assistant":
-                    contents.append({"role": "model", "parts": [content]})
-
-        user_parts = []
-        if context:
-            user_parts.append(f"Context from the document:\n\n{context}\n\n---\n\nQuestion: {question}")
-        else:
-            user_parts.append(question)
+        for entry in recent_history(chat_history):
+            role = "model" if entry["role"] == "assistant" else "user"
+            contents.append({"role": role, "parts": [entry["content"]]})
+
+        user_parts = [build_context_prompt(context_chunks, question)]
 
         if image_paths:
             for img_path in image_paths:
                 try:
-                    img_data = Path(img_path).read_bytes()
-                    ext = Path(img_path).suffix.lower()
-                    mime = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg"}.get(ext, "image/png")
+                    mime, b64 = encode_image(img_path)
                     user_parts.append({
-                        "inline_data": {
-                            "mime_type": mime,
-                            "data": base64.b64encode(img_data).decode("utf-8"),
-                        }
+                        "inline_data": {"mime_type": mime, "data": b64},
                     })
                 except Exception as e:
                     logger.warning("Could not attach image %s: %s", img_path, e)
 
         contents.append({"role": "user", "parts": user_parts})
-        response = model.generate_content(contents)
-        answer = response.text
+        answer = model.generate_content(contents).text
         logger.info("Gemini answered (%d chunks, model=%s, images=%d)",
                     len(context_chunks), model_name, len(image_paths or []))
-        return answer
+        return answer or None
     except Exception as e:
         logger.error("Gemini error: %s", e)
         return None
 
 
+_AGENTIC_DOCS_RULES = (
+    "\n\nDOCUMENTS ARE UPLOADED in this session. "
+    "ALWAYS call search_documents first before answering any question. "
+    "Base your answer STRICTLY on the retrieved document content. "
+    "If information is not found, say: 'I cannot find that information in your document.' "
+    "Use generate_quiz, generate_flashcards, create_study_guide, generate_visualization when asked."
+)
+
+_AGENTIC_NO_DOCS_RULES = (
+    "\n\nNo documents in this session. Answer general questions from your own knowledge. "
+    "Use generate_quiz when asked for a quiz. Use generate_flashcards when asked for flashcards. "
+    "Use create_study_guide when asked for a study guide. "
+    "Use generate_visualization when asked for a diagram or visualization."
+)
+
+
+@lru_cache(maxsize=64)
+def _agentic_system_base(file_type: str, has_documents: bool, deep_think: bool) -> str:
+    """Static part of the agentic system instruction, built once per combination."""
+    from services.ai_service import DEEP_THINK_SUFFIX, get_system_prompt
+
+    rules = _AGENTIC_DOCS_RULES if has_documents else _AGENTIC_NO_DOCS_RULES
+    return sys.intern("".join([
+        get_system_prompt(file_type), rules, DEEP_THINK_SUFFIX if deep_think else "",
+    ]))
+
+
 def agentic_gemini(svc, question, chat_history, tool_executor, session_id, user_id,
                    file_type, model_override, memory_context, preference_context,
                    has_documents=False, on_progress=None) -> Dict:
     """Agentic tool-calling loop via Gemini function calling."""
-    from services.tools import GEMINI_TOOL_DEFINITIONS
-    from services.ai_service import get_system_prompt
-    import json
+    from services.chat_engine import _parse_extras
+
+    # The cached model carries only the static base prompt; per-user memory
+    # and preference text rides along with the question, so the model cache
+    # key stays (model, base prompt) rather than one entry per request.
+    system_instruction = _agentic_system_base(file_type, has_documents, bool(model_override))
+    model_name = model_override or svc.GEMINI_CHAT_MODEL
+    model = _generative_model(svc.gemini_client, model_name, system_instruction, with_tools=True)
 
-    system_instruction = get_system_prompt(file_type)
+    extras = []
     if memory_context:
-        system_instruction += f"\n\nBased on past sessions: {memory_context}"
+        extras.append(f"Based on past sessions: {memory_context}")
     if preference_context:
-        system_instruction += f"\n\nUser preferences: {preference_context}"
-    if has_documents:
-        system_instruction += (
-            "\n\nDOCUMENTS ARE UPLOADED in this session. "
-            "ALWAYS call search_documents first before answering any question. "
-            "Base your answer STRICTLY on the retrieved document content. "
-            "If information is not found, say: 'I cannot find that information in your document.' "
-            "Use generate_quiz, generate_flashcards, create_study_guide, generate_visualization when asked."
-        )
-    else:
-        system_instruction += (
-            "\n\nNo documents in this session. Answer general questions from your own knowledge. "
-            "Use generate_quiz when asked for a quiz. Use generate_flashcards when asked for flashcards. "
-            "Use create_study_guide when asked for a study guide. "
-            "Use generate_visualization when asked for a diagram or visualization."
-        )
-    if model_override:
-        system_instruction += "\n\nThink step by step. Be thorough, exhaustive, and analytical."
-
-    model_name = model_override or svc.GEMINI_CHAT_MODEL
-    model = svc.gemini_client.GenerativeModel(
-        model_name=model_name,
-        system_instruction=system_instruction,
-        tools=[{"function_declarations": GEMINI_TOOL_DEFINITIONS}],
-    )
+        extras.append(f"User preferences: {preference_context}")
 
     contents = []
-    for entry in (chat_history or []):
-        role = entry.get("role")
-        content = entry.get("content", "")
-        if role == "user":
-            contents.append({"role": "user", "parts": [content]})
-        elif role == "assistant":
-            contents.append({"role": "model", "parts": [content]})
-    contents.append({"role": "user", "parts": [question]})
+    for entry in recent_history(chat_history):
+        role = "model" if entry["role"] == "assistant" else "user"
+        contents.append({"role": role, "parts": [entry["content"]]})
+    contents.append({"role": "user", "parts": ["\n\n".join([*extras, question])]})
 
     artifacts = []
     tool_calls_log = []
+    results = []
     max_rounds = 3
 
     def _emit(event: dict):
@@ -215,26 +460,30 @@ def agentic_gemini(svc, question, chat_history, tool_executor, session_id, user_
         if not candidate:
             return {"answer": "No response generated.", "sources": [], "artifacts": [], "suggestions": []}
 
-        has_function_call = False
-        function_responses = []
-
+        calls = []
         for part in candidate.content.parts:
             if hasattr(part, 'function_call') and part.function_call:
-                has_function_call = True
                 fn_name = part.function_call.name
                 fn_args = dict(part.function_call.args) if part.function_call.args else {}
                 if model_override:
                     fn_args["model"] = model_override
-
+                calls.append((fn_name, fn_args))
                 _emit({"type": "tool_start", "tool": fn_name})
-                result = tool_executor.execute(fn_name, fn_args, session_id, user_id)
-                _emit({"type": "tool_done", "tool": fn_name})
+
+        has_function_call = bool(calls)
+        function_responses = []
+        if calls:
+            results = tool_executor.execute_many_sync(
+                calls, session_id, user_id,
+                on_done=lambda name: _emit({"type": "tool_done", "tool": name}),
+            )
+            for (fn_name, fn_args), result in zip(calls, results):
                 tool_calls_log.append({"tool": fn_name, "args": fn_args, "result_keys": list(result.keys())})
                 if result.get("artifact_type"):
                     artifacts.append(result)
 
                 function_responses.append({
-                    "function_response": {"name": fn_name, "response": result}
+                    "function_response": {"name": fn_name, "response": project_for_model(result)}
                 })
 
         if has_function_call:
@@ -243,20 +492,22 @@ def agentic_gemini(svc, question, chat_history, tool_executor, session_id, user_
         else:
             _emit({"type": "status", "text": "Generating response…"})
             answer = response.text or ""
-            sources, suggestions = svc._parse_response_extras(answer, tool_calls_log)
+            sources, suggestions = _parse_extras(answer, tool_calls_log)
             return {
                 "answer": answer, "sources": sources, "artifacts": artifacts,
                 "suggestions": suggestions, "tool_calls": tool_calls_log,
             }
 
-    # Max rounds — get final text
-    try:
-        response = model.generate_content(contents)
-        answer = response.text or ""
-    except Exception:
-        answer = "I reached the maximum processing steps."
+    # Max rounds — get final text, unless the last round only produced artifacts
+    answer = artifact_answer(results)
+    if answer is None:
+        try:
+            response = model.generate_content(contents)
+            answer = response.text or ""
+        except Exception:
+            answer = "I reached the maximum processing steps."
 
-    sources, suggestions = svc._parse_response_extras(answer, tool_calls_log)
+    sources, suggestions = _parse_extras(answer, tool_calls_log)
     return {
         "answer": answer, "sources": sources, "artifacts": artifacts,
         "suggestions": suggestions, "tool_calls": tool_calls_log,
@@ -0,0 +1,41 @@
+"""
+services/providers/history.py — Bounded chat-history window for prompts.
+
+Legacy callers pass whatever chatHistory the client sent, so a long session
+would otherwise grow every prompt linearly.  recent_history keeps only the
+newest user/assistant turns that fit both a message cap and a rough token
+budget (len(content) // 4), walking backwards so the cost is bounded by the
+window, not the whole history.  Entries are returned as-is, not copied.
+"""
+
+import os
+from typing import Dict, List, Optional
+
+HISTORY_MAX_MESSAGES = int(os.getenv("HISTORY_MAX_MESSAGES", "20"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "6000"))
+
+_ROLES = ("user", "assistant")
+
+
+def recent_history(
+    chat_history: Optional[List[Dict]],
+    max_messages: int = HISTORY_MAX_MESSAGES,
+    token_budget: int = HISTORY_TOKEN_BUDGET,
+) -> List[Dict]:
+    """Newest user/assistant entries of *chat_history* that fit the window, oldest first."""
+    if not chat_history:
+        return []
+    kept: List[Dict] = []
+    tokens = 0
+    for entry in reversed(chat_history):
+        if len(kept) >= max_messages:
+            break
+        content = entry.get("content")
+        if entry.get("role") not in _ROLES or not content:
+            continue
+        tokens += len(content) // 4
+        if tokens > token_budget and kept:
+            break
+        kept.append(entry)
+    kept.reverse()
+    return kept
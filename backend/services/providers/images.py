@@ -0,0 +1,42 @@
+"""
+services/providers/images.py — Shared image → (mime, base64) encoding.
+
+Both answer_gemini and answer_openai attach images inline.  Encodings are
+memoised on (path, size, mtime_ns), so re-asking about the same upload
+skips the read and the base64 pass; a changed file gets a new key.  Large
+files are encoded straight from an mmap instead of being read into a
+separate bytes buffer first.
+"""
+
+import base64
+import mmap
+import os
+from functools import lru_cache
+from typing import Tuple
+
+_MMAP_THRESHOLD = 4 * 1024 * 1024   # bytes; smaller files are simply read
+_CACHE_SIZE = 32                     # each entry holds a full base64 string
+
+_MIME_BY_EXT = {
+    ".png":  "image/png",
+    ".jpg":  "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".webp": "image/webp",
+    ".gif":  "image/gif",
+}
+
+
+def encode_image(img_path: str) -> Tuple[str, str]:
+    """Return (mime_type, base64_str) for *img_path*."""
+    st = os.stat(img_path)
+    return _encode_cached(img_path, st.st_size, st.st_mtime_ns)
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def _encode_cached(img_path: str, size: int, mtime_ns: int) -> Tuple[str, str]:
+    mime = _MIME_BY_EXT.get(os.path.splitext(img_path)[1].lower(), "image/png")
+    with open(img_path, "rb") as f:
+        if size < _MMAP_THRESHOLD:
+            return mime, base64.b64encode(f.read()).decode("ascii")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return mime, base64.b64encode(mm).decode("ascii")
@@ -3,69 +3,149 @@ services/providers/openai_provider.py — OpenAI/OpenRouter answer and agentic l
 Receives the AIService instance as `svc` so no circular import is needed.
 """
 
-import base64
 import logging
-from pathlib import Path
+import sys
+import time
+from functools import lru_cache
 from typing import Dict, List, Optional
 
+from services.providers.history import recent_history
+from services.providers.images import encode_image
+from services.tools import TOOL_DEFINITIONS, artifact_answer, project_for_model, route_forced_tool
+from utils import fastjson
+
 logger = logging.getLogger(__name__)
 
+_DOCS_RULES = (
+    "\n\nDOCUMENTS ARE UPLOADED in this session. Rules:\n"
+    "- ALWAYS call search_documents first before answering any question.\n"
+    "- Base your answer STRICTLY on the retrieved document content.\n"
+    "- If information is not found in the documents, say exactly: 'I cannot find that information in your document.' Do NOT guess or use general knowledge.\n"
+    "- ALWAYS call generate_flashcards when asked for flashcards.\n"
+    "- ALWAYS call generate_quiz when asked for a quiz.\n"
+    "- ALWAYS call create_study_guide when asked for a study guide.\n"
+    "- ALWAYS call generate_visualization when asked for a diagram or chart."
+)
+
+_NO_DOCS_RULES = (
+    "\n\nNo documents in this session. Rules:\n"
+    "- Answer general questions directly from your own knowledge.\n"
+    "- ALWAYS call generate_flashcards when asked for flashcards.\n"
+    "- ALWAYS call generate_quiz when asked for a quiz.\n"
+    "- ALWAYS call create_study_guide when asked for a study guide.\n"
+    "- ALWAYS call generate_visualization when asked for a diagram or chart.\n"
+    "- DO NOT produce flashcards or quiz questions as plain text."
+)
+
+
+@lru_cache(maxsize=64)
+def _agentic_system_base(file_type: str, has_documents: bool, deep_think: bool) -> str:
+    """Static part of the agentic system prompt, built once per combination."""
+    from services.ai_service import DEEP_THINK_SUFFIX, get_system_prompt
+
+    rules = _DOCS_RULES if has_documents else _NO_DOCS_RULES
+    return sys.intern("".join([
+        get_system_prompt(file_type), rules, DEEP_THINK_SUFFIX if deep_think else "",
+    ]))
+
+
+# Extra attempts on the same provider for 429 / connection errors
+_TRANSIENT_RETRIES = 2
+
+# Resolved once here, not per call: _create_with_retry runs on every
+# agentic round, often from several threads at once.
+try:
+    from openai import APIConnectionError, RateLimitError
+    _TRANSIENT_ERRORS = (RateLimitError, APIConnectionError)
+except ImportError:  # no openai SDK — no fallback clients either
+    _TRANSIENT_ERRORS = ()
+
+
+def _create_with_retry(client, **kwargs):
+    """chat.completions.create, retried with backoff on 429 / connection errors only."""
+    for attempt in range(_TRANSIENT_RETRIES + 1):
+        try:
+            return client.chat.completions.create(**kwargs)
+        except _TRANSIENT_ERRORS as exc:
+            if attempt == _TRANSIENT_RETRIES:
+                raise
+            wait = 0.5 * 2 ** attempt
+            logger.warning("transient provider error: %s — retrying in %.1fs", exc, wait)
+            time.sleep(wait)
+
+
+def _first_response(fallback_clients, model_override, **kwargs):
+    """
+    Try each fallback client in order with the same arguments (tool_choice is
+    never changed here).  Returns (response, None) or (None, last_error).
+    """
+    last_err = None
+    for _fb_client, _fb_model in fallback_clients:
+        _call_model = model_override or _fb_model
+        try:
+            return _create_with_retry(_fb_client, model=_call_model, **kwargs), None
+        except Exception as e:
+            last_err = e
+            logger.warning(
+                "agentic call failed model=%s tool_choice=%s: %s — trying next",
+                _call_model, kwargs.get("tool_choice", "none"), e,
+            )
+    return None, last_err
+
+
+def _answer_messages(context_chunks, question, chat_history, file_type, image_paths, deep_think):
+    """Build the OpenAI-format message list for a single context answer."""
+    from services.ai_service import build_context_prompt, get_system_prompt
+
+    messages = [{"role": "system", "content": get_system_prompt(file_type, deep_think=deep_think)}]
+    for entry in recent_history(chat_history):
+        messages.append({"role": entry["role"], "content": entry["content"]})
+
+    text_part = build_context_prompt(context_chunks, question)
+
+    if image_paths:
+        user_content = [{"type": "text", "text": text_part}]
+        for img_path in image_paths:
+            try:
+                mime, b64 = encode_image(img_path)
+                user_content.append({
+                    "type": "image_url",
+                    "image_url": {"url": f"data:{mime};base64,{b64}"},
+                })
+            except Exception as e:
+                logger.warning("Could not attach image %s: %s", img_path, e)
+        messages.append({"role": "user", "content": user_content})
+    else:
+        messages.append({"role": "user", "content": text_part})
+    return messages
+
 
 def answer_openai(svc, context_chunks, question, chat_history, model_override, file_type, image_paths):
-    """Generate a non-streaming answer via OpenAI-compatible API."""
-    from services.ai_service import get_system_prompt
+    """
+    Generate a non-streaming answer via OpenAI-compatible API.  A provider
+    that errors falls through to the next fallback client; one that answers,
+    even with empty text, is final.
+    """
     try:
         if not question.strip():
             return None
-
-        context = "\n\n---\n\n".join(context_chunks) if context_chunks else ""
-        system_content = get_system_prompt(file_type)
-        if model_override:
-            system_content += "\n\nThink step by step. Be thorough, exhaustive, and analytical."
-
-        messages = [{"role": "system", "content": system_content}]
-        if chat_history:
-            for entry in chat_history:
-                if entry.get("role") in ("user", "assistant") and entry.get("content"):
-                    messages.append({"role": entry["role"], "content": entry["content"]})
-
-        user_content = []
-        text_part = (
-            f"Context from the document:\n\n{context}\n\n---\n\nQuestion: {question}"
-            if context else question
+        messages = _answer_messages(
+            context_chunks, question, chat_history, file_type, image_paths,
+            deep_think=bool(model_override),
         )
 
-        if image_paths:
-            user_content.append({"type": "text", "text": text_part})
-            for img_path in image_paths:
-                try:
-                    img_data = Path(img_path).read_bytes()
-                    ext = Path(img_path).suffix.lower()
-                    mime = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg"}.get(ext, "image/png")
-                    b64 = base64.b64encode(img_data).decode("utf-8")
-                    user_content.append({
-                        "type": "image_url",
-                        "image_url": {"url": f"data:{mime};base64,{b64}"},
-                    })
-                except Exception as e:
-                    logger.warning("Could not attach image %s: %s", img_path, e)
-            messages.append({"role": "user", "content": user_content})
-        else:
-            messages.append({"role": "user", "content": text_part})
-
-        for _fb_client, _fb_model in svc._get_fallback_clients(model_override):
+        for _fb_client, _fb_model in svc._get_fallback_clients():
             _call_model = model_override or _fb_model
             try:
                 response = _fb_client.chat.completions.create(
                     model=_call_model, messages=messages
                 )
-                answer = response.choices[0].message.content
-                logger.info("OpenAI answered (%d chunks, model=%s)", len(context_chunks), _call_model)
-                return answer
             except Exception as fb_e:
                 logger.warning("answer_from_context provider failed model=%s: %s — trying next", _call_model, fb_e)
+                continue
+            logger.info("OpenAI answered (%d chunks, model=%s)", len(context_chunks), _call_model)
+            return response.choices[0].message.content or None
         return None
-
     except Exception as e:
         logger.error("OpenAI error (outer): %s", e, exc_info=True)
         return None
@@ -75,63 +155,29 @@ def agentic_openai(svc, question, chat_history, tool_executor, session_id, user_
                    file_type, model_override, memory_context, preference_context,
                    has_documents=False, on_progress=None) -> Dict:
     """Agentic tool-calling loop via OpenAI function calling (also used for OpenRouter)."""
-    from services.tools import TOOL_DEFINITIONS
-    from services.ai_service import get_system_prompt
-    import json
+    from services.chat_engine import _parse_extras
 
-    system_content = get_system_prompt(file_type)
-    if memory_context:
-        system_content += f"\n\nBased on past sessions: {memory_context}"
+    # Stable prefix first (base prompt + preferences); per-question memories
+    # go in a trailing system message so the prefix stays cacheable.
+    system_content = _agentic_system_base(file_type, has_documents, bool(model_override))
     if preference_context:
-        system_content += f"\n\nUser preferences: {preference_context}"
-    if has_documents:
-        system_content += (
-            "\n\nDOCUMENTS ARE UPLOADED in this session. Rules:\n"
-            "- ALWAYS call search_documents first before answering any question.\n"
-            "- Base your answer STRICTLY on the retrieved document content.\n"
-            "- If information is not found in the documents, say exactly: 'I cannot find that information in your document.' Do NOT guess or use general knowledge.\n"
-            "- ALWAYS call generate_flashcards when asked for flashcards.\n"
-            "- ALWAYS call generate_quiz when asked for a quiz.\n"
-            "- ALWAYS call create_study_guide when asked for a study guide.\n"
-            "- ALWAYS call generate_visualization when asked for a diagram or chart."
-        )
-    else:
-        system_content += (
-            "\n\nNo documents in this session. Rules:\n"
-            "- Answer general questions directly from your own knowledge.\n"
-            "- ALWAYS call generate_flashcards when asked for flashcards.\n"
-            "- ALWAYS call generate_quiz when asked for a quiz.\n"
-            "- ALWAYS call create_study_guide when asked for a study guide.\n"
-            "- ALWAYS call generate_visualization when asked for a diagram or chart.\n"
-            "- DO NOT produce flashcards or quiz questions as plain text."
-        )
-    if model_override:
-        system_content += "\n\nThink step by step. Be thorough, exhaustive, and analytical."
+        system_content = f"{system_content}\n\nUser preferences: {preference_context}"
 
     messages = [{"role": "system", "content": system_content}]
-    for entry in (chat_history or []):
-        if entry.get("role") in ("user", "assistant") and entry.get("content"):
-            messages.append({"role": entry["role"], "content": entry["content"]})
+    for entry in recent_history(chat_history):
+        messages.append({"role": entry["role"], "content": entry["content"]})
+    if memory_context:
+        messages.append({"role": "system", "content": f"Based on past sessions: {memory_context}"})
     messages.append({"role": "user", "content": question})
 
-    resolved_override = svc._resolve_model(model_override)
-    model = resolved_override or svc.CHAT_MODEL
-    fallback_clients = svc._get_fallback_clients(model_override)
+    fallback_clients = svc._get_fallback_clients()
     artifacts = []
     tool_calls_log = []
+    results = []
     max_rounds = 3
 
-    _q_lower = question.lower()
-    _forced_tool: str | None = None
-    if any(kw in _q_lower for kw in ("flashcard", "flash card", "study card", "spaced repetition")):
-        _forced_tool = "generate_flashcards"
-    elif any(kw in _q_lower for kw in ("quiz", "test me", "multiple choice", "test my knowledge")):
-        _forced_tool = "generate_quiz"
-    elif any(kw in _q_lower for kw in ("study guide", "outline")):
-        _forced_tool = "create_study_guide"
-    elif any(kw in _q_lower for kw in ("diagram", "mind map", "visualization", "chart")):
-        _forced_tool = "generate_visualization"
-    elif has_documents:
+    _forced_tool: str | None = route_forced_tool(question)
+    if _forced_tool is None and has_documents:
         _forced_tool = "search_documents"
 
     def _emit(event: dict):
@@ -149,28 +195,16 @@ def agentic_openai(svc, question, chat_history, tool_executor, session_id, user_
 
         _emit({"type": "status", "text": "Thinking…"})
 
-        response = None
-        last_err = None
-        for _fb_client, _fb_model in fallback_clients:
-            _call_model = model_override or _fb_model
-            for _tc in ([_tool_choice, "auto"] if _tool_choice != "auto" else ["auto"]):
-                try:
-                    response = _fb_client.chat.completions.create(
-                        model=_call_model,
-                        messages=messages,
-                        tools=TOOL_DEFINITIONS,
-                        tool_choice=_tc,
-                    )
-                    last_err = None
-                    break
-                except Exception as e:
-                    last_err = e
-                    logger.warning(
-                        "agentic call failed model=%s tool_choice=%s: %s — trying next",
-                        _call_model, _tc, e,
-                    )
-            if response is not None:
-                break
+        response, last_err = _first_response(
+            fallback_clients, model_override,
+            messages=messages, tools=TOOL_DEFINITIONS, tool_choice=_tool_choice,
+        )
+        if response is None and _tool_choice != "auto":
+            # Every provider refused the forced tool — only now relax to "auto"
+            response, last_err = _first_response(
+                fallback_clients, model_override,
+                messages=messages, tools=TOOL_DEFINITIONS, tool_choice="auto",
+            )
 
         if response is None:
             # Tool-calling rejected by all providers — fall back to a plain completion.
@@ -178,15 +212,7 @@ def agentic_openai(svc, question, chat_history, tool_executor, session_id, user_
             logger.warning(
                 "tool-calling failed round=%d err=%s — retrying without tools", _round, last_err
             )
-            for _fb_client, _fb_model in fallback_clients:
-                _call_model = model_override or _fb_model
-                try:
-                    response = _fb_client.chat.completions.create(
-                        model=_call_model, messages=messages
-                    )
-                    break
-                except Exception as plain_err:
-                    logger.warning("no-tools fallback failed model=%s: %s", _call_model, plain_err)
+            response, _ = _first_response(fallback_clients, model_override, messages=messages)
 
             if response is None:
                 logger.error("All providers failed (with and without tools): %s", last_err)
@@ -198,19 +224,27 @@ def agentic_openai(svc, question, chat_history, tool_executor, session_id, user_
         if choice.finish_reason == "tool_calls" or (choice.message.tool_calls and len(choice.message.tool_calls) > 0):
             messages.append(choice.message)
 
-            for tc in choice.message.tool_calls:
-                fn_name = tc.function.name
+            tool_calls = choice.message.tool_calls
+            calls = []
+            for tc in tool_calls:
                 try:
-                    fn_args = json.loads(tc.function.arguments)
-                except json.JSONDecodeError:
+                    fn_args = fastjson.loads(tc.function.arguments)
+                except fastjson.JSONDecodeError:
                     fn_args = {}
 
                 if model_override:
                     fn_args["model"] = model_override
 
-                _emit({"type": "tool_start", "tool": fn_name})
-                result = tool_executor.execute(fn_name, fn_args, session_id, user_id)
-                _emit({"type": "tool_done", "tool": fn_name})
+                calls.append((tc.function.name, fn_args))
+                _emit({"type": "tool_start", "tool": tc.function.name})
+
+            # Independent calls from one turn run concurrently; results are
+            # appended in tool_call order so ids line up.
+            results = tool_executor.execute_many_sync(
+                calls, session_id, user_id,
+                on_done=lambda name: _emit({"type": "tool_done", "tool": name}),
+            )
+            for tc, (fn_name, fn_args), result in zip(tool_calls, calls, results):
                 tool_calls_log.append({"tool": fn_name, "args": fn_args, "result_keys": list(result.keys())})
 
                 if result.get("artifact_type"):
@@ -219,27 +253,28 @@ def agentic_openai(svc, question, chat_history, tool_executor, session_id, user_
                 messages.append({
                     "role": "tool",
                     "tool_call_id": tc.id,
-                    "content": json.dumps(result),
+                    "content": fastjson.dumps(project_for_model(result)),
                 })
         else:
             _emit({"type": "status", "text": "Generating response…"})
             answer = choice.message.content or ""
-            sources, suggestions = svc._parse_response_extras(answer, tool_calls_log)
+            sources, suggestions = _parse_extras(answer, tool_calls_log)
             return {
                 "answer": answer, "sources": sources, "artifacts": artifacts,
                 "suggestions": suggestions, "tool_calls": tool_calls_log,
             }
 
-    # Max rounds reached — get final response
-    try:
-        response = svc.openai_client.chat.completions.create(
-            model=model, messages=messages
-        )
-        answer = response.choices[0].message.content or ""
-    except Exception:
-        answer = "I reached the maximum processing steps. Here's what I found so far."
+    # Max rounds reached — get final response, unless the last round only
+    # produced artifacts
+    answer = artifact_answer(results)
+    if answer is None:
+        response, _ = _first_response(fallback_clients, model_override, messages=messages)
+        if response is not None:
+            answer = response.choices[0].message.content or ""
+        else:
+            answer = "I reached the maximum processing steps. Here's what I found so far."
 
-    sources, suggestions = svc._parse_response_extras(answer, tool_calls_log)
+    sources, suggestions = _parse_extras(answer, tool_calls_log)
     return {
         "answer": answer, "sources": sources, "artifacts": artifacts,
         "suggestions": suggestions, "tool_calls": tool_calls_log,
@@ -22,6 +22,8 @@ from typing import Dict, List, Optional
 
 import numpy as np
 from config import Config
+from services.vector_store import decode_embedding
+from utils.download import download_to
 
 logger = logging.getLogger(__name__)
 
@@ -86,7 +88,6 @@ class RAGService:
         self, url: str, name: str, document_id: str, session_id: str, user_id: int
     ) -> Dict:
         """Download from CDN and index.  Sync."""
-        import requests as http_requests
         from werkzeug.utils import secure_filename
 
         filename = secure_filename(name) or "file"
@@ -95,11 +96,7 @@ class RAGService:
         filepath = os.path.join(Config.UPLOAD_FOLDER, safe_filename)
 
         try:
-            dl_resp = http_requests.get(url, timeout=30, stream=True)
-            dl_resp.raise_for_status()
-            with open(filepath, "wb") as fout:
-                for chunk in dl_resp.iter_content(chunk_size=8192):
-                    fout.write(chunk)
+            download_to(url, filepath)
         except Exception as e:
             logger.error("RAGService.index_from_url download failed url=%s: %s", url, e)
             raise
@@ -199,8 +196,8 @@ class RAGService:
             embeddings, valid_rows = [], []
             for row in rows:
                 try:
-                    vec = np.frombuffer(row.embedding, dtype=np.float32)
-                    if len(vec) == dim:
+                    vec = decode_embedding(row.embedding, dim)
+                    if vec is not None:
                         embeddings.append(vec)
                         valid_rows.append(row)
                 except Exception:
@@ -266,7 +263,13 @@ class RAGService:
                 if not anchors:
                     return []
 
-                vecs = [np.frombuffer(c.embedding, dtype=np.float32) for c in anchors]
+                dim = self._emb.dimensions
+                vecs = [
+                    v for v in (decode_embedding(c.embedding, dim) for c in anchors)
+                    if v is not None
+                ]
+                if not vecs:
+                    return []
                 anchor_vec = np.mean(vecs, axis=0).astype(np.float32)
                 norm = np.linalg.norm(anchor_vec)
                 if norm > 0:
@@ -285,7 +288,9 @@ class RAGService:
 
             session_scores: dict = {}
             for chunk in other_rows:
-                vec = np.frombuffer(chunk.embedding, dtype=np.float32)
+                vec = decode_embedding(chunk.embedding, dim)
+                if vec is None:
+                    continue
                 score = float(anchor_vec @ vec)
                 session_scores.setdefault(chunk.session_id, []).append(score)
 
@@ -18,15 +18,25 @@ from services.llm import LLMService
 from services.chat_engine import ChatEngine
 from services.tools import ToolExecutor
 from services.ai_service import AIService
+from services.semantic_cache import SemanticCache
+from services.embedding_batcher import EmbeddingBatcher
+from services.embedding_cache import EmbeddingCache
 
 embedding_service = EmbeddingService()
+# Indexing goes through the batcher so concurrent uploads share provider
+# round-trips; query-time embed() calls pass straight through.
+embedding_batcher = EmbeddingBatcher(embedding_service)
+embedding_cache = EmbeddingCache()
 file_service = FileService()
-vector_store = VectorStore(embedding_service)
+vector_store = VectorStore(embedding_batcher, embedding_cache)
 rag_service = RAGService(vector_store, file_service, embedding_service)
 memory_service = MemoryService(embedding_service)
 llm_service = LLMService()
+semantic_cache = SemanticCache(embedding_service)
 # ai_service created before tool_executor so it can be passed in
 # (ToolExecutor calls ai_service.answer_from_context for quiz/study-guide/flashcard tools)
 ai_service = AIService()
 tool_executor = ToolExecutor(rag_service, ai_service)
-chat_engine = ChatEngine(llm_service, vector_store, embedding_service, tool_executor)
+chat_engine = ChatEngine(
+    llm_service, vector_store, embedding_service, tool_executor, semantic_cache
+)
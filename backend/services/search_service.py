@@ -7,8 +7,8 @@ Markdown extraction from web pages.
 
 from __future__ import annotations
 
+import asyncio
 import logging
-import concurrent.futures
 from typing import Any
 
 logger = logging.getLogger(__name__)
@@ -39,42 +39,83 @@ def web_search(query: str, max_results: int = 8) -> list[dict[str, str]]:
 
 # ── Trafilatura scraping ───────────────────────────────────────────────────────
 
-def _scrape_one(url: str) -> dict[str, str] | None:
-    """Fetch a URL and return clean Markdown, or None on failure."""
+_SCRAPE_MAX_CHARS = 3000       # truncate to keep context manageable
+_SCRAPE_TIMEOUT_S = 8.0        # per-page fetch timeout
+_SCRAPE_DEADLINE_S = 15.0      # overall budget for the whole scrape stage
+_SCRAPE_CONCURRENCY = 5        # in-flight fetches, however many pages are asked for
+_SCRAPE_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (compatible; FileGeekExplore/1.0; +https://filegeek.vercel.app)"
+    ),
+}
+
+
+def _extract(url: str, html: str) -> dict[str, str] | None:
+    """Run trafilatura over fetched HTML and return clean Markdown, or None."""
     try:
         import trafilatura
-        downloaded = trafilatura.fetch_url(url)
-        if not downloaded:
-            return None
         text = trafilatura.extract(
-            downloaded,
+            html,
             output_format="markdown",
             include_links=False,
             include_images=False,
         )
         if not text:
             return None
-        # Truncate to ~3 000 chars to keep context manageable
-        return {"url": url, "markdown": text[:3000]}
+        return {"url": url, "markdown": text[:_SCRAPE_MAX_CHARS]}
+    except Exception as exc:
+        logger.warning("scrape.extract_failed", extra={"url": url, "error": str(exc)})
+        return None
+
+
+async def _scrape_one_async(client, sem: asyncio.Semaphore, url: str) -> dict[str, str] | None:
+    """Fetch one URL on the shared AsyncClient; extraction runs off the loop."""
+    try:
+        async with sem:
+            resp = await client.get(url)
+        resp.raise_for_status()
+        if "html" not in resp.headers.get("content-type", "html"):
+            return None
+        return await asyncio.to_thread(_extract, url, resp.text)
     except Exception as exc:
         logger.warning("scrape.failed", extra={"url": url, "error": str(exc)})
         return None
 
 
-def scrape_urls(urls: list[str], max_pages: int = 5) -> list[dict[str, str]]:
-    """Scrape up to *max_pages* URLs in parallel. Returns [{url, markdown}]."""
+async def scrape_urls_async(urls: list[str], max_pages: int = 5) -> list[dict[str, str]]:
+    """
+    Scrape up to *max_pages* URLs concurrently over one httpx.AsyncClient,
+    at most _SCRAPE_CONCURRENCY fetches at a time.  Pages that miss the
+    overall deadline are dropped.  Returns [{url, markdown}] in input order.
+    """
+    import httpx
+
     targets = urls[:max_pages]
-    scraped: list[dict[str, str]] = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers=5) as pool:
-        futures = {pool.submit(_scrape_one, url): url for url in targets}
-        for future in concurrent.futures.as_completed(futures, timeout=15):
-            result = future.result()
-            if result:
-                scraped.append(result)
+    if not targets:
+        return []
+    async with httpx.AsyncClient(
+        headers=_SCRAPE_HEADERS,
+        follow_redirects=True,
+        timeout=_SCRAPE_TIMEOUT_S,
+    ) as client:
+        sem = asyncio.Semaphore(_SCRAPE_CONCURRENCY)
+        tasks = [asyncio.create_task(_scrape_one_async(client, sem, u)) for u in targets]
+        done, pending = await asyncio.wait(tasks, timeout=_SCRAPE_DEADLINE_S)
+        for task in pending:
+            task.cancel()
+    scraped = [
+        t.result() for t in tasks
+        if t in done and not t.cancelled() and t.exception() is None and t.result()
+    ]
     logger.info("scrape.done", extra={"scraped": len(scraped), "attempted": len(targets)})
     return scraped
 
 
+def scrape_urls(urls: list[str], max_pages: int = 5) -> list[dict[str, str]]:
+    """Sync wrapper around scrape_urls_async() for threads without an event loop."""
+    return asyncio.run(scrape_urls_async(urls, max_pages=max_pages))
+
+
 # ── Context builder ───────────────────────────────────────────────────────────
 
 def build_context(
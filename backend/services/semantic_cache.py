@@ -0,0 +1,163 @@
+"""
+services/semantic_cache.py — In-process semantic response cache.
+
+Answers are keyed on the embedding of the question plus an exact-match
+*scope* (sha256 of context, model, persona, file_type, ...).  A lookup is a
+hit only when the scope matches AND cosine similarity ≥ threshold.  Vectors
+from EmbeddingService are L2-normalised, so cosine similarity == dot product.
+
+Entries live in a fixed-size ring buffer (oldest evicted first) and expire
+after SEMANTIC_CACHE_TTL seconds (0 = never).  No I/O at
+import time; the embedding matrix is allocated on the first store.  While
+the cache is empty, lookup() doesn't embed at all — store() embeds lazily,
+and only for values that are actually kept.  Stored values are deep-copied
+on the way in and out, so callers can't mutate a cached entry.
+"""
+
+import copy
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Any, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticCache:
+    """Thread-safe semantic cache.  Instantiate once as a module-level singleton."""
+
+    def __init__(
+        self,
+        embedding_service,
+        threshold: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        enabled: Optional[bool] = None,
+        ttl: Optional[float] = None,
+    ):
+        self._emb = embedding_service
+        self.threshold = (
+            threshold if threshold is not None
+            else float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+        )
+        self.max_entries = max(
+            0,
+            max_entries if max_entries is not None
+            else int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1024")),
+        )
+        self.enabled = (
+            enabled if enabled is not None
+            else os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+        ) and self.max_entries > 0
+        self.ttl = ttl if ttl is not None else float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+        self._lock = threading.Lock()
+        self._mat: Optional[np.ndarray] = None   # (max_entries, dim) float32
+        self._scopes: list = [None] * self.max_entries
+        self._values: list = [None] * self.max_entries
+        self._stamps: list = [0.0] * self.max_entries   # time.monotonic() at store
+        self._size = 0
+        self._next = 0
+        self.hits = 0
+        self.misses = 0
+
+    # ── public API ──────────────────────────────────────────────────────────
+
+    @staticmethod
+    def scope_key(*parts) -> str:
+        """Stable sha256 over *parts* — everything that must match exactly."""
+        h = hashlib.sha256()
+        for part in parts:
+            h.update(str(part).encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def lookup(self, question: str, scope: str) -> Tuple[Optional[Any], Optional[np.ndarray]]:
+        """
+        Return (cached_value, query_vec).  cached_value is None on a miss.
+        query_vec is handed back so store() can skip re-embedding; it is None
+        when no embedding was computed (cache disabled or still empty).
+        """
+        if not self.enabled or not question or not question.strip():
+            return None, None
+        with self._lock:
+            if self._size == 0:
+                self.misses += 1
+                return None, None
+
+        vec = self._embed(question)
+        if vec is None:
+            return None, None
+
+        with self._lock:
+            if self._size and self._mat.shape[1] == len(vec):
+                scores = self._mat[: self._size] @ vec   # one sgemv over all entries
+                # Only entries above the threshold are ranked — usually a
+                # handful — instead of argsorting every score.
+                above = np.flatnonzero(scores >= self.threshold)
+                oldest = time.monotonic() - self.ttl if self.ttl > 0 else None
+                for idx in above[np.argsort(scores[above])[::-1]]:
+                    if self._scopes[idx] == scope and (
+                        oldest is None or self._stamps[idx] >= oldest
+                    ):
+                        self.hits += 1
+                        return copy.deepcopy(self._values[idx]), vec
+            self.misses += 1
+        return None, vec
+
+    def store(
+        self, question: str, vec: Optional[np.ndarray], scope: str, value: Any
+    ) -> None:
+        """
+        Insert *value* under (*question*, *scope*), evicting the oldest entry
+        when full.  *vec* is the vector returned by lookup(), if any.
+        """
+        if not self.enabled or value is None or not question or not question.strip():
+            return
+        if vec is None:
+            vec = self._embed(question)
+        if vec is None or not np.any(vec):
+            return
+        value = copy.deepcopy(value)
+        with self._lock:
+            if self._mat is None or self._mat.shape[1] != len(vec):
+                # First store, or the embedding provider changed — start fresh
+                self._mat = np.zeros((self.max_entries, len(vec)), dtype=np.float32)
+                self._size = 0
+                self._next = 0
+            i = self._next
+            self._mat[i] = vec
+            self._scopes[i] = scope
+            self._values[i] = value
+            self._stamps[i] = time.monotonic()
+            self._next = (i + 1) % self.max_entries
+            self._size = min(self._size + 1, self.max_entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mat = None
+            self._scopes = [None] * self.max_entries
+            self._values = [None] * self.max_entries
+            self._stamps = [0.0] * self.max_entries
+            self._size = 0
+            self._next = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "entries": self._size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    # ── internal ────────────────────────────────────────────────────────────
+
+    def _embed(self, question: str) -> Optional[np.ndarray]:
+        try:
+            return self._emb.embed(question)
+        except Exception as exc:
+            logger.warning("SemanticCache.embed failed: %s", exc)
+            return None
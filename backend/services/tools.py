@@ -1,10 +1,23 @@
+import asyncio
 import json
 import logging
+import os
 import re
-from typing import Dict, List, Optional
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Max tool calls from one assistant turn running at once
+TOOL_MAX_CONCURRENCY = 5
+# Threads shared by all turns; tools never run on the event loop's default executor
+TOOL_POOL_WORKERS = int(os.getenv("TOOL_POOL_WORKERS", "16"))
+
+# Marks threads currently running a tool from the pool, so a tool that fans
+# out again runs its calls inline instead of waiting on the pool it occupies.
+_tool_worker = threading.local()
+
 # Tool definitions in OpenAI function-calling format
 TOOL_DEFINITIONS = [
     {
@@ -138,12 +151,130 @@ for tool in TOOL_DEFINITIONS:
     })
 
 
+def build_tool_router(
+    groups: Sequence[Tuple[str, Sequence[str]]],
+) -> Callable[[str], Optional[str]]:
+    """
+    Compile ordered (tool_name, keywords) groups into one regex and return
+    route(text) -> tool_name | None.  The text is scanned once; when several
+    groups match, the earliest group wins, as with an if/elif chain of
+    any(kw in text ...) checks.  Matching is case-insensitive.
+    """
+    priority: Dict[str, int] = {}
+    for rank, (_, keywords) in enumerate(groups):
+        for kw in keywords:
+            priority.setdefault(kw.lower(), rank)
+    # Lookahead so overlapping keywords are all seen; higher-priority
+    # alternatives first so ties at one position resolve the same way.
+    ordered = sorted(priority, key=lambda kw: (priority[kw], -len(kw)))
+    pattern = re.compile("(?=(" + "|".join(map(re.escape, ordered)) + "))")
+    tools = [tool for tool, _ in groups]
+
+    def route(text: str) -> Optional[str]:
+        best = len(tools)
+        for m in pattern.finditer(text.lower()):
+            best = min(best, priority[m.group(1)])
+            if best == 0:
+                break
+        return tools[best] if best < len(tools) else None
+
+    return route
+
+
+# Keyword → forced first tool for the agentic loops; earlier groups win
+FORCED_TOOL_KEYWORDS: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    ("generate_flashcards",    ("flashcard", "flash card", "study card", "spaced repetition")),
+    ("generate_quiz",          ("quiz", "test me", "multiple choice", "test my knowledge")),
+    ("create_study_guide",     ("study guide", "outline")),
+    ("generate_visualization", ("diagram", "mind map", "visualization", "chart")),
+)
+
+route_forced_tool = build_tool_router(FORCED_TOOL_KEYWORDS)
+
+# Characters of an artifact's text content echoed back to the model
+ARTIFACT_PREVIEW_CHARS = 500
+SEARCH_SNIPPET_CHARS = int(os.getenv("SEARCH_SNIPPET_CHARS", "800"))
+
+
+def project_for_model(result: dict) -> dict:
+    """
+    The view of a tool result that goes back into the model's messages.
+    Artifacts (quizzes, flashcards, study guides, diagrams) are already sent
+    to the frontend in full, so the model only gets their scalar fields plus
+    an item count or a short text preview.  search_documents passages are
+    capped at SEARCH_SNIPPET_CHARS and lose empty page lists, since every
+    later round re-sends them.  Other results pass through.
+    """
+    if not result.get("artifact_type"):
+        passages = result.get("results")
+        if not passages:
+            return result
+        return {"results": [
+            {k: v for k, v in (
+                ("index", p.get("index")),
+                ("text", p.get("text", "")[:SEARCH_SNIPPET_CHARS]),
+                ("pages", p.get("pages")),
+            ) if v}
+            for p in passages
+        ]}
+    view = {k: v for k, v in result.items() if k != "content"}
+    content = result.get("content")
+    if isinstance(content, list):
+        view["items"] = len(content)
+    elif isinstance(content, str):
+        view["chars"] = len(content)
+        view["preview"] = content[:ARTIFACT_PREVIEW_CHARS]
+    view["status"] = "created" if content else "failed"
+    return view
+
+
+_ARTIFACT_ANSWERS = {
+    "quiz":          "Here's a {items}-question quiz on {topic}.",
+    "flashcards":    "Here are {items} flashcards on {topic}.",
+    "study_guide":   "Here's your study guide on {topic}.",
+    "visualization": "Here's the diagram: {description}",
+}
+
+
+def artifact_answer(results: Sequence[dict]) -> Optional[str]:
+    """
+    A ready-to-display answer when every result of a tool round is a
+    finished artifact, else None.  Used when the loop runs out of rounds:
+    the artifacts are what the user asked for, so a further model call
+    would only restate them.
+    """
+    lines = []
+    for result in results:
+        template = _ARTIFACT_ANSWERS.get(result.get("artifact_type"))
+        content = result.get("content")
+        if template is None or not content:
+            return None
+        lines.append(template.format(
+            items=len(content) if isinstance(content, list) else "",
+            topic=result.get("topic") or "this topic",
+            description=result.get("description") or "",
+        ).rstrip(": "))
+    return "\n\n".join(lines) or None
+
+
 class ToolExecutor:
     """Executes tool calls from the AI model."""
 
     def __init__(self, rag_service, ai_service):
         self.rag_service = rag_service
         self.ai_service = ai_service
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        """Dedicated bounded pool, created on first use."""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=TOOL_POOL_WORKERS, thread_name_prefix="tool"
+                    )
+        return self._pool
 
     def execute(self, tool_name: str, arguments: dict, session_id: str, user_id: int) -> dict:
         handler = {
@@ -163,6 +294,94 @@ class ToolExecutor:
             logger.error(f"Tool {tool_name} execution error: {e}")
             return {"error": str(e)}
 
+    def _execute_on_worker(self, tool_name: str, arguments: dict, session_id: str, user_id: int) -> dict:
+        _tool_worker.active = True
+        try:
+            return self.execute(tool_name, arguments, session_id, user_id)
+        finally:
+            _tool_worker.active = False
+
+    async def execute_many(
+        self,
+        calls: List[Tuple[str, dict]],
+        session_id: str,
+        user_id: int,
+        max_concurrency: int = TOOL_MAX_CONCURRENCY,
+        on_done: Optional[Callable[[str], None]] = None,
+    ) -> List[dict]:
+        """
+        Run independent (tool_name, arguments) calls concurrently on worker
+        threads, at most *max_concurrency* at a time.  Results come back in
+        call order; *on_done* fires with the tool name as each one finishes.
+        """
+        sem = asyncio.Semaphore(max_concurrency)
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+
+        async def _one(tool_name: str, arguments: dict) -> dict:
+            async with sem:
+                result = await loop.run_in_executor(
+                    pool, self._execute_on_worker, tool_name, arguments, session_id, user_id
+                )
+            if on_done:
+                on_done(tool_name)
+            return result
+
+        results = await asyncio.gather(
+            *(_one(name, args) for name, args in calls), return_exceptions=True
+        )
+        return [
+            {"error": str(r)} if isinstance(r, BaseException) else r
+            for r in results
+        ]
+
+    def execute_many_sync(
+        self,
+        calls: List[Tuple[str, dict]],
+        session_id: str,
+        user_id: int,
+        max_concurrency: int = TOOL_MAX_CONCURRENCY,
+        on_done: Optional[Callable[[str], None]] = None,
+    ) -> List[dict]:
+        """
+        Blocking twin of execute_many for the sync provider loops, with the
+        same ordering and error handling.  The calling thread keeps at most
+        *max_concurrency* calls on the pool and runs *on_done* itself, so
+        callbacks never run on pool threads.  A single call, or a fan-out
+        from inside a tool, runs inline on the calling thread.
+        """
+        if len(calls) == 1 or getattr(_tool_worker, "active", False):
+            results = []
+            for name, args in calls:
+                results.append(self.execute(name, args, session_id, user_id))
+                if on_done:
+                    on_done(name)
+            return results
+
+        pool = self._get_pool()
+        results: List[Optional[dict]] = [None] * len(calls)
+        queued = iter(enumerate(calls))
+        pending = {}
+
+        def _submit_next() -> None:
+            for i, (name, args) in queued:
+                fut = pool.submit(self._execute_on_worker, name, args, session_id, user_id)
+                pending[fut] = (i, name)
+                return
+
+        for _ in range(max_concurrency):
+            _submit_next()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                i, name = pending.pop(fut)
+                exc = fut.exception()
+                results[i] = {"error": str(exc)} if exc is not None else fut.result()
+                if exc is None and on_done:
+                    on_done(name)
+                _submit_next()
+        return results
+
     def _search_documents(self, args: dict, session_id: str, user_id: int) -> dict:
         query = args.get("query", "")
         n_results = min(args.get("n_results", 5), 12)
@@ -225,6 +444,7 @@ Example format:
             question=instruction,
             chat_history=[],
             model_override=model_override,
+            use_cache=False,
         )
         content = self._parse_json_array(raw, "quiz", session_id)
 
@@ -251,6 +471,7 @@ Example format:
             question=instruction,
             chat_history=[],
             model_override=model_override,
+            use_cache=False,
         )
 
         return {
@@ -293,6 +514,7 @@ Example format:
             question=instruction,
             chat_history=[],
             model_override=model_override,
+            use_cache=False,
         )
 
         # Strip any accidental markdown fences from mermaid output
@@ -356,6 +578,7 @@ Example format:
             question=instruction,
             chat_history=[],
             model_override=model_override,
+            use_cache=False,
         )
         content = self._parse_json_array(raw, "flashcards", session_id)
 
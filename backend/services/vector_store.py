@@ -8,10 +8,18 @@ Safe to use as a module-level singleton with multiple gunicorn workers because:
 
 Cosine similarity is computed as a dot product because all vectors are
 L2-normalised at embed time.
+
+EMBED_DTYPE=int8 (opt-in) stores new vectors as symmetric int8 (x * 127),
+a quarter of the float32 size; normalised components lie in [-1, 1], so
+the cosine error is negligible.  Blobs are told apart by length (dim bytes
+vs 4 * dim), so old float32 rows stay readable and the switch is reversible.
 """
 
 import json
 import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from typing import List, Optional
 
@@ -23,6 +31,29 @@ from models_async import DocumentChunk
 
 logger = logging.getLogger(__name__)
 
+EMBED_DTYPE = os.getenv("EMBED_DTYPE", "fp32").lower()   # fp32 | int8
+_INT8_SCALE = 127.0
+
+# index_chunks_sync embeds this many chunks at a time, so group i is flushed
+# to the database while group i + 1 is still at the embedding provider.
+INDEX_PIPELINE_CHUNKS = int(os.getenv("INDEX_PIPELINE_CHUNKS", "256"))
+
+
+def encode_embedding(vec: np.ndarray) -> bytes:
+    """Blob for one normalised float32 vector, in the configured EMBED_DTYPE."""
+    if EMBED_DTYPE == "int8":
+        return np.rint(vec * _INT8_SCALE).clip(-127, 127).astype(np.int8).tobytes()
+    return vec.tobytes()
+
+
+def decode_embedding(blob: bytes, dim: int) -> Optional[np.ndarray]:
+    """float32 view of a stored blob of either dtype; None if it isn't *dim* wide."""
+    if len(blob) == 4 * dim:
+        return np.frombuffer(blob, dtype=np.float32)
+    if len(blob) == dim:
+        return np.frombuffer(blob, dtype=np.int8).astype(np.float32) * (1.0 / _INT8_SCALE)
+    return None
+
 
 @dataclass
 class SearchResult:
@@ -36,8 +67,28 @@ class SearchResult:
 class VectorStore:
     """Stateless vector store — all methods receive a db session argument."""
 
-    def __init__(self, embedding_service):
+    def __init__(self, embedding_service, embedding_cache=None):
         self._emb = embedding_service
+        self._cache = embedding_cache   # EmbeddingCache; re-uploads skip the provider
+        self._pool = None               # ThreadPoolExecutor for pipelined embedding
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        """Pool that embeds the next chunk group during a flush, created on first use."""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=4, thread_name_prefix="vs-embed"
+                    )
+        return self._pool
+
+    def _embed_texts(self, texts: List[str]) -> np.ndarray:
+        if self._cache is None:
+            vecs = self._emb.embed_batch(texts)
+        else:
+            vecs = self._cache.embed_through(self._emb.model_id, texts, self._emb.embed_batch)
+        return np.ascontiguousarray(vecs, dtype=np.float32)
 
     # ── indexing ─────────────────────────────────────────────────────────────
 
@@ -57,7 +108,7 @@ class VectorStore:
             return 0
 
         texts = [c["text"] for c in chunks]
-        embeddings = self._emb.embed_batch(texts)
+        embeddings = self._embed_texts(texts)
 
         rows = []
         for i, (chunk, vec) in enumerate(zip(chunks, embeddings)):
@@ -66,7 +117,7 @@ class VectorStore:
                 user_id=user_id,
                 document_id=document_id,
                 chunk_text=chunk["text"],
-                embedding=vec.tobytes(),
+                embedding=encode_embedding(vec),
                 pages=json.dumps(chunk.get("pages", [])),
                 chunk_index=i,
             ))
@@ -87,32 +138,49 @@ class VectorStore:
         chunks: List[dict],
         db,  # SyncSession
     ) -> int:
-        """Synchronous version for Celery workers."""
+        """
+        Synchronous version for Celery workers.  Long documents are embedded
+        INDEX_PIPELINE_CHUNKS at a time on a helper thread, and each group's
+        INSERTs are flushed while the next group is being embedded; the
+        session (used only from this thread) commits once at the end.
+        """
         if not chunks:
             return 0
 
-        texts = [c["text"] for c in chunks]
-        embeddings = self._emb.embed_batch(texts)
-
-        rows = []
-        for i, (chunk, vec) in enumerate(zip(chunks, embeddings)):
-            rows.append(DocumentChunk(
-                session_id=session_id,
-                user_id=user_id,
-                document_id=document_id,
-                chunk_text=chunk["text"],
-                embedding=vec.tobytes(),
-                pages=json.dumps(chunk.get("pages", [])),
-                chunk_index=i,
-            ))
+        step = max(INDEX_PIPELINE_CHUNKS, 1)
+        starts = range(0, len(chunks), step)
+        groups = [[c["text"] for c in chunks[i:i + step]] for i in starts]
+        pool = self._get_pool() if len(groups) > 1 else None
+
+        pending = pool.submit(self._embed_texts, groups[0]) if pool else None
+        stored = 0
+        for g, start in enumerate(starts):
+            embeddings = pending.result() if pool else self._embed_texts(groups[g])
+            if pool and g + 1 < len(groups):
+                pending = pool.submit(self._embed_texts, groups[g + 1])
+
+            db.add_all([
+                DocumentChunk(
+                    session_id=session_id,
+                    user_id=user_id,
+                    document_id=document_id,
+                    chunk_text=chunk["text"],
+                    embedding=encode_embedding(vec),
+                    pages=json.dumps(chunk.get("pages", [])),
+                    chunk_index=start + j,
+                )
+                for j, (chunk, vec) in enumerate(zip(chunks[start:start + step], embeddings))
+            ])
+            if pool:
+                db.flush()
+            stored += len(embeddings)
 
-        db.add_all(rows)
         db.commit()
         logger.info(
-            f"VectorStore.index_chunks_sync: stored {len(rows)} chunks "
+            f"VectorStore.index_chunks_sync: stored {stored} chunks "
             f"session={session_id} doc={document_id}"
         )
-        return len(rows)
+        return stored
 
     # ── search ───────────────────────────────────────────────────────────────
 
@@ -238,9 +306,13 @@ class VectorStore:
             return []
 
         # Average embedding of anchor chunks
+        dim = self._emb.dimensions
         anchor_vecs = [
-            np.frombuffer(c.embedding, dtype=np.float32) for c in anchor_chunks
+            v for v in (decode_embedding(c.embedding, dim) for c in anchor_chunks)
+            if v is not None
         ]
+        if not anchor_vecs:
+            return []
         anchor_vec = np.mean(anchor_vecs, axis=0).astype(np.float32)
         norm = np.linalg.norm(anchor_vec)
         if norm > 0:
@@ -260,7 +332,9 @@ class VectorStore:
         # Average per-session score
         session_scores: dict[str, list] = {}
         for chunk in other_chunks:
-            vec = np.frombuffer(chunk.embedding, dtype=np.float32)
+            vec = decode_embedding(chunk.embedding, dim)
+            if vec is None:
+                continue
             score = float(anchor_vec @ vec)
             session_scores.setdefault(chunk.session_id, []).append(score)
 
@@ -283,18 +357,15 @@ class VectorStore:
             return []
 
         dim = len(query_vec)
-        embeddings = []
-        for r in rows:
+        mat = np.zeros((len(rows), dim), dtype=np.float32)   # (N, dim)
+        for i, r in enumerate(rows):
             try:
-                vec = np.frombuffer(r.embedding, dtype=np.float32)
-                if len(vec) == dim:
-                    embeddings.append(vec)
-                else:
-                    embeddings.append(np.zeros(dim, dtype=np.float32))
+                vec = decode_embedding(r.embedding, dim)
             except Exception:
-                embeddings.append(np.zeros(dim, dtype=np.float32))
+                vec = None
+            if vec is not None:
+                mat[i] = vec
 
-        mat = np.stack(embeddings)            # (N, dim)
         scores = mat @ query_vec              # (N,) — dot product = cosine sim
         top_k_idx = np.argsort(scores)[::-1][:k]
 
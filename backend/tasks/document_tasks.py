@@ -12,6 +12,7 @@ from celery_db import SyncSession
 from database import AsyncSessionLocal
 from logging_config import get_logger
 from models_async import ChatMessage, SessionDocument
+from utils.download import download_to
 
 logger = get_logger(__name__)
 
@@ -49,7 +50,6 @@ def index_document_task(self, session_id, user_id, file_url, file_name):
       DOWNLOADING → EXTRACTING → INDEXING → completed
     """
     import os
-    import requests as http_requests
     from config import Config
     from werkzeug.utils import secure_filename
 
@@ -68,11 +68,7 @@ def index_document_task(self, session_id, user_id, file_url, file_name):
         _publish_progress(task_id, "downloading", 20)
         logger.info("document.download.start", file_url=file_url, session_id=session_id)
 
-        dl_resp = http_requests.get(file_url, timeout=30, stream=True)
-        dl_resp.raise_for_status()
-        with open(filepath, "wb") as fout:
-            for chunk in dl_resp.iter_content(chunk_size=8192):
-                fout.write(chunk)
+        download_to(file_url, filepath)
 
         # Phase 2: Extract text
         self.update_state(state="EXTRACTING", meta={"phase": "extracting", "file_name": file_name})
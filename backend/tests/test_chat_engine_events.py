@@ -0,0 +1,52 @@
+"""ChatEngine.stream_events ordering, heartbeats and error propagation."""
+
+import asyncio
+
+import pytest
+
+from services.chat_engine import ChatEngine
+
+
+class _Engine(ChatEngine):
+    def __init__(self, delay=0.0, fail=False):
+        super().__init__(None, None, None, None)
+        self.delay = delay
+        self.fail = fail
+
+    async def generate_response(self, on_progress=None, **kwargs):
+        on_progress({"type": "status", "text": "Thinking…"})
+        await asyncio.sleep(self.delay)
+        on_progress({"type": "tool_done", "tool": "search_documents"})
+        if self.fail:
+            raise RuntimeError("boom")
+        return {"answer": kwargs["question"]}
+
+
+async def _collect(engine, **kwargs):
+    return [evt async for evt in engine.stream_events(question="q", **kwargs)]
+
+
+def test_events_then_final_result():
+    events = asyncio.run(_collect(_Engine()))
+
+    assert [e["type"] for e in events] == ["status", "tool_done", "final"]
+    assert events[-1]["result"] == {"answer": "q"}
+
+
+def test_heartbeat_while_idle():
+    events = asyncio.run(_collect(_Engine(delay=0.05), heartbeat=0.01))
+
+    assert "heartbeat" in [e["type"] for e in events]
+    assert events[-1]["type"] == "final"
+
+
+def test_errors_reach_the_consumer_after_progress():
+    seen = []
+
+    async def run():
+        async for evt in _Engine(fail=True).stream_events(question="q"):
+            seen.append(evt["type"])
+
+    with pytest.raises(RuntimeError, match="boom"):
+        asyncio.run(run())
+    assert seen == ["status", "tool_done"]
@@ -0,0 +1,58 @@
+"""EmbeddingBatcher tests using a stub EmbeddingService (no network)."""
+
+import threading
+
+import numpy as np
+
+from services.embedding_batcher import EmbeddingBatcher
+
+
+class _StubEmbeddingService:
+    def __init__(self, fail_on=None):
+        self.calls = []
+        self._fail_on = fail_on
+
+    def embed_batch(self, texts):
+        self.calls.append(list(texts))
+        if self._fail_on is not None and self._fail_on in texts:
+            raise ValueError("bad input")
+        return [np.array([len(t)], dtype=np.float32) for t in texts]
+
+
+def test_concurrent_callers_share_one_call_and_keep_order():
+    emb = _StubEmbeddingService()
+    batcher = EmbeddingBatcher(emb, window_ms=100)
+    results = {}
+
+    def _call(i):
+        results[i] = batcher.embed_batch(["a" * i, "b" * (i + 10)])
+
+    threads = [threading.Thread(target=_call, args=(i,)) for i in range(1, 6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=5)
+
+    assert len(emb.calls) == 1
+    for i, vecs in results.items():
+        assert [float(v[0]) for v in vecs] == [i, i + 10]
+
+
+def test_cancelled_caller_does_not_stall_the_batch():
+    batcher = EmbeddingBatcher(_StubEmbeddingService(), window_ms=100)
+    f1 = batcher.submit(["one"])
+    f2 = batcher.submit(["three"])
+    f1.cancel()
+
+    assert [float(v[0]) for v in f2.result(timeout=5)] == [5]
+    # Worker is still alive for later callers
+    assert [float(v[0]) for v in batcher.embed_batch(["xy"])] == [2]
+
+
+def test_one_bad_caller_does_not_fail_the_others():
+    batcher = EmbeddingBatcher(_StubEmbeddingService(fail_on="boom"), window_ms=100)
+    bad = batcher.submit(["boom"])
+    good = batcher.submit(["fine"])
+
+    assert [float(v[0]) for v in good.result(timeout=5)] == [4]
+    assert isinstance(bad.exception(timeout=5), ValueError)
@@ -0,0 +1,84 @@
+"""EmbeddingCache + AIService.get_embeddings cache tests (no network)."""
+
+import numpy as np
+
+from services.ai_service import AIService
+from services.embedding_cache import EmbeddingCache
+
+
+class _StubEmbeddingService:
+    model_id = "stub:v1"
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_batch(self, texts):
+        self.calls.append(list(texts))
+        return [np.array([len(t), 1.0], dtype=np.float32) for t in texts]
+
+
+def test_round_trip_keeps_order_and_marks_misses(tmp_path):
+    cache = EmbeddingCache(path=str(tmp_path / "emb.db"), enabled=True)
+    cache.put_many("m", ["a", "bb"], [np.array([1, 2], np.float32), np.array([3, 4], np.float32)])
+
+    got = cache.get_many("m", ["bb", "zzz", "a"])
+
+    assert got[1] is None
+    assert got[0].tolist() == [3.0, 4.0]
+    assert got[2].tolist() == [1.0, 2.0]
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_model_is_part_of_the_key(tmp_path):
+    cache = EmbeddingCache(path=str(tmp_path / "emb.db"), enabled=True)
+    cache.put_many("m1", ["a"], [np.array([1, 2], np.float32)])
+
+    assert cache.get_many("m2", ["a"]) == [None]
+
+
+def test_disabled_cache_never_hits(tmp_path):
+    cache = EmbeddingCache(path=str(tmp_path / "emb.db"), enabled=False)
+    cache.put_many("m", ["a"], [np.array([1, 2], np.float32)])
+
+    assert cache.get_many("m", ["a"]) == [None]
+
+
+def test_get_embeddings_only_embeds_misses(tmp_path):
+    emb = _StubEmbeddingService()
+    svc = AIService()
+    svc._embedding_service = emb
+    svc._embedding_batcher = emb
+    svc._embedding_cache = EmbeddingCache(path=str(tmp_path / "emb.db"), enabled=True)
+
+    first = svc.get_embeddings(["one", "three"])
+    second = svc.get_embeddings(["three", "fives", "one"])
+
+    assert emb.calls == [["one", "three"], ["fives"]]
+    assert first == [[3.0, 1.0], [5.0, 1.0]]
+    assert second == [[5.0, 1.0], [5.0, 1.0], [3.0, 1.0]]
+
+
+def test_embed_through_only_embeds_misses_and_tracks_hit_rate(tmp_path):
+    emb = _StubEmbeddingService()
+    cache = EmbeddingCache(path=str(tmp_path / "emb.db"), enabled=True)
+
+    first = cache.embed_through("m", ["aa", "b"], emb.embed_batch)
+    second = cache.embed_through("m", ["b", "ccc", "aa"], emb.embed_batch)
+
+    assert emb.calls == [["aa", "b"], ["ccc"]]
+    assert first.shape == (2, 2)
+    assert second[:, 0].tolist() == [1.0, 3.0, 2.0]
+    assert cache.hit_rate == 2 / 5
+
+
+def test_put_many_prunes_oldest_rows_past_max_rows(tmp_path, monkeypatch):
+    cache = EmbeddingCache(path=str(tmp_path / "emb.db"), enabled=True, max_rows=4)
+    vec = np.array([1, 2], np.float32)
+    clock = iter(range(100, 200))
+    monkeypatch.setattr("services.embedding_cache.time.time", lambda: next(clock))
+
+    for text in ["a", "b", "c", "d", "e"]:
+        cache.put_many("m", [text], [vec])
+
+    got = cache.get_many("m", ["a", "b", "c", "d", "e"])
+    assert [g is not None for g in got] == [False, False, True, True, True]
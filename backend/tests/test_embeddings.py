@@ -0,0 +1,100 @@
+"""EmbeddingService batch fan-out with a stub OpenAI client (no network)."""
+
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from services import embeddings as emb_mod
+from services.embeddings import EmbeddingService
+
+
+class _StubEmbeddings:
+    def __init__(self):
+        self.threads = set()
+
+    def create(self, model, input):
+        self.threads.add(threading.get_ident())
+        time.sleep(0.01 * (len(input) % 3))   # finish out of order
+        return SimpleNamespace(data=[
+            SimpleNamespace(embedding=[float(len(t)), 1.0, 0.0]) for t in input
+        ])
+
+
+def _service(stub):
+    svc = EmbeddingService()
+    svc._provider = "openai"
+    svc._dim = 3
+    svc._client = SimpleNamespace(embeddings=stub)
+    return svc
+
+
+def test_multi_batch_results_keep_input_order(monkeypatch):
+    batches = emb_mod._token_batches
+    monkeypatch.setattr(emb_mod, "_token_batches", lambda texts: batches(texts, max_items=2))
+    stub = _StubEmbeddings()
+    texts = ["a" * n for n in range(1, 10)]
+
+    out = _service(stub).embed_batch(texts)
+
+    assert out.shape == (9, 3) and out.dtype == np.float32
+    assert np.allclose(out[:, 0] / out[:, 1], range(1, 10))
+    assert np.allclose(np.linalg.norm(out, axis=1), 1.0)
+    assert len(stub.threads) > 1                 # batches ran concurrently
+
+
+def test_duplicate_texts_are_embedded_once():
+    class _Counting(_StubEmbeddings):
+        def __init__(self):
+            super().__init__()
+            self.inputs = []
+
+        def create(self, model, input):
+            self.inputs.extend(input)
+            return super().create(model, input)
+
+    stub = _Counting()
+    texts = ["footer", "a", "footer", "bb", "a", "footer"]
+
+    out = _service(stub).embed_batch(texts)
+
+    assert sorted(stub.inputs) == ["a", "bb", "footer"]
+    assert out.shape == (6, 3) and out.flags.c_contiguous
+    assert np.allclose(out[:, 0] / out[:, 1], [len(t) for t in texts])
+
+
+def test_short_response_is_retried_then_raised(monkeypatch):
+    monkeypatch.setattr(emb_mod.time, "sleep", lambda _s: None)
+
+    class _Short(_StubEmbeddings):
+        def create(self, model, input):
+            return SimpleNamespace(data=[])
+
+    with pytest.raises(ValueError):
+        _service(_Short()).embed_batch(["x", "y"])
+
+
+def test_single_row_response_is_not_broadcast(monkeypatch):
+    monkeypatch.setattr(emb_mod.time, "sleep", lambda _s: None)
+
+    class _OneRow(_StubEmbeddings):
+        def create(self, model, input):
+            return SimpleNamespace(data=[SimpleNamespace(embedding=[1.0, 0.0, 0.0])])
+
+    with pytest.raises(ValueError):
+        _service(_OneRow()).embed_batch(["x", "y"])
+
+
+def test_local_backend_without_sentence_transformers_falls_back(monkeypatch):
+    monkeypatch.setitem(sys.modules, "sentence_transformers", None)   # import raises ImportError
+    monkeypatch.setenv("EMBEDDING_BACKEND", "local")
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.setenv("GOOGLE_API_KEY", "test-key")
+
+    svc = EmbeddingService()
+
+    assert svc.model_id == "gemini:gemini-embedding-001"
+    assert svc.dimensions == 768
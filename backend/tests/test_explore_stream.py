@@ -0,0 +1,68 @@
+"""_ChunkBatcher framing for the Explore SSE stream."""
+
+import asyncio
+import json
+
+from services import search_service
+from services.ai_service import AIService, _ChunkBatcher
+
+
+def _texts(frames):
+    return [json.loads(f[len(b"data: "):])["text"] for f in frames if f]
+
+
+def test_first_token_flushes_and_text_is_preserved():
+    deltas = ["He", "llo", " wor", "ld", ", how", " are", " you", "?", " I", " am", " fine"]
+    batcher = _ChunkBatcher()
+
+    frames = [batcher.push(t) for t in deltas]
+    assert frames[0] is not None
+    frames.append(batcher.flush())
+
+    texts = _texts(frames)
+    assert "".join(texts) == "".join(deltas)
+    assert len(texts) < len(deltas)
+
+
+def test_sentence_end_flushes_immediately():
+    batcher = _ChunkBatcher()
+    batcher.push("a")                  # first frame
+    assert batcher.push("b") is None   # batch of 3 not yet full
+    assert _texts([batcher.push(" end.\n")]) == ["b end.\n"]
+    assert batcher.flush() is None
+
+
+class _StubLLM:
+    def stream_sync(self, messages):
+        yield "ok"
+
+    async def stream(self, messages):
+        yield "ok"
+
+
+def _failing_search(monkeypatch):
+    def _boom(*args, **kwargs):
+        raise RuntimeError("search down")
+
+    async def _no_pages(urls, limit):
+        return []
+
+    monkeypatch.setattr(search_service, "web_search", _boom)
+    monkeypatch.setattr(search_service, "scrape_urls", lambda urls, limit: [])
+    monkeypatch.setattr(search_service, "scrape_urls_async", _no_pages)
+    svc = AIService()
+    svc._get_llm = lambda: _StubLLM()
+    return svc
+
+
+def test_search_failure_still_answers_on_both_paths(monkeypatch):
+    svc = _failing_search(monkeypatch)
+
+    async def _collect():
+        return [frame async for frame in svc.explore_the_web_async("q")]
+
+    sync_frames = list(svc.explore_the_web("q"))
+    async_frames = asyncio.run(_collect())
+
+    assert sync_frames == async_frames
+    assert _texts(sync_frames[:1]) == ["ok"]
@@ -0,0 +1,53 @@
+"""Reuse of Gemini GenerativeModel objects across requests (no network)."""
+
+from services.llm import _gemini_model
+
+
+class _StubGenai:
+    def __init__(self):
+        self.built = []
+
+    def GenerativeModel(self, model_name, system_instruction=None):
+        self.built.append((model_name, system_instruction))
+        return object()
+
+
+def test_one_model_per_name_and_system_prompt():
+    genai = _StubGenai()
+
+    a = _gemini_model(genai, "gemini-2.5-flash", "be brief")
+    b = _gemini_model(genai, "gemini-2.5-flash", "be brief")
+    c = _gemini_model(genai, "gemini-2.5-flash", None)
+
+    assert a is b and a is not c
+    assert genai.built == [("gemini-2.5-flash", "be brief"), ("gemini-2.5-flash", None)]
+
+
+def test_chat_gemini_keys_the_model_on_the_leading_system_prompt():
+    import asyncio
+    from types import SimpleNamespace
+
+    from services.llm import LLMService
+
+    queries = []
+
+    class _Model:
+        async def generate_content_async(self, query):
+            queries.append(query)
+            return SimpleNamespace(text="ok")
+
+    class _Genai(_StubGenai):
+        def GenerativeModel(self, model_name, system_instruction=None):
+            super().GenerativeModel(model_name, system_instruction)
+            return _Model()
+
+    svc = LLMService()
+    svc._genai, svc._gemini_configured = _Genai(), True
+    for memory in ("Based on past sessions: cats", "Based on past sessions: dogs"):
+        messages = [{"role": "system", "content": "You are FileGeek."},
+                    {"role": "system", "content": memory},
+                    {"role": "user", "content": "hi"}]
+        asyncio.run(svc._chat_gemini(messages, "gemini-x", None, None))
+
+    assert svc._genai.built == [("gemini-x", "You are FileGeek.")]
+    assert queries == ["Based on past sessions: cats\n\nhi", "Based on past sessions: dogs\n\nhi"]
@@ -0,0 +1,35 @@
+"""recent_history keeps the newest turns that fit the message and token caps."""
+
+from services.providers.history import recent_history
+
+
+def _msg(role, n):
+    return {"role": role, "content": "x" * n}
+
+
+def test_keeps_newest_messages_in_order():
+    history = [_msg("user", 4 * i + 4) for i in range(30)]
+
+    kept = recent_history(history, max_messages=5, token_budget=10_000)
+
+    assert kept == history[-5:]
+    assert kept[0] is history[-5]
+
+
+def test_token_budget_drops_older_turns():
+    history = [_msg("user", 400), _msg("assistant", 400), _msg("user", 400)]
+
+    assert recent_history(history, max_messages=20, token_budget=250) == history[-2:]
+
+
+def test_skips_other_roles_and_empty_content():
+    history = [_msg("system", 8), {"role": "user", "content": ""}, _msg("assistant", 8)]
+
+    assert recent_history(history) == history[-1:]
+    assert recent_history(None) == []
+
+
+def test_newest_message_is_kept_even_when_over_budget():
+    history = [_msg("user", 8), _msg("user", 4000)]
+
+    assert recent_history(history, token_budget=100) == history[-1:]
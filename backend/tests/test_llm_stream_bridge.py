@@ -0,0 +1,65 @@
+"""LLMService.stream_sync bridging onto the background event loop (no network)."""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from services import llm as llm_mod
+from services.llm import LLMService, Provider, aclose_http_clients
+
+
+def _chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+
+class _StubCompletions:
+    def __init__(self, texts, fail=False):
+        self.texts, self.fail = texts, fail
+
+    async def create(self, **kwargs):
+        async def _gen():
+            yield SimpleNamespace(choices=[])     # keep-alive chunk
+            for t in self.texts:
+                yield _chunk(t)
+            if self.fail:
+                raise RuntimeError("upstream closed")
+        return _gen()
+
+
+def _service(completions):
+    svc = LLMService()
+    svc._provider = Provider.OPENAI
+    svc._bridge_client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return svc
+
+
+def test_stream_sync_yields_tokens_in_order():
+    svc = _service(_StubCompletions(["Hel", "lo", None, "!"]))
+
+    assert list(svc.stream_sync([{"role": "user", "content": "hi"}], "gpt-4o")) == ["Hel", "lo", "!"]
+
+
+def test_stream_sync_reraises_stream_errors():
+    svc = _service(_StubCompletions(["a"], fail=True))
+    gen = svc.stream_sync([{"role": "user", "content": "hi"}], "gpt-4o")
+
+    assert next(gen) == "a"
+    with pytest.raises(RuntimeError, match="upstream closed"):
+        next(gen)
+
+
+def test_aclose_stops_the_bridge_and_drops_stale_clients():
+    svc = _service(_StubCompletions(["a"]))
+    assert list(svc.stream_sync([{"role": "user", "content": "hi"}], "gpt-4o")) == ["a"]
+    loop = llm_mod._bridge_loop
+
+    asyncio.run(aclose_http_clients())
+
+    deadline = time.monotonic() + 2
+    while not loop.is_closed() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert loop.is_closed() and llm_mod._bridge_loop is None
+    svc._drop_stale_clients()
+    assert svc._bridge_client is None
@@ -0,0 +1,237 @@
+"""SemanticCache + AIService / ChatEngine caching tests using a stub embedder (no network)."""
+
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+
+from services.ai_service import AIService
+from services.chat_engine import ChatEngine
+from services.semantic_cache import SemanticCache
+
+
+class _StubEmbedder:
+    """Maps known strings to fixed unit vectors; anything else is orthogonal."""
+
+    def __init__(self, vectors: dict):
+        self._vectors = {k: np.asarray(v, dtype=np.float32) for k, v in vectors.items()}
+        self.calls = 0
+
+    def embed(self, text: str) -> np.ndarray:
+        self.calls += 1
+        vec = self._vectors.get(text)
+        if vec is None:
+            vec = np.array([0.0, 0.0, 1.0], dtype=np.float32)
+        return vec / np.linalg.norm(vec)
+
+
+def _cache(vectors=None, **kw) -> SemanticCache:
+    emb = _StubEmbedder(vectors or {})
+    kw.setdefault("threshold", 0.92)
+    kw.setdefault("max_entries", 8)
+    return SemanticCache(emb, enabled=True, **kw)
+
+
+# ── SemanticCache ────────────────────────────────────────────────────────────
+
+def test_hit_above_threshold_and_miss_below():
+    cache = _cache({
+        "what is x": [1.0, 0.0, 0.0],
+        "what's x?": [0.95, 0.05, 0.0],   # cosine ≈ 0.998
+        "what is y": [0.7, 0.7, 0.0],     # cosine ≈ 0.707
+    })
+    cache.store("what is x", None, "s", "X is a letter")
+
+    hit, _ = cache.lookup("what's x?", "s")
+    miss, _ = cache.lookup("what is y", "s")
+
+    assert hit == "X is a letter"
+    assert miss is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_scopes_are_isolated():
+    cache = _cache({"q": [1.0, 0.0, 0.0]})
+    cache.store("q", None, "scope-a", "answer a")
+
+    assert cache.lookup("q", "scope-b")[0] is None
+    assert cache.lookup("q", "scope-a")[0] == "answer a"
+
+
+def test_ring_buffer_evicts_oldest():
+    cache = _cache({f"q{i}": np.eye(3)[i] for i in range(3)}, max_entries=2)
+    cache.store("q0", None, "s", "a0")
+    cache.store("q1", None, "s", "a1")
+    cache.store("q2", None, "s", "a2")   # evicts q0
+
+    assert cache.stats()["entries"] == 2
+    assert cache.lookup("q0", "s")[0] is None
+    assert cache.lookup("q1", "s")[0] == "a1"
+    assert cache.lookup("q2", "s")[0] == "a2"
+
+
+def test_expired_entries_miss():
+    cache = _cache({"q": [1.0, 0.0, 0.0]}, ttl=60)
+    cache.store("q", None, "s", "a")
+    assert cache.lookup("q", "s")[0] == "a"
+
+    cache._stamps[0] -= 61
+    assert cache.lookup("q", "s")[0] is None
+
+
+def test_empty_cache_lookup_does_not_embed():
+    cache = _cache({"q": [1.0, 0.0, 0.0]})
+    assert cache.lookup("q", "s") == (None, None)
+    assert cache._emb.calls == 0
+
+
+def test_cached_values_are_isolated_from_callers():
+    cache = _cache({"q": [1.0, 0.0, 0.0]})
+    cache.store("q", None, "s", {"sources": []})
+
+    first, _ = cache.lookup("q", "s")
+    first["sources"].append("mutated")
+
+    assert cache.lookup("q", "s")[0] == {"sources": []}
+
+
+def test_zero_max_entries_disables_cache():
+    cache = _cache({"q": [1.0, 0.0, 0.0]}, max_entries=0)
+    cache.store("q", None, "s", "a")   # must not raise
+    assert cache.lookup("q", "s") == (None, None)
+    assert cache.stats()["enabled"] is False
+
+
+# ── AIService bypasses ───────────────────────────────────────────────────────
+
+def _service(cache: SemanticCache) -> AIService:
+    svc = AIService()
+    svc._semantic_cache = cache
+    svc.llm_calls = 0
+
+    def _fake_answer(text_part, messages, model_override=None):
+        svc.llm_calls += 1
+        return f"answer #{svc.llm_calls}"
+
+    svc._answer_uncached = _fake_answer
+    return svc
+
+
+def test_answer_from_context_uses_cache():
+    svc = _service(_cache({"what is x": [1.0, 0.0, 0.0]}))
+    first = svc.answer_from_context(["ctx"], "what is x", [])
+    second = svc.answer_from_context(["ctx"], "what is x", [])
+
+    assert first == second == "answer #1"
+    assert svc.llm_calls == 1
+
+
+def test_answer_from_context_bypasses_cache_for_images_and_tools():
+    svc = _service(_cache({"what is x": [1.0, 0.0, 0.0]}))
+    svc.answer_from_context(["ctx"], "what is x", [], image_paths=["a.png"])
+    svc.answer_from_context(["ctx"], "what is x", [], image_paths=["a.png"])
+    svc.answer_from_context(["ctx"], "what is x", [], use_cache=False)
+    svc.answer_from_context(["ctx"], "what is x", [], use_cache=False)
+
+    assert svc.llm_calls == 4
+    assert svc._semantic_cache.stats()["entries"] == 0
+
+
+def test_answer_with_tools_skips_results_with_artifacts():
+    svc = _service(_cache({"quiz me": [1.0, 0.0, 0.0]}))
+
+    class _Engine:
+        calls = 0
+
+        async def generate_response(self, **kwargs):
+            _Engine.calls += 1
+            return {
+                "answer": "here is a quiz", "sources": [], "suggestions": [],
+                "artifacts": [{"artifact_type": "quiz"}], "tool_calls": [],
+            }
+
+    svc._chat_engine = _Engine()
+    for _ in range(2):
+        svc.answer_with_tools("quiz me", [], None, "sess", 1)
+
+    assert _Engine.calls == 2
+    assert svc._semantic_cache.stats()["entries"] == 0
+
+
+# ── ChatEngine ───────────────────────────────────────────────────────────────
+
+class _StubLLM:
+    def __init__(self):
+        self.calls = 0
+
+    def resolve_model(self, model):
+        return model or "stub"
+
+    async def chat(self, **kwargs):
+        self.calls += 1
+        message = SimpleNamespace(content=f"answer #{self.calls}", tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(finish_reason="stop", message=message)])
+
+
+def _ask(engine, question, history=(), preference_context=""):
+    return asyncio.run(engine.generate_response(
+        question=question, session_id="sess", user_id=1,
+        chat_history=list(history), db=None, preference_context=preference_context,
+    ))
+
+
+def test_generate_response_serves_repeats_from_cache():
+    llm = _StubLLM()
+    cache = _cache({"what is x": [1.0, 0.0, 0.0], "what's x exactly": [0.99, 0.1, 0.0]})
+    engine = ChatEngine(llm, None, None, None, semantic_cache=cache)
+
+    first = _ask(engine, "what is x")
+    second = _ask(engine, "what's x exactly")
+
+    assert first["answer"] == second["answer"] == "answer #1"
+    assert llm.calls == 1
+
+
+def test_generate_response_repeat_hits_after_an_exchange():
+    llm = _StubLLM()
+    engine = ChatEngine(llm, None, None, None,
+                        semantic_cache=_cache({"what is entropy": [1.0, 0.0, 0.0]}))
+
+    first = _ask(engine, "what is entropy")
+    history = [{"role": "user", "content": "what is entropy"},
+               {"role": "assistant", "content": first["answer"]},
+               {"role": "user", "content": "define enthalpy briefly"},
+               {"role": "assistant", "content": "answer #2"}]
+    again = _ask(engine, "what is entropy", history)
+
+    assert again["answer"] == first["answer"] == "answer #1"
+    assert llm.calls == 1
+
+
+def test_generate_response_changed_preferences_miss_the_cache():
+    llm = _StubLLM()
+    engine = ChatEngine(llm, None, None, None,
+                        semantic_cache=_cache({"what is entropy": [1.0, 0.0, 0.0]}))
+
+    before = _ask(engine, "what is entropy", preference_context="be brief")
+    after = _ask(engine, "what is entropy", preference_context="explain like I'm five")
+    again = _ask(engine, "what is entropy", preference_context="explain like I'm five")
+
+    assert (before["answer"], after["answer"], again["answer"]) == ("answer #1", "answer #2", "answer #2")
+    assert llm.calls == 2
+
+
+def test_generate_response_follow_ups_bypass_cache():
+    llm = _StubLLM()
+    cache = _cache({"explain that in more detail": [1.0, 0.0, 0.0], "why": [0.0, 1.0, 0.0]})
+    engine = ChatEngine(llm, None, None, None, semantic_cache=cache)
+
+    for history in ([{"role": "assistant", "content": "about cats"}],
+                     [{"role": "assistant", "content": "about dogs"}]):
+        _ask(engine, "explain that in more detail", history)
+        _ask(engine, "why", history)
+
+    assert llm.calls == 4
+    assert cache.stats()["entries"] == 0
+    assert cache._emb.calls == 0
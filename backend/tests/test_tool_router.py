@@ -0,0 +1,128 @@
+"""build_tool_router, project_for_model, artifact_answer and ToolExecutor fan-out in services.tools."""
+
+import threading
+import time
+
+from services.tools import ToolExecutor, build_tool_router
+
+_GROUPS = (
+    ("generate_flashcards",    ("flashcard", "flash card", "study card")),
+    ("generate_quiz",          ("quiz", "test me", "multiple choice")),
+    ("create_study_guide",     ("study guide", "outline")),
+    ("generate_visualization", ("diagram", "mind map", "visualization", "chart")),
+)
+
+
+def _chain(text):
+    q = text.lower()
+    for tool, keywords in _GROUPS:
+        if any(kw in q for kw in keywords):
+            return tool
+    return None
+
+
+def test_router_matches_the_keyword_chain():
+    route = build_tool_router(_GROUPS)
+    questions = [
+        "Make a CHART and then quiz me",
+        "draw a mind map, then flash cards",
+        "Outline chapter 2",
+        "what is entropy?",
+        "test me on the diagram",
+        "studycard",
+        "",
+    ]
+    for q in questions:
+        assert route(q) == _chain(q), q
+
+
+def test_project_for_model_drops_artifact_content():
+    from services.tools import ARTIFACT_PREVIEW_CHARS, project_for_model
+
+    guide = {"artifact_type": "study_guide", "content": "x" * 5000, "topic": "t"}
+    cards = {"artifact_type": "flashcards", "content": [{}, {}, {}], "topic": "t"}
+    search = {"results": [{"text": "a"}], "total": 1}
+
+    assert project_for_model(guide) == {
+        "artifact_type": "study_guide", "topic": "t", "chars": 5000,
+        "preview": "x" * ARTIFACT_PREVIEW_CHARS, "status": "created",
+    }
+    assert project_for_model(cards)["items"] == 3
+    assert "content" in guide
+    assert project_for_model(search) == {"results": [{"text": "a"}]}
+    assert project_for_model({"results": [], "message": "none"})["message"] == "none"
+
+
+def test_project_for_model_caps_search_passages():
+    from services.tools import SEARCH_SNIPPET_CHARS, project_for_model
+
+    search = {"results": [{"index": 1, "text": "y" * 5000, "pages": [3]},
+                          {"index": 2, "text": "short", "pages": []}], "total": 2}
+
+    assert project_for_model(search) == {"results": [
+        {"index": 1, "text": "y" * SEARCH_SNIPPET_CHARS, "pages": [3]},
+        {"index": 2, "text": "short"},
+    ]}
+    assert len(search["results"][0]["text"]) == 5000
+
+
+def test_shared_router_uses_the_full_keyword_table():
+    from services.tools import route_forced_tool
+
+    assert route_forced_tool("Spaced repetition deck for ch. 3") == "generate_flashcards"
+    assert route_forced_tool("test my knowledge with a chart") == "generate_quiz"
+    assert route_forced_tool("what is entropy?") is None
+
+
+def test_artifact_answer_only_for_finished_artifact_rounds():
+    from services.tools import artifact_answer
+
+    cards = {"artifact_type": "flashcards", "content": [{}, {}], "topic": "cells"}
+    guide = {"artifact_type": "study_guide", "content": "# Guide", "topic": "cells"}
+    failed = {"artifact_type": "quiz", "content": None, "topic": "cells"}
+    search = {"results": [{"text": "a"}], "total": 1}
+
+    assert artifact_answer([cards, guide]) == (
+        "Here are 2 flashcards on cells.\n\nHere's your study guide on cells."
+    )
+    assert artifact_answer([cards, search]) is None
+    assert artifact_answer([failed]) is None
+    assert artifact_answer([]) is None
+
+
+def _executor(run):
+    ex = ToolExecutor(rag_service=None, ai_service=None)
+    ex.execute = lambda name, args, session_id, user_id: run(ex, name, args)
+    return ex
+
+
+def test_execute_many_sync_keeps_order_and_calls_back_on_the_caller():
+    def run(ex, name, args):
+        time.sleep(args["delay"])
+        return {"name": name}
+
+    ex = _executor(run)
+    callback_threads = set()
+    calls = [("a", {"delay": 0.03}), ("b", {"delay": 0.0}), ("c", {"delay": 0.01})]
+
+    results = ex.execute_many_sync(
+        calls, "s", 1, on_done=lambda name: callback_threads.add(threading.get_ident())
+    )
+
+    assert [r["name"] for r in results] == ["a", "b", "c"]
+    assert callback_threads == {threading.get_ident()}
+
+
+def test_execute_many_sync_runs_nested_fan_out_inline():
+    def run(ex, name, args):
+        if name == "outer":
+            inner = ex.execute_many_sync([("x", {}), ("y", {})], "s", 1)
+            return {"inner": [r["thread"] for r in inner], "thread": threading.get_ident()}
+        return {"thread": threading.get_ident()}
+
+    ex = _executor(run)
+
+    outer = ex.execute_many_sync([("outer", {}), ("outer", {})], "s", 1)
+
+    for result in outer:
+        assert result["inner"] == [result["thread"]] * 2
@@ -0,0 +1,70 @@
+"""VectorStore embedding blob encoding and ranking (no database)."""
+
+from types import SimpleNamespace
+
+import numpy as np
+
+from services import vector_store as vs_mod
+from services.vector_store import VectorStore, decode_embedding, encode_embedding
+
+
+def _unit(*xs):
+    v = np.array(xs, dtype=np.float32)
+    return v / np.linalg.norm(v)
+
+
+def test_int8_blobs_are_a_quarter_size_and_close(monkeypatch):
+    vec = _unit(3, -4, 0, 1)
+    monkeypatch.setattr(vs_mod, "EMBED_DTYPE", "int8")
+
+    blob = encode_embedding(vec)
+
+    assert len(blob) == 4
+    assert np.allclose(decode_embedding(blob, 4), vec, atol=1 / 127)
+
+
+def test_rank_mixes_fp32_and_int8_rows(monkeypatch):
+    rows = []
+    for i, v in enumerate([_unit(1, 0, 0), _unit(0, 1, 0), _unit(1, 1, 0)]):
+        monkeypatch.setattr(vs_mod, "EMBED_DTYPE", "int8" if i % 2 else "fp32")
+        rows.append(SimpleNamespace(embedding=encode_embedding(v), chunk_text=str(i),
+                                    pages="[]", document_id="d", chunk_index=i))
+    rows.append(SimpleNamespace(embedding=b"bad", chunk_text="x", pages="[]",
+                                document_id="d", chunk_index=3))
+
+    ranked = VectorStore(embedding_service=None)._rank(rows, _unit(0, 1, 0.1), k=4)
+
+    assert [r.chunk_text for r in ranked][:3] == ["1", "2", "0"]
+    assert ranked[-1].chunk_text == "x" and ranked[-1].score == 0.0
+
+
+def test_index_chunks_sync_pipelines_groups_in_order(monkeypatch):
+    monkeypatch.setattr(vs_mod, "INDEX_PIPELINE_CHUNKS", 2)
+
+    class _Emb:
+        model_id = "stub"
+
+        def embed_batch(self, texts):
+            return np.stack([_unit(len(t), 1) for t in texts])
+
+    class _Db:
+        def __init__(self):
+            self.rows, self.flushes, self.commits = [], 0, 0
+
+        def add_all(self, rows):
+            self.rows.extend(rows)
+
+        def flush(self):
+            self.flushes += 1
+
+        def commit(self):
+            self.commits += 1
+
+    db = _Db()
+    chunks = [{"text": "x" * n, "pages": [n]} for n in range(1, 6)]
+
+    stored = VectorStore(_Emb()).index_chunks_sync("s", 1, "d", chunks, db)
+
+    assert stored == 5 and (db.flushes, db.commits) == (3, 1)
+    assert [r.chunk_index for r in db.rows] == [0, 1, 2, 3, 4]
+    assert [r.chunk_text for r in db.rows] == [c["text"] for c in chunks]
@@ -0,0 +1,67 @@
+"""
+utils/download.py — Stream a remote file (CDN upload) to local disk.
+
+download_to (sync, for Celery / threads) copies the body with
+shutil.copyfileobj in 1 MB reads straight from the urllib3 stream.
+download_to_async reads the same 1 MB chunks on the event loop over one
+shared httpx.AsyncClient, so concurrent uploads reuse keep-alive
+connections and no worker thread is held for the transfer.  The client
+belongs to the event loop that created it: a call from another loop (a
+Celery task's asyncio.run, a test) gets its own, and the app lifespan
+closes it with aclose_async_client().
+
+Accept-Encoding: identity asks the CDN not to gzip already-compressed
+files (PDF, DOCX, images); if it does anyway, the body is still decoded.
+"""
+
+import asyncio
+import shutil
+
+_COPY_BUFFER = 1024 * 1024
+_HEADERS = {"Accept-Encoding": "identity"}
+
+_async_client = None
+_async_client_loop = None
+
+
+def download_to(url: str, filepath: str, timeout: float = 30) -> None:
+    """Download *url* to *filepath*; raises on HTTP errors."""
+    import requests
+
+    with requests.get(url, timeout=timeout, stream=True, headers=_HEADERS) as resp:
+        resp.raise_for_status()
+        resp.raw.decode_content = True
+        with open(filepath, "wb") as fout:
+            shutil.copyfileobj(resp.raw, fout, length=_COPY_BUFFER)
+
+
+def _get_async_client():
+    global _async_client, _async_client_loop
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client_loop is not loop:
+        import httpx
+        # A client left over from a finished loop can't be awaited on; drop it.
+        _async_client = httpx.AsyncClient(headers=_HEADERS, follow_redirects=True)
+        _async_client_loop = loop
+    return _async_client
+
+
+async def aclose_async_client() -> None:
+    """Close the shared client (app shutdown); it is rebuilt if used again."""
+    global _async_client, _async_client_loop
+    client, _async_client, _async_client_loop = _async_client, None, None
+    if client is not None:
+        await client.aclose()
+
+
+async def download_to_async(url: str, filepath: str, timeout: float = 30) -> None:
+    """
+    Async twin of download_to.  Chunks are written with plain file writes:
+    uploads are capped at 10 MB, so each 1 MB write is brief, and a thread
+    hop per chunk would cost more than it saves.
+    """
+    async with _get_async_client().stream("GET", url, timeout=timeout) as resp:
+        resp.raise_for_status()
+        with open(filepath, "wb") as fout:
+            async for chunk in resp.aiter_bytes(_COPY_BUFFER):
+                fout.write(chunk)
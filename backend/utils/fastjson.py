@@ -0,0 +1,46 @@
+"""
+utils/fastjson.py — orjson-backed JSON helpers with a stdlib fallback.
+
+orjson is optional; without it these are thin wrappers over json, using
+the same compact separators orjson emits.  Non-str dict keys and numpy
+scalars/arrays are accepted, and decode errors are always
+json.JSONDecodeError (orjson's error type subclasses it).
+"""
+
+import json
+
+JSONDecodeError = json.JSONDecodeError
+
+try:
+    import orjson
+
+    _OPTS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumpb(obj) -> bytes:
+        """Serialise *obj* to UTF-8 JSON bytes."""
+        return orjson.dumps(obj, option=_OPTS)
+
+    def dumps(obj) -> str:
+        """Serialise *obj* to a JSON str (for APIs that require text)."""
+        return orjson.dumps(obj, option=_OPTS).decode("utf-8")
+
+    loads = orjson.loads
+except ImportError:
+    # Compact separators, as orjson emits
+    _SEPARATORS = (",", ":")
+
+    def _default(obj):
+        # numpy scalars / arrays, as orjson's OPT_SERIALIZE_NUMPY handles them
+        if hasattr(obj, "tolist"):
+            return obj.tolist()
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+    def dumpb(obj) -> bytes:
+        """Serialise *obj* to UTF-8 JSON bytes."""
+        return json.dumps(obj, separators=_SEPARATORS, default=_default).encode("utf-8")
+
+    def dumps(obj) -> str:
+        """Serialise *obj* to a JSON str (for APIs that require text)."""
+        return json.dumps(obj, separators=_SEPARATORS, default=_default)
+
+    loads = json.loads
@@ -0,0 +1,18 @@
+"""
+utils/sse.py — Server-Sent Events framing shared by the streaming routes.
+
+Frames are UTF-8 bytes serialised with utils.fastjson; StreamingResponse
+passes bytes through without re-encoding them.
+"""
+
+from utils import fastjson
+
+_PREFIX = b"data: "
+_SUFFIX = b"\n\n"
+
+SSE_DONE = b"data: [DONE]\n\n"
+
+
+def sse_frame(payload: dict) -> bytes:
+    """One ``data: <json>`` event for *payload*."""
+    return b"".join((_PREFIX, fastjson.dumpb(payload), _SUFFIX))